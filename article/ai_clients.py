@@ -0,0 +1,176 @@
+"""
+AI 服務 (Embedding / Pinecone / Gemini) 的建立集中在這裡，
+RAG 查詢與 Celery 向量化任務共用同一套設定，同步與非同步 (ainvoke / aembed_query) 呼叫皆可使用
+settings.AI_BACKEND = 'fake' 時改用本機替身 (article/fakes/ai.py)，不呼叫外部 API
+
+Pinecone / Gemini SDK 載入需要數秒，因此在第一次建立 client 時才 import，
+不使用 AI 功能的 process (migrate、admin、爬蟲 worker) 不需負擔；需要的 process 啟動時呼叫 prewarm()
+
+使用的 embedding 模型與 Pinecone index / namespace (target) 預設來自環境變數，
+重新向量化 (celery_app/reindex.py) 完成後切換的 target 存在 Redis，各 process 每 EMBEDDING_TARGET_REFRESH 秒重新讀取
+"""
+import json
+import time
+from contextlib import contextmanager
+from functools import lru_cache
+
+import redis
+from django.conf import settings
+
+from langchain_core.embeddings import Embeddings
+from pydantic import SecretStr
+from env_settings import EnvSettings
+from config.metrics import timed
+from celery_app.locks import redis_client
+
+env_settings = EnvSettings()
+
+ACTIVE_TARGET_KEY = 'ptt:embedding:active'
+PREVIOUS_TARGET_KEY = 'ptt:embedding:previous'
+
+# (讀取時間, target)
+_active_target = (0.0, None)
+
+# 注意：建議先用 gemini-1.5-flash 比較穩定，若您有 2.0 權限可改為 gemini-2.0-flash
+CHAT_MODEL = "gemini-flash-latest"
+
+
+class InstrumentedEmbeddings(Embeddings):
+    """
+    記錄 embedding 呼叫耗時的包裝 (包含 vector store 內部的呼叫)
+    elapsed 為累計秒數，呼叫端可用前後差值把 embedding 時間從整體時間中扣除
+    """
+
+    def __init__(self, embeddings):
+        self.embeddings = embeddings
+        self.elapsed = 0.0
+
+    @contextmanager
+    def measure(self):
+        start = time.perf_counter()
+        with timed('embedding'):
+            yield
+        self.elapsed += time.perf_counter() - start
+
+    def embed_documents(self, texts, **kwargs):
+        with self.measure():
+            return self.embeddings.embed_documents(texts, **kwargs)
+
+    def embed_query(self, text, **kwargs):
+        with self.measure():
+            return self.embeddings.embed_query(text, **kwargs)
+
+    async def aembed_documents(self, texts, **kwargs):
+        with self.measure():
+            return await self.embeddings.aembed_documents(texts, **kwargs)
+
+    async def aembed_query(self, text, **kwargs):
+        with self.measure():
+            return await self.embeddings.aembed_query(text, **kwargs)
+
+
+def default_target() -> dict:
+    """環境變數設定的 embedding 模型與 Pinecone index (預設 namespace)"""
+    return {'model': env_settings.GOOGLE_EMBEDDINGS_MODEL, 'index': env_settings.PINECONE_INDEX_NAME, 'namespace': None}
+
+
+def get_active_target() -> dict:
+    """目前查詢與向量化使用的 target；Redis 異常時沿用上次讀到的值"""
+    global _active_target
+    loaded_at, target = _active_target
+    if target is None or time.monotonic() - loaded_at > settings.EMBEDDING_TARGET_REFRESH:
+        try:
+            raw = redis_client.get(ACTIVE_TARGET_KEY)
+            target = json.loads(raw) if raw else default_target()
+        except redis.RedisError:
+            target = target or default_target()
+        _active_target = (time.monotonic(), target)
+    return target
+
+
+def switch_target(target: dict):
+    """切換查詢與向量化使用的 target (單一鍵寫入，各 process 在 EMBEDDING_TARGET_REFRESH 秒內生效)，保留前一個供 rollback"""
+    global _active_target
+    pipe = redis_client.pipeline()
+    pipe.set(PREVIOUS_TARGET_KEY, json.dumps(get_active_target()))
+    pipe.set(ACTIVE_TARGET_KEY, json.dumps(target))
+    pipe.execute()
+    _active_target = (time.monotonic(), target)
+
+
+def get_previous_target():
+    raw = redis_client.get(PREVIOUS_TARGET_KEY)
+    return json.loads(raw) if raw else None
+
+
+def get_embeddings(model: str = None):
+    if settings.AI_BACKEND == 'fake':
+        from article.fakes.ai import FakeEmbeddings
+        return InstrumentedEmbeddings(FakeEmbeddings())
+    from langchain_google_genai import GoogleGenerativeAIEmbeddings
+    return InstrumentedEmbeddings(GoogleGenerativeAIEmbeddings(
+        model=model or get_active_target()['model'],
+        google_api_key=SecretStr(env_settings.GOOGLE_API_KEY),
+    ))
+
+
+@lru_cache
+def get_index_host(index_name: str) -> str:
+    """
+    取得 Pinecone index 的 host
+    以 index 名稱建立連線時每次都會呼叫一次 describe_index (同步網路請求)，
+    因此每個 process 只查詢一次；預設的 index 也可直接以 PINECONE_INDEX_HOST 指定
+    """
+    if env_settings.PINECONE_INDEX_HOST and index_name == env_settings.PINECONE_INDEX_NAME:
+        return env_settings.PINECONE_INDEX_HOST
+    from pinecone import Pinecone
+    return Pinecone(api_key=env_settings.PINECONE_API_KEY).describe_index(index_name).host
+
+
+def get_vector_store(target: dict = None):
+    """target 的模型與 index / namespace 一起決定，查詢向量與資料一定來自同一個模型；None 代表目前使用中的 target"""
+    target = target or get_active_target()
+    if settings.AI_BACKEND == 'fake':
+        from article.fakes.ai import get_fake_vector_store
+        return get_fake_vector_store(get_embeddings(target['model']), target['namespace'])
+    from langchain_pinecone import PineconeVectorStore
+    return PineconeVectorStore(
+        embedding=get_embeddings(target['model']),
+        pinecone_api_key=env_settings.PINECONE_API_KEY,
+        host=get_index_host(target['index']),
+        namespace=target['namespace'],
+    )
+
+
+def get_chat_model(temperature=0.3):
+    if settings.AI_BACKEND == 'fake':
+        from article.fakes.ai import get_fake_chat_model
+        return get_fake_chat_model()
+    from langchain_google_genai import ChatGoogleGenerativeAI
+    return ChatGoogleGenerativeAI(
+        model=CHAT_MODEL,
+        temperature=temperature,  # 稍微有點創造力但不要太發散
+        google_api_key=env_settings.GOOGLE_API_KEY,
+    )
+
+
+def prewarm():
+    """
+    預先載入 AI 相關套件 (RAG、向量化)，讓第一個請求或任務不用等待 import
+    在 Celery worker 主 process fork 之前呼叫，子 process (含 max-tasks-per-child 重啟的) 都直接沿用
+    """
+    start = time.perf_counter()
+    if settings.AI_BACKEND == 'fake':
+        import article.fakes.ai  # noqa: F401
+    else:
+        import langchain_google_genai  # noqa: F401
+        import langchain_pinecone  # noqa: F401
+        # 預先查詢使用中 index 的 host (describe_index 為同步網路請求)，第一個請求不用等待
+        try:
+            get_index_host(get_active_target()['index'])
+        except Exception as e:
+            print(f"[WARN] Failed to resolve Pinecone index host: {e}")
+    import article.rag_query  # noqa: F401
+    if settings.CHUNKER == 'recursive':
+        import langchain_text_splitters  # noqa: F401
+    print(f"[INFO] AI stack loaded in {time.perf_counter() - start:.2f}s")
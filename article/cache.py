@@ -0,0 +1,147 @@
+"""
+API 回應快取 (Redis-backed Django cache)
+
+- 每個看板維護一個資料版本號 (data version)，ptt_scrape 寫入資料後遞增，
+  舊版本的快取鍵自然不再被使用 (不需要逐一刪除)
+- 快取鍵 = 端點名稱 + 資料版本 + 正規化後的查詢參數
+- ETag 由同一組資訊計算，客戶端帶 If-None-Match 時不需查詢資料庫即可回 304
+- 命中 / 未命中 / 304 次數記錄在 Redis，可透過 aget_cache_stats() 觀察命中率
+- 版本號遞增後 API_CACHE_PRIMARY_WINDOW 秒內，快取未命中時改從 primary 計算：
+  replica 可能還沒複寫到新資料，從 replica 算出的舊資料會以新版本號 (與 ETag) 快取到 API_CACHE_TIMEOUT
+"""
+import hashlib
+import json
+import time
+import traceback
+
+from django.conf import settings
+from django.core.cache import cache
+from rest_framework import status
+from rest_framework.response import Response
+
+from log_app.models import Log
+from config.db_router import use_primary
+from config.metrics import CACHE_REQUESTS
+
+# 未指定看板的查詢 (例如全站列表、單篇文章) 使用的版本號
+ALL_BOARDS = '__all__'
+
+VERSION_KEY = 'api-cache:version:{board}'
+# 版本號剛遞增 (replica 可能尚未同步) 的標記，存活 API_CACHE_PRIMARY_WINDOW 秒
+RECENTLY_BUMPED_KEY = 'api-cache:bumped:{board}'
+DATA_KEY = 'api-cache:data:{name}:{fingerprint}'
+STATS_KEY = 'api-cache:stats:{name}:{result}'
+
+CACHE_RESULTS = ('hit', 'miss', 'not_modified')
+
+
+async def aget_data_version(board=None) -> int:
+    """取得看板的資料版本號；不存在時以目前時間 (毫秒) 初始化，避免 Redis 清空後版本號重複"""
+    key = VERSION_KEY.format(board=board or ALL_BOARDS)
+    version = await cache.aget(key)
+    if version is None:
+        await cache.aadd(key, int(time.time() * 1000), timeout=None)
+        version = await cache.aget(key)
+    return version
+
+
+def bump_data_version(board: str):
+    """看板資料有異動時呼叫：同時遞增該看板與全站的版本號，使相關快取失效"""
+    for name in (board, ALL_BOARDS):
+        # 先標記再遞增：讀到新版本號的請求一定也看得到標記
+        cache.set(RECENTLY_BUMPED_KEY.format(board=name), 1, settings.API_CACHE_PRIMARY_WINDOW)
+        key = VERSION_KEY.format(board=name)
+        try:
+            cache.incr(key)
+        except ValueError:
+            # 版本號不存在 (尚未被讀取過或已被清除)，直接初始化即可
+            cache.add(key, int(time.time() * 1000), timeout=None)
+
+
+def normalize_params(params: dict) -> dict:
+    """將驗證後的查詢參數正規化：移除空值、統一轉成字串並排序"""
+    return {key: str(value) for key, value in sorted(params.items()) if value not in (None, '')}
+
+
+def make_fingerprint(name: str, version: int, params: dict) -> str:
+    raw = json.dumps([name, version, normalize_params(params)], ensure_ascii=False, sort_keys=True)
+    return hashlib.sha1(raw.encode('utf-8')).hexdigest()
+
+
+def _if_none_match(request) -> set:
+    header = request.headers.get('If-None-Match', '')
+    return {tag.strip().removeprefix('W/') for tag in header.split(',') if tag.strip()}
+
+
+async def record_cache_result(name: str, result: str):
+    CACHE_REQUESTS.labels(name, result).inc()
+    key = STATS_KEY.format(name=name, result=result)
+    try:
+        await cache.aincr(key)
+    except ValueError:
+        await cache.aadd(key, 0, timeout=None)
+        await cache.aincr(key)
+
+
+async def aget_cache_stats() -> dict:
+    """回傳各端點的快取命中統計與命中率"""
+    names = ['article-list', 'article-search', 'article-detail', 'article-statistics']
+    keys = [STATS_KEY.format(name=name, result=result) for name in names for result in CACHE_RESULTS]
+    values = await cache.aget_many(keys)
+
+    stats = {}
+    for name in names:
+        counts = {result: values.get(STATS_KEY.format(name=name, result=result), 0) for result in CACHE_RESULTS}
+        total = sum(counts.values())
+        # 304 也算命中：資料庫與序列化都被省略了
+        counts['hit_ratio'] = round((counts['hit'] + counts['not_modified']) / total, 4) if total else None
+        stats[name] = counts
+    return stats
+
+
+async def cached_response(request, name: str, params: dict, compute, board=None) -> Response:
+    """
+    以快取包裝 API 回應
+    compute: 無參數的 async 函式，回傳 DRF Response；只有 200 的回應內容會被快取
+    board: 查詢涉及的看板，決定使用哪一個資料版本號 (None 代表全站)
+    """
+    try:
+        version = await aget_data_version(board)
+    except Exception:
+        # 快取服務異常時不影響 API，直接回傳即時計算結果
+        await Log.objects.acreate(level='WARNING', category='api-cache', message='讀取快取版本號失敗',
+                                  traceback=traceback.format_exc())
+        return await compute()
+
+    fingerprint = make_fingerprint(name, version, params)
+    etag = f'"{fingerprint}"'
+
+    # 1. 條件式請求：ETag 相同代表資料版本與查詢參數都沒變，直接回 304
+    if etag in _if_none_match(request):
+        await record_cache_result(name, 'not_modified')
+        response = Response(status=status.HTTP_304_NOT_MODIFIED)
+        response['ETag'] = etag
+        return response
+
+    # 2. 讀取快取內容
+    data_key = DATA_KEY.format(name=name, fingerprint=fingerprint)
+    data = await cache.aget(data_key)
+    if data is not None:
+        await record_cache_result(name, 'hit')
+        response = Response(data, status=status.HTTP_200_OK)
+    else:
+        await record_cache_result(name, 'miss')
+        if await cache.aget(RECENTLY_BUMPED_KEY.format(board=board or ALL_BOARDS)):
+            # 資料剛更新，replica 可能還是舊資料
+            with use_primary():
+                response = await compute()
+        else:
+            response = await compute()
+        if response.status_code != status.HTTP_200_OK:
+            return response
+        await cache.aset(data_key, response.data, settings.API_CACHE_TIMEOUT)
+
+    response['ETag'] = etag
+    # 要求客戶端每次都帶 ETag 回來驗證，資料更新後才能立即拿到新內容
+    response['Cache-Control'] = 'no-cache'
+    return response
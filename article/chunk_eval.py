@@ -0,0 +1,98 @@
+"""
+切塊設定的離線評估 (evaluate_chunking 指令)
+
+以標註好的問題集 (每題對應一或多篇應被檢索到的文章) 比較不同的切塊設定：
+- 片段數與送去 embedding 的字數 (向量化成本)
+- 檢索命中率 (top_k 篇文章內包含正確文章的比例) 與 MRR
+
+向量存在本機記憶體 (InMemoryIndex)，不寫入 Pinecone；embedding 依 AI_BACKEND 設定
+(AI_BACKEND=fake 時完全離線，結果反映字詞重疊程度；使用 Gemini 才能反映實際的語意檢索品質)
+
+問題集為 JSON Lines，每行一題：
+{"question": "台積電法說會對毛利率的展望？", "urls": ["https://www.ptt.cc/bbs/Stock/M.1705276800.A.1F2.html"]}
+"""
+import json
+import time
+
+from article.chunking import get_splitter
+from article.fakes.ai import InMemoryIndex
+
+# 每次 embedding 請求的片段數
+EMBED_BATCH_SIZE = 100
+
+
+def load_questions(path) -> list:
+    questions = []
+    with open(path, encoding='utf-8') as file:
+        for line in file:
+            if not line.strip():
+                continue
+            item = json.loads(line)
+            urls = item.get('urls') or [item['url']]
+            questions.append({'question': item['question'], 'urls': urls})
+    return questions
+
+
+def parse_config(value: str) -> dict:
+    """'cjk:300:50' -> {'name': 'cjk:300:50', 'chunker': 'cjk', 'chunk_size': 300, 'chunk_overlap': 50}"""
+    chunker, chunk_size, chunk_overlap = value.split(':')
+    return {'name': value, 'chunker': chunker, 'chunk_size': int(chunk_size), 'chunk_overlap': int(chunk_overlap)}
+
+
+def build_index(config: dict, articles, embeddings):
+    split_text = get_splitter(config['chunker'], config['chunk_size'], config['chunk_overlap'])
+    texts, article_ids = [], []
+    for article in articles:
+        for chunk in split_text(article.content):
+            texts.append(chunk)
+            article_ids.append(article.id)
+
+    index = InMemoryIndex()
+    started = time.perf_counter()
+    for start in range(0, len(texts), EMBED_BATCH_SIZE):
+        batch = texts[start:start + EMBED_BATCH_SIZE]
+        vectors = embeddings.embed_documents(batch)
+        index.upsert([
+            {'id': str(start + i), 'values': vector, 'text': text, 'metadata': {'article_id': article_ids[start + i]}}
+            for i, (vector, text) in enumerate(zip(vectors, batch))
+        ])
+    return index, {
+        'chunks': len(texts),
+        'embedded_chars': sum(len(text) for text in texts),
+        'embed_seconds': round(time.perf_counter() - started, 2),
+    }
+
+
+def retrieve(index, vector, top_k: int) -> list:
+    """回傳前 top_k 篇不同文章的 ID (同一篇的多個片段只算一次，與 RAG 查詢相同)"""
+    article_ids = []
+    for match in index.query(vector, top_k * 4):
+        article_id = match['metadata']['article_id']
+        if article_id not in article_ids:
+            article_ids.append(article_id)
+            if len(article_ids) >= top_k:
+                break
+    return article_ids
+
+
+def evaluate(config: dict, articles: list, questions: list, embeddings, top_k: int = 5) -> dict:
+    """questions 的 urls 需已轉成 article_ids"""
+    index, stats = build_index(config, articles, embeddings)
+    query_vectors = embeddings.embed_documents([q['question'] for q in questions], task_type='RETRIEVAL_QUERY')
+
+    hits, reciprocal_rank = 0, 0.0
+    for question, vector in zip(questions, query_vectors):
+        retrieved = retrieve(index, vector, top_k)
+        rank = next((i for i, article_id in enumerate(retrieved, start=1) if article_id in question['article_ids']), None)
+        if rank:
+            hits += 1
+            reciprocal_rank += 1 / rank
+
+    return {
+        'config': config['name'],
+        'articles': len(articles),
+        **stats,
+        'avg_chunk_chars': round(stats['embedded_chars'] / stats['chunks'], 1) if stats['chunks'] else 0,
+        'hit_rate': round(hits / len(questions), 3) if questions else 0,
+        'mrr': round(reciprocal_rank / len(questions), 3) if questions else 0,
+    }
@@ -0,0 +1,99 @@
+"""
+文章切塊 (向量化用)
+
+RecursiveCharacterTextSplitter 預設以段落、換行、空白切割，適合英文；
+中文沒有空白，長段落會在句子中間被切斷，產生較多的片段 (embedding 呼叫)
+
+- clean_content：移除不需要向量化的 PTT 樣板
+  文章開頭的作者 / 看板 / 標題 / 時間、引述區塊 (※ 引述《...》之銘言 與 : 開頭的引文)、
+  其他 ※ 系統行、簽名檔 (結尾的 -- 之前、最後一個 -- 之後) 與只有網址的行
+- split_sentences：依中文句末標點 (。！？；…) 與換行切成句子
+- chunk_text：將句子依序合併到 chunk_size 字以內，片段之間重疊最後幾個句子 (不超過 chunk_overlap 字)；
+  單句超過 chunk_size 時才在句子中間切開；片段 (含重疊的句子) 一定不超過 chunk_size 字
+"""
+import re
+
+from django.conf import settings
+
+# 文章開頭的 meta 資訊 (解析 HTML 時與內文連在一起)
+META_RE = re.compile(r'^\s*作者.*?時間\w{3} \w{3} [ \d]\d \d\d:\d\d:\d\d \d{4}', re.DOTALL)
+QUOTE_HEADER_RE = re.compile(r'^※ 引述《.*》之銘言')
+# 內文結尾的 -- (PTT 在 ※ 發信站 之前加上的分隔線)
+FOOTER_RE = re.compile(r'\n--$')
+SIGNATURE_RE = re.compile(r'\n--\n(?!.*\n--\n)', re.DOTALL)
+URL_LINE_RE = re.compile(r'^\s*https?://\S+\s*$')
+SENTENCE_RE = re.compile(r'[^。！？!?；;…\n]*(?:[。！？!?；;…]+[」』）)]*\n?|\n|$)')
+
+
+def clean_content(text: str) -> str:
+    """移除 PTT 樣板，回傳要向量化的內文"""
+    text = META_RE.sub('', text or '', count=1)
+    # 解析時已截掉 ※ 發信站 之後的內容，結尾一定是 -- 分隔線，先移除；
+    # 剩下的最後一個 -- 之後才是簽名檔 (內文 -- 簽名檔 -- ※ 發信站)
+    text = FOOTER_RE.sub('', '\n' + text.rstrip())
+    text = SIGNATURE_RE.split(text, maxsplit=1)[0]
+
+    lines = []
+    for line in text.splitlines():
+        stripped = line.strip()
+        if QUOTE_HEADER_RE.match(stripped) or stripped.startswith('※'):
+            continue
+        if stripped.startswith(': ') or stripped == ':':
+            continue
+        if URL_LINE_RE.match(stripped):
+            continue
+        lines.append(line.rstrip())
+
+    # 連續空行合併為一行
+    return re.sub(r'\n{3,}', '\n\n', '\n'.join(lines)).strip()
+
+
+def split_sentences(text: str) -> list:
+    """切成句子，保留句尾的換行 (合併成片段時維持原本的分行)"""
+    return [sentence.lstrip() for sentence in SENTENCE_RE.findall(text) if sentence.strip()]
+
+
+def chunk_text(text: str, chunk_size: int = None, chunk_overlap: int = None) -> list:
+    chunk_size = chunk_size or settings.CHUNK_SIZE
+    chunk_overlap = settings.CHUNK_OVERLAP if chunk_overlap is None else chunk_overlap
+
+    sentences = []
+    for sentence in split_sentences(text):
+        # 超過 chunk_size 的長句直接切開
+        sentences.extend(sentence[i:i + chunk_size] for i in range(0, len(sentence), chunk_size))
+
+    chunks, current, length = [], [], 0
+    for sentence in sentences:
+        if current and length + len(sentence) > chunk_size:
+            chunks.append(''.join(current).strip())
+            # 保留結尾幾個句子作為下一個片段的開頭
+            overlap, overlap_length = [], 0
+            for previous in reversed(current):
+                if overlap_length + len(previous) > chunk_overlap:
+                    break
+                overlap.insert(0, previous)
+                overlap_length += len(previous)
+            # 重疊的句子加上本句超過 chunk_size 時，從最前面的句子開始捨棄
+            while overlap and overlap_length + len(sentence) > chunk_size:
+                overlap_length -= len(overlap.pop(0))
+            current, length = overlap, overlap_length
+        current.append(sentence)
+        length += len(sentence)
+
+    if current:
+        chunks.append(''.join(current).strip())
+    return chunks
+
+
+def get_splitter(kind: str = None, chunk_size: int = None, chunk_overlap: int = None):
+    """回傳 text -> chunks 的函式；kind: 'cjk' (預設) 或 'recursive' (LangChain，供比較)"""
+    kind = kind or settings.CHUNKER
+    chunk_size = chunk_size or settings.CHUNK_SIZE
+    chunk_overlap = settings.CHUNK_OVERLAP if chunk_overlap is None else chunk_overlap
+
+    if kind == 'recursive':
+        from langchain_text_splitters import RecursiveCharacterTextSplitter
+        return RecursiveCharacterTextSplitter(chunk_size=chunk_size, chunk_overlap=chunk_overlap).split_text
+    if kind == 'cjk':
+        return lambda text: chunk_text(clean_content(text), chunk_size, chunk_overlap)
+    raise ValueError(f"Unknown chunker: {kind}")
@@ -0,0 +1,183 @@
+"""
+近似重複文章偵測 (MinHash + LSH)
+
+PTT 上常見轉錄、新聞複製貼上與套用範本的文章，內容幾乎相同卻各自向量化，
+使向量資料庫變大，RAG 的 top_k 也常出現同一段文字的多個複本
+
+- 內文去除 ※ 開頭的系統行 (轉錄、發信站) 與網址、空白與標點後，切成連續 4 個字的片段 (shingle)
+  片段跨越詞的邊界，保留文字順序：用字相同但內容不同的文章不會被視為重複
+- 以 64 個雜湊函數計算 MinHash 簽章，簽章相同的比例即為兩篇文章片段集合 Jaccard 相似度的估計值，
+  相似度 >= DEDUP_MIN_SIMILARITY 視為近似重複，後來的文章標記 duplicate_of 指向代表文章
+- LSH：簽章分成 16 段 (每段 4 個值)，任一段完全相同才列為候選 (ArticleMinHashBand 索引查詢)，
+  不需與所有文章比較；相似度 0.7 的文章成為候選的機率約 98%，0.3 以下幾乎不會
+- 只有代表文章寫入分段索引、進行向量化；查詢時重複的文章依代表文章合併 (見 rag_query.collapse_duplicates)
+- 片段數少於 DEDUP_MIN_SHINGLES 的短文容易誤判，不參與比對
+- 內文修改過的文章 (minhash 被清除，爬蟲與熱門文章追蹤會送出向量化任務) 重新比對：
+  移除舊的分段索引，成為重複時原本指向它的文章改指向新的代表文章
+- 多個 worker 同時處理時以 Redis 鎖依序進行，否則彼此看不到對方剛寫入的代表文章，近似重複會各自成為代表文章
+"""
+import hashlib
+import re
+import unicodedata
+
+import numpy as np
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+
+from article.models import Article, ArticleMinHashBand
+from celery_app.locks import dedup_lock, release_lock
+
+SHINGLE_SIZE = 4
+NUM_PERM = 64
+BANDS = 16
+ROWS = NUM_PERM // BANDS
+
+# 雜湊函數 (a * x + b) mod p，係數固定，簽章才能跨 process 比較
+_PRIME = np.uint64((1 << 61) - 1)
+_rng = np.random.default_rng(4466)
+_A = _rng.integers(1, 1 << 32, NUM_PERM, dtype=np.uint64)
+_B = _rng.integers(0, 1 << 32, NUM_PERM, dtype=np.uint64)
+
+NOISE_RE = re.compile(r'^※.*$|https?://\S+', re.MULTILINE)
+NON_WORD_RE = re.compile(r'[\W_]+')
+
+
+def shingles(text: str) -> set:
+    text = NOISE_RE.sub('', text or '')
+    text = NON_WORD_RE.sub('', unicodedata.normalize('NFKC', text).lower())
+    return {text[i:i + SHINGLE_SIZE] for i in range(len(text) - SHINGLE_SIZE + 1)}
+
+
+def compute_minhash(text: str):
+    """回傳 MinHash 簽章 (uint32 陣列)；片段數不足時回傳 None"""
+    features = shingles(text)
+    if len(features) < settings.DEDUP_MIN_SHINGLES:
+        return None
+    hashes = np.fromiter(
+        (int.from_bytes(hashlib.blake2b(f.encode(), digest_size=4).digest(), 'big') for f in features),
+        dtype=np.uint64, count=len(features),
+    )
+    # a, b, x 都小於 2^32，乘積不會溢位
+    signature = ((np.outer(_A, hashes) + _B[:, None]) % _PRIME).min(axis=1)
+    return (signature & np.uint64(0xFFFFFFFF)).astype(np.uint32)
+
+
+def similarity(a, b) -> float:
+    """估計 Jaccard 相似度"""
+    return float(np.mean(a == b))
+
+
+def split_bands(signature) -> list:
+    """回傳 [(band, value)]，value 為該段 4 個值的雜湊 (31 bits，任何資料庫的 integer 都放得下)"""
+    return [
+        (band, int.from_bytes(
+            hashlib.blake2b(signature[band * ROWS:(band + 1) * ROWS].tobytes(), digest_size=4).digest(), 'big',
+        ) & 0x7FFFFFFF)
+        for band in range(BANDS)
+    ]
+
+
+def load_candidates(band_lists: list) -> dict:
+    """以分段索引查出任一段相同的代表文章，回傳 {(band, value): [(article_id, signature)]}"""
+    bands = {}
+    for band_list in band_lists:
+        for band, value in band_list:
+            bands.setdefault(band, set()).add(value)
+    if not bands:
+        return {}
+
+    condition = Q()
+    for band, values in bands.items():
+        condition |= Q(band=band, value__in=values)
+
+    candidates = {}
+    # 內文修改後尚未重新計算的文章 (minhash 為 None) 不列入候選
+    rows = (
+        ArticleMinHashBand.objects.filter(condition, article__minhash__isnull=False)
+        .values_list('band', 'value', 'article_id', 'article__minhash')
+    )
+    for band, value, article_id, minhash in rows:
+        candidates.setdefault((band, value), []).append((article_id, np.frombuffer(minhash, dtype=np.uint32)))
+    return candidates
+
+
+def assign_duplicates(article_ids) -> list:
+    """
+    計算文章的 MinHash 簽章，標記近似重複的文章 (duplicate_of)，回傳需要向量化的代表文章 ID
+    已處理過的文章 (minhash 已有值) 不會重新計算，任務重試時結果相同
+    """
+    if not settings.DEDUP_ENABLED:
+        return list(Article.objects.filter(id__in=article_ids).order_by('id').values_list('id', flat=True))
+
+    lock = dedup_lock()
+    if not lock.acquire():
+        # 等不到鎖 (其他 worker 異常緩慢) 時仍繼續，最差情況是少標記幾篇重複
+        print("[WARN] Timed out waiting for the dedup lock")
+        return _assign_duplicates(article_ids)
+    try:
+        return _assign_duplicates(article_ids)
+    finally:
+        release_lock(lock)
+
+
+def _assign_duplicates(article_ids) -> list:
+    # 在鎖內讀取 minhash：同一篇文章被兩個任務處理時，後面的任務會看到已處理的結果
+    articles = list(
+        Article.objects.filter(id__in=article_ids).order_by('id').only('id', 'content', 'minhash', 'duplicate_of')
+    )
+
+    pending, signatures = [], {}
+    for article in articles:
+        if article.minhash is not None:
+            continue
+        pending.append(article)
+        article.duplicate_of_id = None
+        signature = compute_minhash(article.content)
+        if signature is not None:
+            signatures[article.id] = (signature, split_bands(signature))
+
+    # 內文修改過、原本是代表文章的文章：舊內容的分段索引 (包含與自己比對) 不列入候選，寫入時移除
+    reindexed = set(
+        ArticleMinHashBand.objects.filter(article__in=pending).values_list('article_id', flat=True).distinct()
+    )
+    candidates = {
+        key: [(candidate_id, signature) for candidate_id, signature in rows if candidate_id not in reindexed]
+        for key, rows in load_candidates([bands for _, bands in signatures.values()]).items()
+    }
+    new_bands, merged = [], {}
+    for article in pending:
+        if article.id not in signatures:
+            # 短文：以空簽章記錄為已處理，不寫入分段索引
+            article.minhash = b''
+            continue
+        signature, bands = signatures[article.id]
+        article.minhash = signature.tobytes()
+
+        best = None
+        for key in bands:
+            for candidate_id, candidate_signature in candidates.get(key, []):
+                score = similarity(signature, candidate_signature)
+                if score >= settings.DEDUP_MIN_SIMILARITY and (best is None or score > best[1]):
+                    best = (candidate_id, score)
+
+        if best:
+            article.duplicate_of_id = best[0]
+            if article.id in reindexed:
+                merged[article.id] = best[0]
+            continue
+
+        # 代表文章：寫入分段索引，同一批後面的文章也能比對到
+        for band, value in bands:
+            candidates.setdefault((band, value), []).append((article.id, signature))
+            new_bands.append(ArticleMinHashBand(article_id=article.id, band=band, value=value))
+
+    with transaction.atomic():
+        Article.objects.bulk_update(pending, ['minhash', 'duplicate_of'])
+        ArticleMinHashBand.objects.filter(article_id__in=reindexed).delete()
+        ArticleMinHashBand.objects.bulk_create(new_bands)
+        for article_id, canonical_id in merged.items():
+            # 代表文章改成重複：原本的重複文章改指向新的代表文章 (duplicate_of 只有一層)
+            Article.objects.filter(duplicate_of_id=article_id).update(duplicate_of_id=canonical_id)
+
+    return [article.id for article in articles if article.duplicate_of_id is None]
@@ -0,0 +1,188 @@
+"""
+看板討論摘要 (預先產生)
+
+「今天 Stock 板在討論什麼」是最常見的問題，每次都要完整檢索並呼叫 Gemini。
+改為每次爬蟲、向量化後 (celery_app.tasks.update_board_digests_task) 依時段產生摘要並存入 BoardDigest，
+/api/digests/ 直接從資料庫回傳：
+
+- 時段：DIGEST_WINDOW_HOURS (例如 6、24 小時，依台灣時間對齊，需能整除 24)
+- 熱門話題：出現在最多篇文章標題的詞 (2~4 個字或英數字詞；出現在完全相同標題的詞只保留最長的)
+- 代表文章：推噓差最高的文章 (不含近似重複的文章)
+- 推噓統計：時段內所有文章的 Comment.tag
+- 摘要：代表文章交給 Gemini 整理；代表文章與話題都沒變時沿用上次的摘要，不重新呼叫
+
+只更新上次產生之後有新資料的時段：新發文所在的時段，以及重新抓取過 (熱門文章追蹤、看板首頁) 的文章所在的較早時段
+(推文數會改變)；更早的歷史時段可用 build_digests 指令補上
+"""
+import hashlib
+import json
+import re
+import traceback
+import unicodedata
+from datetime import timedelta
+from zoneinfo import ZoneInfo
+
+from django.conf import settings
+from django.db.models import Count, F, Q
+from django.utils import timezone
+
+from article.models import Article, BoardDigest, Comment
+from article.search_index import CJK_RUN_RE, WORD_RE
+from config.metrics import timed
+from log_app.models import Log
+
+# 標題開頭的回覆 / 轉寄與分類，例如 "Re: [新聞] "
+TITLE_PREFIX_RE = re.compile(r'^\s*(?:(?:Re|Fw|R):\s*)*(?:\[[^\]]*\]|【[^】]*】)?\s*', re.IGNORECASE)
+MIN_TOPIC_LENGTH, MAX_TOPIC_LENGTH = 2, 4
+# 話題至少要出現在幾篇文章的標題
+MIN_TOPIC_ARTICLES = 2
+# 上次產生摘要之後最多回溯的時間 (worker 停擺很久時不一次補太多時段，歷史時段由 build_digests 補上)
+MAX_CATCHUP = timedelta(days=1)
+# 每篇代表文章交給 Gemini 的內文字數
+SUMMARY_CONTENT_CHARS = 300
+
+DIGEST_PROMPT = """
+你是一個專業的 PTT 輿情分析師。以下是 PTT {board} 板在 {window} 推噓差最高的文章與熱門話題，
+請用繁體中文整理 3~5 個主要討論話題，每個話題一到兩句，並說明整體氣氛。
+
+--- 熱門話題 (標題出現次數) ---
+{topics}
+
+--- 代表文章 ---
+{articles}
+"""
+
+
+def window_start(moment, hours: int):
+    """moment 所在時段的開始時間 (依台灣時間的整點對齊；hours 需能整除 24，見 DIGEST_WINDOW_HOURS)"""
+    local = moment.astimezone(ZoneInfo(settings.CELERY_TIMEZONE))
+    return local.replace(hour=local.hour - local.hour % hours, minute=0, second=0, microsecond=0)
+
+
+def extract_topics(titles, limit: int) -> list:
+    """標題中出現在最多篇文章的詞，回傳 [{'topic': 詞, 'articles': 文章數}]"""
+    # 詞 -> 出現的標題 (Re: 回文的標題與原文相同，只算一次)
+    docs = {}
+    normalized = dict.fromkeys(unicodedata.normalize('NFKC', TITLE_PREFIX_RE.sub('', title)).lower() for title in titles)
+    for index, text in enumerate(normalized):
+        for word in WORD_RE.findall(text):
+            if len(word) >= MIN_TOPIC_LENGTH:
+                docs.setdefault(word, set()).add(index)
+        for run in CJK_RUN_RE.findall(text):
+            for i in range(len(run)):
+                for n in range(MIN_TOPIC_LENGTH, MAX_TOPIC_LENGTH + 1):
+                    if i + n <= len(run):
+                        docs.setdefault(run[i:i + n], set()).add(index)
+
+    # 出現在完全相同標題的詞 (例如「台積」「積電」「台積電」) 是同一個話題，只保留最長的 (同長度保留最先出現的)
+    best = {}
+    for gram, indexes in docs.items():
+        if len(indexes) < MIN_TOPIC_ARTICLES:
+            continue
+        key = frozenset(indexes)
+        if key not in best or len(gram) > len(best[key]):
+            best[key] = gram
+
+    topics = sorted(best.items(), key=lambda item: (-len(item[0]), -len(item[1])))
+    return [{'topic': gram, 'articles': len(indexes)} for indexes, gram in topics[:limit]]
+
+
+def get_representative_articles(articles, limit: int) -> list:
+    """推噓差最高的文章 (近似重複的文章不列入)"""
+    ranked = (
+        articles.filter(duplicate_of__isnull=True)
+        .annotate(push=Count('comments', filter=Q(comments__tag='推')),
+                  boo=Count('comments', filter=Q(comments__tag='噓')))
+        .annotate(score=F('push') - F('boo'))
+        .order_by('-score', '-post_time')
+        .values('id', 'title', 'url', 'author', 'post_time', 'content', 'push', 'boo')[:limit]
+    )
+    return list(ranked)
+
+
+def generate_summary(board: str, start, hours: int, representatives: list, topics: list) -> str:
+    # AI 相關套件在呼叫時才載入 (見 article/ai_clients.py)
+    from article.ai_clients import get_chat_model
+
+    window = f"{start:%Y-%m-%d %H:%M} 起 {hours} 小時"
+    topic_text = "、".join(f"{topic['topic']} ({topic['articles']})" for topic in topics) or "無"
+    article_text = "\n".join(
+        f"標題:{a['title']} (推 {a['push']} / 噓 {a['boo']})\n內文:{a['content'][:SUMMARY_CONTENT_CHARS]}..."
+        for a in representatives
+    )
+    prompt = DIGEST_PROMPT.format(board=board, window=window, topics=topic_text, articles=article_text)
+    with timed('generation'):
+        return get_chat_model().invoke(prompt).content
+
+
+def build_digest(board: str, hours: int, start, summarize: bool = True) -> BoardDigest:
+    """重新統計一個時段；代表文章或話題有變時才重新產生摘要"""
+    end = start + timedelta(hours=hours)
+    articles = Article.objects.filter(board=board, post_time__gte=start, post_time__lt=end)
+
+    sentiment = Comment.objects.filter(article__in=articles).aggregate(
+        push=Count('id', filter=Q(tag='推')),
+        boo=Count('id', filter=Q(tag='噓')),
+        neutral=Count('id', filter=Q(tag='→')),
+    )
+    topics = extract_topics(articles.filter(duplicate_of__isnull=True).values_list('title', flat=True),
+                            settings.DIGEST_TOPICS)
+    representatives = get_representative_articles(articles, settings.DIGEST_ARTICLES)
+
+    digest = BoardDigest.objects.filter(board=board, window_hours=hours, window_start=start).first()
+    digest = digest or BoardDigest(board=board, window_hours=hours, window_start=start)
+    digest.window_end = end
+    digest.article_count = articles.count()
+    digest.push_count = sentiment['push']
+    digest.boo_count = sentiment['boo']
+    digest.neutral_count = sentiment['neutral']
+    digest.topics = topics
+    digest.representative_articles = [
+        {'id': a['id'], 'title': a['title'], 'url': a['url'], 'author': a['author'],
+         'post_time': a['post_time'].isoformat(), 'push': a['push'], 'boo': a['boo']}
+        for a in representatives
+    ]
+
+    raw = json.dumps([[a['id'] for a in representatives], [topic['topic'] for topic in topics]])
+    fingerprint = hashlib.sha1(raw.encode('utf-8')).hexdigest()
+    if not representatives:
+        digest.summary, digest.source_fingerprint = '', fingerprint
+    elif summarize and fingerprint != digest.source_fingerprint:
+        try:
+            digest.summary = generate_summary(board, start, hours, representatives, topics)
+            digest.source_fingerprint = fingerprint
+        except Exception as e:
+            # 保留上次的摘要，指紋不更新，下次更新時會再試一次
+            print(f"[ERROR] Failed to summarize {board} {start}: {e}")
+            Log.objects.create(level='ERROR', category=f'digest-{board}', message=f'產生摘要失敗: {start} ({hours}h)',
+                               traceback=traceback.format_exc())
+
+    digest.save()
+    return digest
+
+
+def refreshed_windows(board: str, hours: int, since) -> set:
+    """since 之後抓取過的文章 (新文章或推文有更新) 所在的時段"""
+    post_times = Article.objects.filter(board=board, last_fetched_at__gte=since).values_list('post_time', flat=True)
+    return {window_start(post_time, hours) for post_time in post_times}
+
+
+def update_board_digests(board: str, now=None) -> list:
+    """
+    更新上次產生之後有新資料的時段，回傳更新的摘要：
+    上次所在 (可能尚未統計完) 到目前的時段，以及之後重新抓取過的文章所在的較早時段
+    """
+    now = now or timezone.now()
+    digests = []
+    for hours in settings.DIGEST_WINDOW_HOURS:
+        latest = BoardDigest.objects.filter(board=board, window_hours=hours).order_by('-window_start').first()
+        since = max(latest.generated_at, now - MAX_CATCHUP) if latest else now
+        starts = set()
+        start = window_start(since, hours)
+        while start <= now:
+            starts.add(start)
+            start += timedelta(hours=hours)
+        if latest:
+            starts |= refreshed_windows(board, hours, since)
+        digests.extend(build_digest(board, hours, start) for start in sorted(starts))
+    return digests
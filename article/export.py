@@ -0,0 +1,123 @@
+"""
+文章與推文的大量匯出 (NDJSON / Parquet)，供下游分析使用，取代逐頁呼叫 /api/posts/
+
+- 篩選條件與 /api/posts/ 相同 (articles_filter)，輸出欄位與 ArticleSerializer 相同
+- 以主鍵分批讀取 (WHERE id > 上一批最後一筆 ORDER BY id LIMIT n)：每批都是主鍵索引的範圍查詢，
+  不需要 COUNT / OFFSET，記憶體用量固定為一批的大小
+  (MariaDB 的 mysqlclient 預設 cursor 會把整個結果集載入記憶體，.iterator() 無法做到固定記憶體)
+- 推文以每批文章的 ID 一次查詢後合併，不逐篇查詢
+- 使用 values() 取欄位，不建立 model 物件也不經過 DRF serializer
+"""
+import json
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from rest_framework import serializers
+
+from article.models import Article, Comment
+from config.db_router import use_read_replica
+
+ARTICLE_FIELDS = ('id', 'board', 'title', 'author', 'post_time', 'url', 'content')
+COMMENT_FIELDS = ('tag', 'user_id', 'content', 'ip_datetime')
+
+# 與 API 相同的時間格式
+_datetime_field = serializers.DateTimeField()
+
+
+def fetch_batch(queryset, after_id: int, batch_size: int, include_comments: bool = True) -> list:
+    """取出 id > after_id 的下一批文章 (含推文)，回傳 dict 列表"""
+    with use_read_replica():
+        articles = list(queryset.filter(id__gt=after_id).order_by('id').values(*ARTICLE_FIELDS)[:batch_size])
+        if not articles or not include_comments:
+            return articles
+
+        comments = {article['id']: [] for article in articles}
+        rows = (
+            Comment.objects.filter(article_id__in=comments)
+            .order_by('article_id', 'id')
+            .values_list('article_id', *COMMENT_FIELDS)
+        )
+        for article_id, *values in rows:
+            comments[article_id].append(dict(zip(COMMENT_FIELDS, values)))
+
+    for article in articles:
+        article['comments'] = comments[article['id']]
+    return articles
+
+
+def iter_batches(queryset=None, batch_size=None, include_comments: bool = True):
+    """依主鍵順序逐批產生文章，直到沒有資料"""
+    queryset = Article.objects.all() if queryset is None else queryset
+    batch_size = batch_size or settings.EXPORT_BATCH_SIZE
+    after_id = 0
+    while True:
+        batch = fetch_batch(queryset, after_id, batch_size, include_comments)
+        if not batch:
+            return
+        yield batch
+        after_id = batch[-1]['id']
+
+
+async def aiter_batches(queryset=None, batch_size=None, include_comments: bool = True):
+    """iter_batches 的非同步版本 (串流回應用)，每批在執行緒內查詢，批次之間不佔用資料庫連線"""
+    queryset = Article.objects.all() if queryset is None else queryset
+    batch_size = batch_size or settings.EXPORT_BATCH_SIZE
+    after_id = 0
+    while True:
+        batch = await sync_to_async(fetch_batch)(queryset, after_id, batch_size, include_comments)
+        if not batch:
+            return
+        yield batch
+        after_id = batch[-1]['id']
+
+
+def to_ndjson(batch: list) -> bytes:
+    """一批文章轉成 NDJSON (每篇一行)"""
+    lines = []
+    for article in batch:
+        article = {**article, 'post_time': _datetime_field.to_representation(article['post_time'])}
+        lines.append(json.dumps(article, ensure_ascii=False))
+    return ('\n'.join(lines) + '\n').encode()
+
+
+def write_ndjson(file, queryset=None, batch_size=None, include_comments: bool = True) -> int:
+    """寫入 NDJSON 檔，回傳文章數"""
+    rows = 0
+    for batch in iter_batches(queryset, batch_size, include_comments):
+        file.write(to_ndjson(batch))
+        rows += len(batch)
+    return rows
+
+
+def parquet_schema(include_comments: bool = True):
+    import pyarrow as pa
+
+    fields = [
+        ('id', pa.int64()),
+        ('board', pa.string()),
+        ('title', pa.string()),
+        ('author', pa.string()),
+        ('post_time', pa.timestamp('us', tz='UTC')),
+        ('url', pa.string()),
+        ('content', pa.string()),
+    ]
+    if include_comments:
+        fields.append(('comments', pa.list_(pa.struct([(name, pa.string()) for name in COMMENT_FIELDS]))))
+    return pa.schema(fields)
+
+
+def write_parquet(path, queryset=None, batch_size=None, include_comments: bool = True) -> int:
+    """
+    寫入 Parquet 檔 (需安裝選用套件 pyarrow：poetry install --extras parquet)，每批文章寫成一個 row group，回傳文章數
+    推文存成 list<struct> 欄位
+    """
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    schema = parquet_schema(include_comments)
+    rows = 0
+    with pq.ParquetWriter(path, schema, compression='zstd') as writer:
+        for batch in iter_batches(queryset, batch_size, include_comments):
+            writer.write_table(pa.Table.from_pylist(batch, schema=schema))
+            rows += len(batch)
+    return rows
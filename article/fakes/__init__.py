@@ -0,0 +1,7 @@
+"""
+本機替身服務 (壓力測試 / 離線開發用)：
+- ptt.py: 合成的 PTT 看板與文章頁面
+- ai.py: 可重現的 embedding / chat model 與記憶體向量資料庫
+- server.py: 以 HTTP 提供上述 PTT 頁面與向量資料庫，可設定延遲與錯誤率
+以 settings.AI_BACKEND = 'fake' 與 PTT_BASE_URL 切換，正式環境不會載入
+"""
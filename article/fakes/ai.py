@@ -0,0 +1,260 @@
+"""
+Embedding / Gemini / Pinecone 的替身：結果可重現，延遲可由 settings 調整 (FAKE_*_DELAY)
+- FakeEmbeddings: 以詞的雜湊值產生向量 (hashing trick)，用字相近的文字相似度較高，檢索結果有意義
+- FakeChatModel: 不呼叫 LLM，回傳列出參考文章標題的固定格式回答
+- FakeVectorStore: 實作 PineconeVectorStore 被使用到的介面，資料存在 InMemoryIndex；
+  設定 FAKE_VECTOR_STORE_URL 時改用 RemoteIndex 連到 run_fake_services，讓 web 與 Celery worker 共用同一份資料；
+  與 Pinecone 相同，不同 namespace 的資料分開存放
+"""
+import asyncio
+import hashlib
+import json
+import re
+import threading
+import time
+import urllib.request
+import uuid
+from collections import defaultdict
+
+import numpy as np
+from django.conf import settings
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+from langchain_core.vectorstores import VectorStore
+
+from article.search_index import tokenize
+
+# 與 text-embedding-004 相同的維度
+EMBEDDING_DIMENSION = 768
+
+
+# ---------------------------------------------------------
+# Embedding
+# ---------------------------------------------------------
+
+class FakeEmbeddings(Embeddings):
+    def __init__(self, delay=None):
+        # 每次請求 (不論幾筆文字) 的延遲秒數，模擬 batch API
+        self.delay = settings.FAKE_EMBEDDING_DELAY if delay is None else delay
+
+    def embed_text(self, text: str) -> list:
+        vector = np.zeros(EMBEDDING_DIMENSION)
+        for term in tokenize(text) or [text]:
+            digest = int.from_bytes(hashlib.md5(term.encode()).digest()[:8], 'big')
+            vector[digest % EMBEDDING_DIMENSION] += 1.0 if digest >> 63 else -1.0
+        norm = np.linalg.norm(vector)
+        return (vector / norm if norm else vector).tolist()
+
+    def embed_documents(self, texts, **kwargs):
+        time.sleep(self.delay)
+        return [self.embed_text(text) for text in texts]
+
+    def embed_query(self, text, **kwargs):
+        return self.embed_documents([text])[0]
+
+    async def aembed_documents(self, texts, **kwargs):
+        await asyncio.sleep(self.delay)
+        return [self.embed_text(text) for text in texts]
+
+    async def aembed_query(self, text, **kwargs):
+        return (await self.aembed_documents([text]))[0]
+
+
+# ---------------------------------------------------------
+# Chat model
+# ---------------------------------------------------------
+
+class FakeChatModel(BaseChatModel):
+    delay: float = 0.0
+
+    @property
+    def _llm_type(self) -> str:
+        return 'fake-chat'
+
+    def answer(self, messages) -> ChatResult:
+        prompt = messages[-1].content
+        titles = re.findall(r'^\s*標題:(.*)$', prompt, re.MULTILINE)
+        if titles:
+            text = f"(離線測試回答) 參考 {len(titles)} 篇文章：" + '、'.join(title.strip() for title in titles)
+        else:
+            text = "找不到相關討論"
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=text))])
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs):
+        time.sleep(self.delay)
+        return self.answer(messages)
+
+    async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs):
+        await asyncio.sleep(self.delay)
+        return self.answer(messages)
+
+
+# ---------------------------------------------------------
+# 向量資料庫
+# ---------------------------------------------------------
+
+def match_filter(metadata: dict, filter: dict) -> bool:
+    """支援 Pinecone 的等於條件與 $eq / $in"""
+    for key, condition in (filter or {}).items():
+        value = metadata.get(key)
+        if isinstance(condition, dict):
+            if '$eq' in condition and value != condition['$eq']:
+                return False
+            if '$in' in condition and value not in condition['$in']:
+                return False
+        elif value != condition:
+            return False
+    return True
+
+
+class InMemoryIndex:
+    """以 numpy 矩陣暴力計算 cosine similarity (向量皆已正規化，內積即相似度)"""
+
+    def __init__(self):
+        self._records = {}
+        self._matrix = None
+        self._lock = threading.Lock()
+
+    def upsert(self, records: list):
+        with self._lock:
+            for record in records:
+                self._records[record['id']] = record
+            self._matrix = None
+
+    def delete(self, ids=None, filter=None):
+        with self._lock:
+            for record_id in list(ids or []):
+                self._records.pop(record_id, None)
+            if filter:
+                for record_id, record in list(self._records.items()):
+                    if match_filter(record['metadata'], filter):
+                        del self._records[record_id]
+            self._matrix = None
+
+    def query(self, vector: list, k: int, filter=None) -> list:
+        with self._lock:
+            records = list(self._records.values())
+            if self._matrix is None and records:
+                self._matrix = np.array([record['values'] for record in records])
+            matrix = self._matrix
+
+        if not records:
+            return []
+        scores = matrix @ np.array(vector)
+        results = []
+        for index in np.argsort(-scores):
+            record = records[index]
+            if match_filter(record['metadata'], filter):
+                results.append({'id': record['id'], 'text': record['text'],
+                                'metadata': record['metadata'], 'score': float(scores[index])})
+                if len(results) >= k:
+                    break
+        return results
+
+    def stats(self) -> dict:
+        return {'count': len(self._records)}
+
+
+class RemoteIndex:
+    """透過 HTTP 存取 run_fake_services 內的 InMemoryIndex，介面與 InMemoryIndex 相同"""
+
+    def __init__(self, url: str, namespace: str = ''):
+        self.url = url.rstrip('/')
+        self.namespace = namespace
+
+    def call(self, action: str, payload=None):
+        request = urllib.request.Request(
+            f"{self.url}/vectors/{action}",
+            data=json.dumps({**(payload or {}), 'namespace': self.namespace}).encode(),
+            headers={'Content-Type': 'application/json'},
+            method='POST',
+        )
+        with urllib.request.urlopen(request, timeout=30) as response:
+            return json.loads(response.read())
+
+    def upsert(self, records: list):
+        self.call('upsert', {'records': records})
+
+    def delete(self, ids=None, filter=None):
+        self.call('delete', {'ids': ids, 'filter': filter})
+
+    def query(self, vector: list, k: int, filter=None) -> list:
+        return self.call('query', {'vector': vector, 'k': k, 'filter': filter})['matches']
+
+    def stats(self) -> dict:
+        return self.call('stats')
+
+
+class FakeVectorStore(VectorStore):
+    def __init__(self, embedding, index, delay=None):
+        self._embedding = embedding
+        self.index = index
+        # 每次查詢的延遲秒數，模擬網路往返
+        self.delay = settings.FAKE_VECTOR_QUERY_DELAY if delay is None else delay
+
+    @property
+    def embeddings(self):
+        return self._embedding
+
+    def add_texts(self, texts, metadatas=None, ids=None, **kwargs):
+        texts = list(texts)
+        metadatas = metadatas or [{} for _ in texts]
+        ids = ids or [str(uuid.uuid4()) for _ in texts]
+        vectors = self._embedding.embed_documents(texts)
+        self.index.upsert([
+            {'id': record_id, 'values': vector, 'text': text, 'metadata': metadata}
+            for record_id, vector, text, metadata in zip(ids, vectors, texts, metadatas)
+        ])
+        return ids
+
+    def delete(self, ids=None, **kwargs):
+        self.index.delete(ids=ids, filter=kwargs.get('filter'))
+        return True
+
+    def to_results(self, matches):
+        return [(Document(page_content=m['text'], metadata=m['metadata']), m['score']) for m in matches]
+
+    def similarity_search_by_vector_with_score(self, embedding, k=4, filter=None, **kwargs):
+        time.sleep(self.delay)
+        return self.to_results(self.index.query(embedding, k, filter))
+
+    def similarity_search_with_score(self, query, k=4, filter=None, **kwargs):
+        return self.similarity_search_by_vector_with_score(self._embedding.embed_query(query), k, filter)
+
+    def similarity_search(self, query, k=4, **kwargs):
+        return [document for document, _ in self.similarity_search_with_score(query, k, **kwargs)]
+
+    async def asimilarity_search_by_vector_with_score(self, embedding, k=4, filter=None, **kwargs):
+        await asyncio.sleep(self.delay)
+        return self.to_results(await asyncio.to_thread(self.index.query, embedding, k, filter))
+
+    async def asimilarity_search_with_score(self, query, k=4, filter=None, **kwargs):
+        embedding = await self._embedding.aembed_query(query)
+        return await self.asimilarity_search_by_vector_with_score(embedding, k, filter)
+
+    @classmethod
+    def from_texts(cls, texts, embedding, metadatas=None, **kwargs):
+        store = cls(embedding, InMemoryIndex())
+        store.add_texts(texts, metadatas)
+        return store
+
+
+# 未設定 FAKE_VECTOR_STORE_URL 時，同一個 process 內共用這份資料 (依 namespace 分開)
+_local_indexes = defaultdict(InMemoryIndex)
+_local_index = _local_indexes['']
+
+
+def get_fake_vector_store(embedding=None, namespace=None):
+    namespace = namespace or ''
+    if settings.FAKE_VECTOR_STORE_URL:
+        index = RemoteIndex(settings.FAKE_VECTOR_STORE_URL, namespace)
+    else:
+        index = _local_indexes[namespace]
+    return FakeVectorStore(embedding or FakeEmbeddings(), index)
+
+
+def get_fake_chat_model():
+    return FakeChatModel(delay=settings.FAKE_CHAT_DELAY)
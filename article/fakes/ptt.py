@@ -0,0 +1,114 @@
+"""
+合成的 PTT 網站：頁面內容由看板名稱與文章編號決定，每次產生的結果都相同
+- 看板共 pages 頁，每頁 articles_per_page 篇，第 N 頁 (最新一頁) 即 index.html
+- 文章網址中的時間戳記與文章編號一一對應，可由網址反推文章內容
+"""
+import random
+import re
+from datetime import datetime
+from zoneinfo import ZoneInfo
+
+BASE_TIMESTAMP = 1705276800  # 2024-01-15 08:00 (台灣時間)
+# 相鄰兩篇文章的發文間隔 (秒)
+ARTICLE_INTERVAL = 60
+
+WORDS = [
+    '台積電', '輝達', '外資', '法說會', '營收', '毛利率', '升息', '降息', '殖利率', 'ETF',
+    '0050', '散熱', '伺服器', 'AI', '半導體', '融資', '當沖', '除息', '目標價', '財報',
+]
+TITLE_PREFIXES = ['[新聞]', '[標的]', '[請益]', '[情報]', '[心得]', '[閒聊]']
+COMMENT_TAGS = ['推', '推', '→', '噓']
+USERS = ['stockman', 'kiwi0301', 'ETFlover', 'vivian88', 'semicon', 'bear666', 'bull777']
+
+INDEX_PATH_RE = re.compile(r'^/bbs/(\w+)/index(\d*)\.html$')
+ARTICLE_PATH_RE = re.compile(r'^/bbs/(\w+)/M\.(\d+)\.A\.\w+\.html$')
+
+
+def make_sentence(rng, words=12):
+    return ' '.join(rng.choice(WORDS) for _ in range(words)) + '。'
+
+
+def make_article_path(board, index):
+    return f"/bbs/{board}/M.{BASE_TIMESTAMP + index * ARTICLE_INTERVAL}.A.{index % 4096:03X}.html"
+
+
+def make_article_data(index, comments=50, paragraphs=20, seed=None):
+    """產生與 scraper.get_data_from_article_html 回傳格式相同的文章資料"""
+    rng = random.Random(index if seed is None else seed)
+    return {
+        'title': f"{rng.choice(TITLE_PREFIXES)} {make_sentence(rng, 4)}",
+        'author': rng.choice(USERS),
+        'content': '\n'.join(make_sentence(rng) for _ in range(paragraphs)),
+        'post_time': datetime.fromtimestamp(BASE_TIMESTAMP + index * ARTICLE_INTERVAL, ZoneInfo('Asia/Taipei')),
+        'comments': [
+            {
+                'tag': rng.choice(COMMENT_TAGS),
+                'user_id': rng.choice(USERS),
+                'content': make_sentence(rng, 3),
+                'ip_datetime': f"1.160.{rng.randrange(256)}.{rng.randrange(256)} 01/15 {i // 60 % 24:02d}:{i % 60:02d}",
+            }
+            for i in range(comments)
+        ],
+    }
+
+
+def render_board_html(board, paths, page=None):
+    """產生看板列表頁 HTML (只包含解析器會用到的結構)；page 為目前頁碼，有上一頁時加上「‹ 上頁」連結"""
+    paging = f'<a class="btn wide" href="/bbs/{board}/index1.html">最舊</a>'
+    if page and page > 1:
+        paging += f'<a class="btn wide" href="/bbs/{board}/index{page - 1}.html">&lsaquo; 上頁</a>'
+    entries = ''.join(
+        f'<div class="r-ent"><div class="title"><a href="{path}">標題</a></div></div>'
+        for path in paths
+    )
+    return f'<div class="btn-group btn-group-paging">{paging}</div><div class="r-list-container">{entries}</div>'
+
+
+def render_article_html(board, data):
+    """產生 PTT 文章頁 HTML，解析後可得到與 data 相同的內容"""
+    meta = ''.join(
+        f'<div class="article-metaline"><span class="article-meta-tag">{tag}</span>'
+        f'<span class="article-meta-value">{value}</span></div>'
+        for tag, value in [
+            ('作者', f"{data['author']} (暱稱)"),
+            ('看板', board),
+            ('標題', data['title']),
+            ('時間', data['post_time'].strftime('%a %b %d %H:%M:%S %Y')),
+        ]
+    )
+    pushes = ''.join(
+        f'<div class="push"><span class="push-tag">{c["tag"]} </span><span class="push-userid">{c["user_id"]}</span>'
+        f'<span class="push-content">: {c["content"]}</span><span class="push-ipdatetime"> {c["ip_datetime"]}\n</span></div>'
+        for c in data['comments']
+    )
+    return (
+        f'<div id="main-content" class="bbs-screen bbs-content">{meta}\n{data["content"]}\n--\n'
+        f'<span class="f2">※ 發信站: 批踢踢實業坊(ptt.cc), 來自: 1.160.10.20 (臺灣)\n</span>{pushes}</div>'
+    )
+
+
+class SyntheticPtt:
+    """依路徑產生頁面；不存在的頁面回傳 None"""
+
+    def __init__(self, pages=100, articles_per_page=20, comments=50):
+        self.pages = pages
+        self.articles_per_page = articles_per_page
+        self.comments = comments
+
+    def render(self, path):
+        if match := INDEX_PATH_RE.match(path):
+            board, page = match.group(1), int(match.group(2) or self.pages)
+            if not 1 <= page <= self.pages:
+                return None
+            start = (page - 1) * self.articles_per_page
+            paths = [make_article_path(board, i) for i in range(start, start + self.articles_per_page)]
+            return render_board_html(board, paths, page)
+
+        if match := ARTICLE_PATH_RE.match(path):
+            board, timestamp = match.group(1), int(match.group(2))
+            index, remainder = divmod(timestamp - BASE_TIMESTAMP, ARTICLE_INTERVAL)
+            if remainder or not 0 <= index < self.pages * self.articles_per_page:
+                return None
+            return render_article_html(board, make_article_data(index, comments=self.comments))
+
+        return None
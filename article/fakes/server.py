@@ -0,0 +1,85 @@
+"""
+本機替身 HTTP 服務 (由 run_fake_services 啟動)：
+- GET  /bbs/...           PTT 看板列表頁與文章頁 (優先回放錄製的頁面，沒有則由 SyntheticPtt 產生)
+- POST /vectors/<action>  向量資料庫 (upsert / query / delete / stats)，供 RemoteIndex 使用，依 namespace 分開存放
+PTT 頁面可設定延遲與錯誤率 (回傳 503，爬蟲的重試機制會處理)
+"""
+import json
+import random
+import time
+from collections import defaultdict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+from article.fakes.ai import InMemoryIndex
+
+
+class FakeServicesHandler(BaseHTTPRequestHandler):
+    # 以下由 make_server 設定
+    site = None
+    pages_dir = None
+    indexes = None
+    latency = 0.0
+    jitter = 0.0
+    error_rate = 0.0
+
+    def send_body(self, status, body: bytes, content_type):
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        path = self.path.split('?')[0]
+        time.sleep(max(self.latency + random.uniform(-self.jitter, self.jitter), 0))
+        if random.random() < self.error_rate:
+            self.send_body(503, b'Service Unavailable', 'text/plain')
+            return
+
+        html = None
+        if self.pages_dir and (recorded := self.pages_dir / path.lstrip('/')).is_file():
+            html = recorded.read_text(encoding='utf-8')
+        elif self.site:
+            html = self.site.render(path)
+
+        if html is None:
+            self.send_body(404, b'Not Found', 'text/plain')
+        else:
+            self.send_body(200, html.encode(), 'text/html; charset=utf-8')
+
+    def do_POST(self):
+        action = self.path.removeprefix('/vectors/').split('?')[0]
+        payload = json.loads(self.rfile.read(int(self.headers.get('Content-Length') or 0)) or b'{}')
+        index = self.indexes[payload.get('namespace') or '']
+
+        if action == 'upsert':
+            index.upsert(payload['records'])
+            result = {'upserted': len(payload['records'])}
+        elif action == 'query':
+            result = {'matches': index.query(payload['vector'], payload['k'], payload.get('filter'))}
+        elif action == 'delete':
+            index.delete(payload.get('ids'), payload.get('filter'))
+            result = {}
+        elif action == 'stats':
+            result = index.stats()
+        else:
+            self.send_body(404, b'{}', 'application/json')
+            return
+        self.send_body(200, json.dumps(result).encode(), 'application/json')
+
+    def log_message(self, format, *args):
+        # 壓力測試時請求量大，不逐筆輸出
+        pass
+
+
+def make_server(host, port, site=None, pages_dir=None, latency=0.0, jitter=0.0, error_rate=0.0):
+    handler = type('Handler', (FakeServicesHandler,), {
+        'site': site,
+        'pages_dir': Path(pages_dir) if pages_dir else None,
+        'indexes': defaultdict(InMemoryIndex),
+        'latency': latency,
+        'jitter': jitter,
+        'error_rate': error_rate,
+    })
+    return ThreadingHTTPServer((host, port), handler)
@@ -0,0 +1,80 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from zoneinfo import ZoneInfo
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from celery_app.backfill import create_job, load_job, run_shard, get_job_report
+from celery_app.data_processing import store_data_in_pinecone
+from celery_app.tasks import backfill_board_task
+
+
+class Command(BaseCommand):
+    help = "回補看板的歷史文章 (依頁碼或日期範圍，分片平行執行，中斷後以相同參數重新執行會從斷點繼續)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('board', help="看板名稱，例如 Stock")
+        parser.add_argument('--start-page', type=int, help="起始頁碼 (預設為第 1 頁)")
+        parser.add_argument('--end-page', type=int, help="結束頁碼 (預設為最新一頁的前一頁，最新一頁由爬蟲任務處理)")
+        parser.add_argument('--since', help="起始日期 YYYY-MM-DD (台灣時間)，優先於 --start-page")
+        parser.add_argument('--until', help="結束日期 YYYY-MM-DD (不含當天)，優先於 --end-page")
+        parser.add_argument('--shards', type=int, default=settings.PTT_BACKFILL_SHARDS, help="分片數 (平行執行數)")
+        parser.add_argument('--restart', action='store_true', help="忽略之前的進度重新開始")
+        parser.add_argument('--no-embed', action='store_true', help="只寫入資料庫，不送出向量化任務")
+        parser.add_argument('--celery', action='store_true', help="送到 Celery backfill 佇列執行，而不是在本機執行")
+
+    def parse_date(self, value):
+        if not value:
+            return None
+        try:
+            date = datetime.strptime(value, '%Y-%m-%d').replace(tzinfo=ZoneInfo(settings.CELERY_TIMEZONE))
+        except ValueError:
+            raise CommandError(f"Invalid date: {value} (expected YYYY-MM-DD)")
+        return int(date.timestamp())
+
+    def handle(self, *args, **options):
+        board = options['board']
+        since, until = self.parse_date(options['since']), self.parse_date(options['until'])
+
+        if options['celery']:
+            result = backfill_board_task.delay(
+                board, options['start_page'], options['end_page'], since, until, options['shards'], options['restart'],
+            )
+            self.stdout.write(self.style.SUCCESS(f"[SUCCESS] Sent backfill task {result.id} for {board}"))
+            return
+
+        job_id = create_job(board, options['start_page'], options['end_page'], options['shards'], since, until,
+                            options['restart'])
+        self.stdout.write(f"[INFO] Backfill job {job_id}: pages {get_job_report(job_id)['pages']}")
+
+        embed = None if options['no_embed'] else store_data_in_pinecone.delay
+        shards = load_job(job_id)['shards']
+        articles_before = get_job_report(job_id)['articles']
+        started = time.monotonic()
+
+        def run(shard):
+            try:
+                return run_shard(job_id, shard, embed=embed)
+            finally:
+                # 每個執行緒各自持有資料庫連線，結束時關閉
+                connection.close()
+
+        with ThreadPoolExecutor(max_workers=shards) as executor:
+            list(executor.map(run, range(shards)))
+
+        report = get_job_report(job_id)
+        for shard in report['shards']:
+            self.stdout.write(
+                f"[INFO] Shard {shard['shard']}: pages {shard['pages']}, "
+                f"{shard['articles']} articles, {shard['articles_per_min']} articles/min"
+            )
+
+        minutes = (time.monotonic() - started) / 60
+        articles = report['articles'] - articles_before
+        self.stdout.write(self.style.SUCCESS(
+            f"[SUCCESS] Backfilled {articles} articles in {minutes:.1f} min "
+            f"({articles / minutes if minutes else 0:.1f} articles/min, total {report['articles']})"
+        ))
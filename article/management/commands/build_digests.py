@@ -0,0 +1,33 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from article.digest import build_digest, window_start
+
+
+class Command(BaseCommand):
+    help = "重新產生最近幾天的看板摘要 (排程只更新有新資料的時段，歷史時段或調整設定後用此指令補上)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--board', action='append', dest='boards', help="指定看板，可重複指定 (預設為所有爬蟲看板)")
+        parser.add_argument('--days', type=int, default=7, help="回溯的天數")
+        parser.add_argument('--no-summary', action='store_true', help="只更新話題、代表文章與推噓統計，不呼叫 Gemini")
+
+    def handle(self, *args, **options):
+        boards = options['boards'] or list(settings.PTT_SCRAPE_BOARDS)
+        now = timezone.now()
+
+        total = 0
+        for board in boards:
+            for hours in settings.DIGEST_WINDOW_HOURS:
+                start = window_start(now - timedelta(days=options['days']), hours)
+                while start <= now:
+                    digest = build_digest(board, hours, start, summarize=not options['no_summary'])
+                    total += 1
+                    if digest.article_count:
+                        self.stdout.write(f"[INFO] {digest}: {digest.article_count} articles")
+                    start += timedelta(hours=hours)
+
+        self.stdout.write(self.style.SUCCESS(f"[SUCCESS] Built {total} digests for {', '.join(boards)}"))
@@ -0,0 +1,33 @@
+from django.core.management.base import BaseCommand
+
+from article.dedup import assign_duplicates
+from article.models import Article
+
+
+class Command(BaseCommand):
+    help = "計算既有文章 (含內文修改過的文章) 的 MinHash 簽章並標記近似重複的文章 (之後的新文章才能與既有文章比對)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--board', help="只處理指定看板的文章")
+        parser.add_argument('--chunk-size', type=int, default=500, help="每次處理的文章數")
+
+    def handle(self, *args, **options):
+        articles = Article.objects.filter(minhash__isnull=True).order_by('id')
+        if options['board']:
+            articles = articles.filter(board=options['board'])
+
+        total = articles.count()
+        processed = duplicates = 0
+        after_id = 0
+        # 依 id 順序分批處理，較早的文章成為代表文章
+        while ids := list(articles.filter(id__gt=after_id).values_list('id', flat=True)[:options['chunk_size']]):
+            canonical_ids = assign_duplicates(ids)
+            processed += len(ids)
+            duplicates += len(ids) - len(canonical_ids)
+            after_id = ids[-1]
+            self.stdout.write(f"[INFO] Processed {processed}/{total} articles, {duplicates} near-duplicates")
+
+        self.stdout.write(self.style.SUCCESS(
+            f"[SUCCESS] Marked {duplicates} of {processed} articles as near-duplicates "
+            f"(already embedded duplicates are collapsed at query time)"
+        ))
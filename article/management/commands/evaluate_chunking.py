@@ -0,0 +1,62 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from article.ai_clients import get_embeddings
+from article.chunk_eval import evaluate, load_questions, parse_config
+from article.models import Article
+
+DEFAULT_CONFIGS = ['recursive:300:50', 'cjk:300:50', 'cjk:500:80']
+
+
+class Command(BaseCommand):
+    help = "以標註的問題集比較切塊設定：片段數、embedding 字數與檢索命中率 (向量存在記憶體，不寫入 Pinecone)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('questions', help="問題集 (JSON Lines，每行 {\"question\": ..., \"urls\": [...]})")
+        parser.add_argument('--config', action='append', dest='configs',
+                            help=f"切塊設定 chunker:chunk_size:chunk_overlap，可重複指定 (預設 {' '.join(DEFAULT_CONFIGS)})")
+        parser.add_argument('--board', help="干擾文章的看板 (預設不限)")
+        parser.add_argument('--distractors', type=int, default=1000, help="除了正確文章外，再加入幾篇最新的文章")
+        parser.add_argument('--top-k', type=int, default=5)
+        parser.add_argument('--output', help="另外輸出 JSON 結果到檔案")
+
+    def handle(self, *args, **options):
+        try:
+            configs = [parse_config(value) for value in options['configs'] or DEFAULT_CONFIGS]
+        except ValueError:
+            raise CommandError("--config must look like cjk:300:50")
+        questions = load_questions(options['questions'])
+
+        # 問題對應的文章 (以網址比對) + 干擾文章
+        urls = {url for question in questions for url in question['urls']}
+        url_to_id = dict(Article.objects.filter(url__in=urls).values_list('url', 'id'))
+        if missing := urls - set(url_to_id):
+            self.stderr.write(f"[WARN] {len(missing)} labeled articles not found, e.g. {next(iter(missing))}")
+        for question in questions:
+            question['article_ids'] = {url_to_id[url] for url in question['urls'] if url in url_to_id}
+        questions = [question for question in questions if question['article_ids']]
+        if not questions:
+            raise CommandError("No question has a labeled article in the database")
+
+        distractors = Article.objects.exclude(id__in=url_to_id.values()).order_by('-post_time')
+        if options['board']:
+            distractors = distractors.filter(board=options['board'])
+        articles = list(Article.objects.filter(id__in=url_to_id.values())) + list(distractors[:options['distractors']])
+        self.stdout.write(f"[INFO] {len(questions)} questions, {len(articles)} articles")
+
+        embeddings = get_embeddings()
+        results = []
+        for config in configs:
+            result = evaluate(config, articles, questions, embeddings, options['top_k'])
+            results.append(result)
+            self.stdout.write(
+                f"{result['config']:<20} chunks={result['chunks']:<7} chars={result['embedded_chars']:<9} "
+                f"avg={result['avg_chunk_chars']:<6} hit@{options['top_k']}={result['hit_rate']:<6} "
+                f"mrr={result['mrr']:<6} embed={result['embed_seconds']}s"
+            )
+
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as file:
+                json.dump(results, file, ensure_ascii=False, indent=2)
+        self.stdout.write(self.style.SUCCESS(f"[SUCCESS] Evaluated {len(configs)} chunking configs"))
@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand
+
+from article.models import Article
+from article.search_index import index_article
+
+
+class Command(BaseCommand):
+    help = "重建文章全文檢索索引 (ArticleTerm)，用於既有資料或調整切詞規則後"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--board', help="只重建指定看板的文章")
+        parser.add_argument('--chunk-size', type=int, default=500, help="每次從資料庫讀取的文章數")
+
+    def handle(self, *args, **options):
+        articles = Article.objects.order_by('id')
+        if options['board']:
+            articles = articles.filter(board=options['board'])
+
+        total = articles.count()
+        for count, article in enumerate(articles.iterator(chunk_size=options['chunk_size']), start=1):
+            index_article(article)
+            if count % 1000 == 0:
+                self.stdout.write(f"[INFO] Indexed {count}/{total} articles")
+
+        self.stdout.write(self.style.SUCCESS(f"[SUCCESS] Rebuilt search index for {total} articles"))
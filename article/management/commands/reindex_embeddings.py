@@ -0,0 +1,78 @@
+import json
+import os
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from article.ai_clients import get_active_target, get_previous_target, switch_target
+from celery_app.reindex import create_job, cancel_job, run_job, get_job_report
+from celery_app.tasks import reindex_embeddings_task
+
+
+class Command(BaseCommand):
+    help = ("更換 embedding 模型：重新向量化所有文章到新的 namespace，完成後切換查詢使用的模型 "
+            "(中斷後重新執行 start 會從斷點繼續)")
+
+    def add_arguments(self, parser):
+        parser.add_argument('action', choices=['start', 'status', 'cancel', 'rollback'],
+                            help="start: 開始或繼續；status: 進度；cancel: 停止；rollback: 切回上一個模型")
+        parser.add_argument('--model', default=os.getenv('GOOGLE_EMBEDDINGS_MODEL'),
+                            help="新的 embedding 模型 (預設為 GOOGLE_EMBEDDINGS_MODEL)")
+        parser.add_argument('--namespace', help="寫入的 Pinecone namespace (預設依模型名稱與時間產生)")
+        parser.add_argument('--index', help="寫入的 Pinecone index (新模型維度不同時需指定另一個 index)")
+        parser.add_argument('--restart', action='store_true', help="放棄進行中的工作重新開始")
+        parser.add_argument('--celery', action='store_true', help="送到 Celery embedding 佇列執行，而不是在本機執行")
+
+    def handle(self, *args, **options):
+        getattr(self, options['action'])(options)
+
+    def write_report(self):
+        report = get_job_report()
+        if not report:
+            self.stdout.write("[INFO] No re-embedding job")
+            return
+        eta = f"{report['eta_seconds'] / 60:.1f} min" if report['eta_seconds'] is not None else '-'
+        self.stdout.write(
+            f"[INFO] {report['status']} -> {report['target']['namespace']} ({report['target']['model']}): "
+            f"{report['articles']} articles ({report['progress']}%), {report['chunks']} chunks, "
+            f"{report['articles_per_min']} articles/min, ETA {eta}"
+        )
+
+    def start(self, options):
+        if not options['model']:
+            raise CommandError("--model is required (GOOGLE_EMBEDDINGS_MODEL is not set)")
+        try:
+            job = create_job(options['model'], options['namespace'], options['index'], options['restart'])
+        except ValueError as e:
+            raise CommandError(str(e))
+        self.stdout.write(f"[INFO] Re-embedding into {json.dumps(job['target'])}, from article {job['last_id']}")
+
+        if options['celery']:
+            result = reindex_embeddings_task.delay()
+            self.stdout.write(self.style.SUCCESS(f"[SUCCESS] Sent re-embedding task {result.id}"))
+            return
+
+        # 每批完成後輸出進度；中斷 (Ctrl+C) 後重新執行 start 會從最後的 checkpoint 繼續
+        started = time.monotonic()
+        while not run_job(max_batches=1):
+            self.write_report()
+        self.write_report()
+        self.stdout.write(self.style.SUCCESS(
+            f"[SUCCESS] Finished in {(time.monotonic() - started) / 60:.1f} min, active target: {get_active_target()}"
+        ))
+
+    def status(self, options):
+        self.stdout.write(f"[INFO] Active target: {get_active_target()}")
+        self.write_report()
+
+    def cancel(self, options):
+        if not cancel_job():
+            raise CommandError("No running re-embedding job")
+        self.stdout.write(self.style.SUCCESS("[SUCCESS] Re-embedding cancelled"))
+
+    def rollback(self, options):
+        previous = get_previous_target()
+        if not previous:
+            raise CommandError("No previous target to roll back to")
+        switch_target(previous)
+        self.stdout.write(self.style.SUCCESS(f"[SUCCESS] Switched back to {previous}"))
@@ -0,0 +1,36 @@
+from django.core.management.base import BaseCommand
+
+from article.fakes.ptt import SyntheticPtt
+from article.fakes.server import make_server
+
+
+class Command(BaseCommand):
+    help = "啟動本機替身服務 (PTT 頁面與向量資料庫)，供離線壓力測試使用"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--host', default='0.0.0.0')
+        parser.add_argument('--port', type=int, default=8090)
+        parser.add_argument('--pages', type=int, default=100, help="合成看板的頁數")
+        parser.add_argument('--articles-per-page', type=int, default=20)
+        parser.add_argument('--comments', type=int, default=50, help="每篇合成文章的推文數")
+        parser.add_argument('--pages-dir', help="錄製的 PTT 頁面目錄 (路徑對應網址，例如 bbs/Stock/index.html)，優先於合成頁面")
+        parser.add_argument('--latency', type=float, default=0.2, help="PTT 頁面的平均延遲 (秒)")
+        parser.add_argument('--jitter', type=float, default=0.1, help="延遲的隨機變動範圍 (秒)")
+        parser.add_argument('--error-rate', type=float, default=0.0, help="PTT 頁面回傳 503 的比例 (0 ~ 1)")
+
+    def handle(self, *args, **options):
+        site = SyntheticPtt(options['pages'], options['articles_per_page'], options['comments'])
+        server = make_server(
+            options['host'], options['port'], site=site, pages_dir=options['pages_dir'],
+            latency=options['latency'], jitter=options['jitter'], error_rate=options['error_rate'],
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f"[SUCCESS] Fake services listening on {options['host']}:{options['port']} "
+            f"(PTT: /bbs/..., vector store: /vectors/...)"
+        ))
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
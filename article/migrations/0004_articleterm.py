@@ -0,0 +1,27 @@
+# Generated by Django 5.2.18 on 2026-10-18 22:14
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('article', '0003_rename_ip_datename_comment_ip_datetime'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArticleTerm',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('term', models.CharField(max_length=32)),
+                ('weight', models.PositiveIntegerField()),
+                ('article', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='terms', to='article.article')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['term', 'article', 'weight'], name='article_term_lookup_idx')],
+                'constraints': [models.UniqueConstraint(fields=('article', 'term'), name='unique_article_term')],
+            },
+        ),
+    ]
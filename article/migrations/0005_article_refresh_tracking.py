@@ -0,0 +1,38 @@
+# Generated by Django 5.2.18 on 2026-10-18 22:25
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('article', '0004_articleterm'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='article',
+            name='comment_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='article',
+            name='last_fetched_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='article',
+            name='next_refresh_at',
+            field=models.DateTimeField(blank=True, db_index=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='article',
+            name='push_velocity',
+            field=models.FloatField(default=0),
+        ),
+        migrations.AlterField(
+            model_name='article',
+            name='url',
+            field=models.URLField(db_index=True, max_length=255),
+        ),
+    ]
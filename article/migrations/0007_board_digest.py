@@ -0,0 +1,35 @@
+# Generated by Django 5.2.18 on 2026-10-18 23:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('article', '0006_article_dedup'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BoardDigest',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('board', models.CharField(max_length=100)),
+                ('window_hours', models.PositiveSmallIntegerField()),
+                ('window_start', models.DateTimeField()),
+                ('window_end', models.DateTimeField()),
+                ('article_count', models.PositiveIntegerField(default=0)),
+                ('push_count', models.PositiveIntegerField(default=0)),
+                ('boo_count', models.PositiveIntegerField(default=0)),
+                ('neutral_count', models.PositiveIntegerField(default=0)),
+                ('topics', models.JSONField(default=list)),
+                ('representative_articles', models.JSONField(default=list)),
+                ('summary', models.TextField(blank=True)),
+                ('source_fingerprint', models.CharField(blank=True, max_length=40)),
+                ('generated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('board', 'window_hours', 'window_start'), name='unique_board_digest_window')],
+            },
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 5.2.18 on 2026-10-19 00:08
+
+from django.db import migrations, models
+from django.db.models import Count, Min
+
+
+def delete_duplicate_urls(apps, schema_editor):
+    # 加上唯一限制前，同一網址重複寫入的文章只保留最早的一筆 (推文、索引隨之刪除)
+    Article = apps.get_model('article', 'Article')
+    duplicated = (Article.objects.values('url').annotate(count=Count('id'), first_id=Min('id'))
+                  .filter(count__gt=1))
+    for row in duplicated:
+        Article.objects.filter(url=row['url']).exclude(id=row['first_id']).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('article', '0007_board_digest'),
+    ]
+
+    operations = [
+        migrations.RunPython(delete_duplicate_urls, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='article',
+            name='url',
+            field=models.URLField(max_length=255, unique=True),
+        ),
+    ]
@@ -1,3 +1,6 @@
+from zoneinfo import ZoneInfo
+
+from django.conf import settings
 from django.db import models
 
 # Create your models here.
@@ -7,7 +10,18 @@ class Article(models.Model):
     author = models.CharField(max_length=100) # 作者帳號
     content = models.TextField() # 文章內文
     post_time = models.DateTimeField() # po文時間
-    url = models.URLField(max_length=255) # 文章連結
+    url = models.URLField(max_length=255, unique=True) # 文章連結 (爬蟲以此判斷文章是否已存在)
+
+    # --- 熱門文章推文追蹤 (見 article/refresh.py) ---
+    comment_count = models.PositiveIntegerField(default=0) # 上次抓取時的推文數
+    push_velocity = models.FloatField(default=0) # 推文速度 (每小時新增推文數，EWMA 平滑)
+    last_fetched_at = models.DateTimeField(null=True, blank=True) # 上次抓取時間
+    next_refresh_at = models.DateTimeField(null=True, blank=True, db_index=True) # 下次重新抓取時間，None 代表不再追蹤
+
+    # --- 近似重複偵測 (見 article/dedup.py) ---
+    minhash = models.BinaryField(null=True, blank=True) # 內文的 MinHash 簽章 (64 個 uint32)，None 代表尚未計算，空值代表短文不比對
+    # 近似重複時指向代表文章 (不向量化，查詢時合併)；None 代表本身即為代表文章
+    duplicate_of = models.ForeignKey('self', null=True, blank=True, on_delete=models.SET_NULL, related_name='duplicates')
 
     def __str__(self):
         return f"[{self.board}] {self.title}"
@@ -23,4 +37,57 @@ class Comment(models.Model):
     ip_datetime = models.CharField(max_length=100)  # 推文時間/IP
 
     def __str__(self):
-        return f"{self.tag} {self.user_id}: {self.content}"
\ No newline at end of file
+        return f"{self.tag} {self.user_id}: {self.content}"
+
+class ArticleTerm(models.Model):
+    # 全文檢索用的倒排索引：每篇文章的每個詞 (中文二元組 / 英數字詞) 一筆
+    # MariaDB 的 FULLTEXT 不支援 ngram parser，中文無法斷詞，因此自行維護索引
+    article = models.ForeignKey(Article, on_delete=models.CASCADE, related_name='terms')
+    term = models.CharField(max_length=32)          # 詞
+    weight = models.PositiveIntegerField()          # 權重 (標題出現次數加權 + 內文出現次數)
+
+    class Meta:
+        # 查詢時以 term 過濾、以 article 分組加總 weight，三個欄位都在索引內可直接由索引取得
+        indexes = [models.Index(fields=['term', 'article', 'weight'], name='article_term_lookup_idx')]
+        constraints = [models.UniqueConstraint(fields=['article', 'term'], name='unique_article_term')]
+
+    def __str__(self):
+        return f"{self.term} ({self.article_id}: {self.weight})"
+
+class ArticleMinHashBand(models.Model):
+    # MinHash LSH 分段索引 (只有代表文章)：簽章切成 16 段，以 (band, value) 查出可能近似重複的文章
+    article = models.ForeignKey(Article, on_delete=models.CASCADE, related_name='minhash_bands')
+    band = models.PositiveSmallIntegerField()      # 第幾段 (0 ~ 15)
+    value = models.PositiveIntegerField()          # 該段簽章的雜湊值
+
+    class Meta:
+        indexes = [models.Index(fields=['band', 'value'], name='article_minhash_band_idx')]
+
+    def __str__(self):
+        return f"{self.article_id}: {self.band}={self.value}"
+
+class BoardDigest(models.Model):
+    # 看板在一個時段內的討論摘要 (見 article/digest.py)：爬蟲、向量化後預先產生，API 直接回傳
+    board = models.CharField(max_length=100)
+    window_hours = models.PositiveSmallIntegerField()   # 時段長度 (小時)
+    window_start = models.DateTimeField()               # 時段開始 (依台灣時間對齊)
+    window_end = models.DateTimeField()                 # 時段結束 (不含)
+    article_count = models.PositiveIntegerField(default=0)
+    push_count = models.PositiveIntegerField(default=0)      # 推
+    boo_count = models.PositiveIntegerField(default=0)       # 噓
+    neutral_count = models.PositiveIntegerField(default=0)   # →
+    topics = models.JSONField(default=list)                  # [{"topic": 詞, "articles": 標題含此詞的文章數}]
+    representative_articles = models.JSONField(default=list) # 推噓差最高的文章 (id、標題、網址、推噓數)
+    summary = models.TextField(blank=True)                   # Gemini 整理的摘要
+    # 產生摘要時的代表文章與話題，沒變時沿用摘要，不重新呼叫 Gemini
+    source_fingerprint = models.CharField(max_length=40, blank=True)
+    generated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['board', 'window_hours', 'window_start'], name='unique_board_digest_window'),
+        ]
+
+    def __str__(self):
+        start = self.window_start.astimezone(ZoneInfo(settings.CELERY_TIMEZONE))
+        return f"[{self.board}] {start:%Y-%m-%d %H:%M} ({self.window_hours}h)"
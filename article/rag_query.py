@@ -1,98 +1,140 @@
-import traceback
 import asyncio
-from langchain_pinecone import PineconeVectorStore
-from pinecone import Pinecone
+import time
+import traceback
+from asgiref.sync import async_to_sync, sync_to_async
+from django.conf import settings
 from langchain_core.prompts import PromptTemplate
-from langchain_google_genai import GoogleGenerativeAIEmbeddings, ChatGoogleGenerativeAI
-from pydantic import SecretStr
 from article.models import Article
+from article.ai_clients import get_vector_store, get_chat_model
 from log_app.models import Log
-from env_settings import EnvSettings
+from config.db_router import use_read_replica
+from config.metrics import timed, PROMPT_CHARS
 
-env_settings = EnvSettings()
+RAG_PROMPT = PromptTemplate(
+    input_variables=["merge_text", "question"],
+    template="""
+    你是一個專業的 PTT 輿情分析師。請根據以下 PTT 文章內容，用繁體中文回答使用者的問題。
+    如果文章內容沒有提到相關資訊，請直接回答「找不到相關討論」。
 
-def run_rag_query(question, top_k):
+    --- 參考文章 ---
+    {merge_text}
+    ---
+
+    使用者問題：{question}
+    """
+)
+
+# 簡單的防呆，避免爆 Token
+MAX_MERGE_TEXT_LENGTH = 100000
+
+
+def get_match_ids(top_k_results):
+    # 從 metadata 取出 article_id (同一篇文章的多個片段只保留第一個，維持相似度順序)
+    return list(dict.fromkeys(match[0].metadata['article_id'] for match in top_k_results))
+
+
+def collapse_duplicates(match_ids, articles_dict, limit):
+    """
+    依相似度順序取出文章，近似重複的文章 (同一個 duplicate_of) 只保留第一篇，最多 limit 篇
+    新文章的重複本來就不會向量化，這裡處理的是啟用偵測前已向量化的資料
+    """
+    related_articles, seen = [], set()
+    for mid in match_ids:
+        article = articles_dict.get(mid)
+        if article is None:
+            continue
+        cluster = article.duplicate_of_id or article.id
+        if cluster in seen:
+            continue
+        seen.add(cluster)
+        related_articles.append(article)
+        if len(related_articles) >= limit:
+            break
+    return related_articles
+
+
+def retrieval_k(top_k):
+    # 多取幾個片段，合併重複後仍有 top_k 篇不同的文章
+    return top_k * settings.RAG_RETRIEVAL_OVERFETCH
+
+
+async def fetch_articles(article_ids):
+    """以一次查詢取出文章 (含推文)，回傳 {id: Article}；從 read replica 讀取"""
+    with use_read_replica(), timed('db_fetch'):
+        articles_queryset = Article.objects.filter(id__in=article_ids).prefetch_related('comments')
+        return {a.id: a async for a in articles_queryset}
+
+
+async def fetch_related_articles(match_ids, top_k):
+    """
+    依照 Pinecone 回傳的順序取出文章 (含推文)
+    Pinecone 回傳的順序是依相似度排序，但 SQL filter(id__in=...) 不保證順序，
+    因此先撈出來，再依照 match_ids 的順序排好 (合併近似重複的文章)
+    """
+    articles_dict = await fetch_articles(match_ids)
+    return collapse_duplicates(match_ids, articles_dict, top_k)
+
+
+def build_merge_text(related_articles):
+    # 組合給 LLM 看的文本 (避免過長，簡單截斷)
+    merge_text = "\n".join(
+        [f"標題:{a.title}\n內文:{a.content[:500]}..." for a in related_articles]
+    )
+    PROMPT_CHARS.observe(len(merge_text))
+    return merge_text
+
+
+async def agenerate_answer(question, merge_text):
+    chain = RAG_PROMPT | get_chat_model()
+    with timed('generation'):
+        response = await chain.ainvoke({"merge_text": merge_text, "question": question})
+    return response.content
+
+
+def elapsed_ms(start):
+    return round((time.perf_counter() - start) * 1000, 1)
+
+
+async def arun_rag_query(question, top_k):
     """
-    執行 RAG 流程：
+    執行 RAG 流程 (非同步)：
     1. 將問題轉向量 -> 搜尋 Pinecone
     2. 找出對應的 MariaDB 文章
     3. 組合 Prompt -> 呼叫 Gemini 生成回答
+    等待外部 API 時不會佔用 worker thread
     """
-    
+
     # 1. 搜尋 Pinecone
     try:
-        # 解決 Django 環境下 asyncio loop 的問題
-        try:
-            asyncio.get_running_loop()
-        except RuntimeError:
-            asyncio.set_event_loop(asyncio.new_event_loop())
-
-        vector_store = PineconeVectorStore(
-            index=Pinecone(api_key=env_settings.PINECONE_API_KEY).Index(env_settings.PINECONE_INDEX_NAME),
-            embedding=GoogleGenerativeAIEmbeddings(
-                model=env_settings.GOOGLE_EMBEDDINGS_MODEL,
-                google_api_key=SecretStr(env_settings.GOOGLE_API_KEY)
-            )
-        )
-        # 執行相似度搜尋
-        top_k_results = vector_store.similarity_search_with_score(question, k=top_k)
-    
+        # 讀取使用中的 target (Redis) 與 index host (第一次需查詢 Pinecone) 都是阻塞呼叫，不在 event loop 上執行
+        vector_store = await sync_to_async(get_vector_store, thread_sensitive=False)()
+        # 執行相似度搜尋 (先轉向量再查詢，embedding 與 retrieval 的耗時分開記錄)
+        query_vector = await vector_store.embeddings.aembed_query(question)
+        with timed('retrieval'):
+            top_k_results = await vector_store.asimilarity_search_by_vector_with_score(query_vector, k=retrieval_k(top_k))
+
     except Exception as e:
         error_msg = f"查詢 Pinecone 發生錯誤: {e}"
-        Log.objects.create(level='ERROR', category='rag-search', message=error_msg, traceback=traceback.format_exc())
+        await Log.objects.acreate(level='ERROR', category='rag-search', message=error_msg, traceback=traceback.format_exc())
         return {"error": error_msg}
 
     # 2. 從資料庫撈取文章內容
     try:
-        # 從 metadata 取出 article_id
-        match_ids = [match[0].metadata['article_id'] for match in top_k_results]
-        
-        # 這裡要注意順序：Pinecone 回傳的順序是依相似度排序，但 SQL filter(id__in=...) 不保證順序
-        # 為了精準度，我們先撈出來，再依照 match_ids 的順序排好
-        articles_queryset = Article.objects.filter(id__in=match_ids)
-        articles_dict = {a.id: a for a in articles_queryset}
-        related_articles = [articles_dict[mid] for mid in match_ids if mid in articles_dict]
-
-        # 組合給 LLM 看的文本 (避免過長，簡單截斷)
-        merge_text = "\n".join(
-            [f"標題:{a.title}\n內文:{a.content[:500]}..." for a in related_articles]
-        )
-        
-        # 簡單的防呆，避免爆 Token
-        if len(merge_text) > 100000:
+        match_ids = get_match_ids(top_k_results)
+        related_articles = await fetch_related_articles(match_ids, top_k)
+        merge_text = build_merge_text(related_articles)
+
+        if len(merge_text) > MAX_MERGE_TEXT_LENGTH:
             return {"error": "檢索到的文章總字數過長，請減少 top_k"}
 
     except Exception as e:
         error_msg = f"資料庫撈取文章失敗: {e}"
-        Log.objects.create(level='ERROR', category='rag-db', message=error_msg, traceback=traceback.format_exc())
+        await Log.objects.acreate(level='ERROR', category='rag-db', message=error_msg, traceback=traceback.format_exc())
         return {"error": error_msg}
 
     # 3. 呼叫 Gemini 生成回答
     try:
-        # 注意：建議先用 gemini-1.5-flash 比較穩定，若您有 2.0 權限可改為 gemini-2.0-flash
-        model = ChatGoogleGenerativeAI(
-            model="gemini-flash-latest",
-            temperature=0.3, # 稍微有點創造力但不要太發散
-            google_api_key=env_settings.GOOGLE_API_KEY,
-        )
-        
-        prompt = PromptTemplate(
-            input_variables=["merge_text", "question"],
-            template="""
-            你是一個專業的 PTT 輿情分析師。請根據以下 PTT 文章內容，用繁體中文回答使用者的問題。
-            如果文章內容沒有提到相關資訊，請直接回答「找不到相關討論」。
-            
-            --- 參考文章 ---
-            {merge_text}
-            ---
-            
-            使用者問題：{question}
-            """
-        )
-        
-        chain = prompt | model
-        response = chain.invoke({"merge_text": merge_text, "question": question})
-        answer = response.content
+        answer = await agenerate_answer(question, merge_text)
 
         return {
             "question": question,
@@ -102,5 +144,103 @@ def run_rag_query(question, top_k):
 
     except Exception as e:
         error_msg = f"LLM 生成回答失敗: {e}"
-        Log.objects.create(level='ERROR', category='rag-llm', message=error_msg, traceback=traceback.format_exc())
-        return {"error": error_msg}
\ No newline at end of file
+        await Log.objects.acreate(level='ERROR', category='rag-llm', message=error_msg, traceback=traceback.format_exc())
+        return {"error": error_msg}
+
+
+def run_rag_query(question, top_k):
+    """同步版本 (供 Django shell、Celery 等同步環境使用)"""
+    return async_to_sync(arun_rag_query)(question, top_k)
+
+
+async def arun_rag_batch(questions, top_k, concurrency=None):
+    """
+    批次 RAG 流程：
+    1. 所有問題以一次 batch embedding 請求轉成向量
+    2. 同時對 Pinecone 發出所有向量查詢
+    3. 所有命中的文章以一次 SQL 查詢取出
+    4. 以有限的併發數呼叫 Gemini 生成回答 (避免瞬間打爆配額)
+    單題失敗只會在該題回傳 error，不影響其他題目
+    """
+    concurrency = concurrency or settings.RAG_BATCH_CONCURRENCY
+    started = time.perf_counter()
+
+    # 1. 批次 Embedding
+    try:
+        vector_store = await sync_to_async(get_vector_store, thread_sensitive=False)()
+        step_start = time.perf_counter()
+        query_vectors = await vector_store.embeddings.aembed_documents(questions, task_type="RETRIEVAL_QUERY")
+        embedding_ms = elapsed_ms(step_start)
+    except Exception as e:
+        error_msg = f"批次 Embedding 發生錯誤: {e}"
+        await Log.objects.acreate(level='ERROR', category='rag-batch', message=error_msg, traceback=traceback.format_exc())
+        return {"error": error_msg}
+
+    # 2. 同時查詢 Pinecone
+    async def search(vector):
+        step_start = time.perf_counter()
+        with timed('retrieval'):
+            top_k_results = await vector_store.asimilarity_search_by_vector_with_score(vector, k=retrieval_k(top_k))
+        return top_k_results, elapsed_ms(step_start)
+
+    search_results = await asyncio.gather(*[search(vector) for vector in query_vectors], return_exceptions=True)
+
+    # 3. 一次撈出所有題目命中的文章
+    try:
+        step_start = time.perf_counter()
+        all_ids = {
+            article_id
+            for result in search_results if not isinstance(result, BaseException)
+            for article_id in get_match_ids(result[0])
+        }
+        articles_dict = await fetch_articles(all_ids)
+        db_ms = elapsed_ms(step_start)
+    except Exception as e:
+        error_msg = f"資料庫撈取文章失敗: {e}"
+        await Log.objects.acreate(level='ERROR', category='rag-batch', message=error_msg, traceback=traceback.format_exc())
+        return {"error": error_msg}
+
+    # 4. 以 Semaphore 限制同時呼叫 Gemini 的數量
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def answer_question(question, search_result):
+        if isinstance(search_result, BaseException):
+            error_msg = f"查詢 Pinecone 發生錯誤: {search_result}"
+            await Log.objects.acreate(level='ERROR', category='rag-batch', message=error_msg)
+            return {"question": question, "error": error_msg, "timings": {}}
+
+        top_k_results, retrieval_ms = search_result
+        match_ids = get_match_ids(top_k_results)
+        related_articles = collapse_duplicates(match_ids, articles_dict, top_k)
+        merge_text = build_merge_text(related_articles)
+        timings = {"retrieval_ms": retrieval_ms}
+
+        if len(merge_text) > MAX_MERGE_TEXT_LENGTH:
+            return {"question": question, "error": "檢索到的文章總字數過長，請減少 top_k", "timings": timings}
+
+        async with semaphore:
+            step_start = time.perf_counter()
+            try:
+                answer = await agenerate_answer(question, merge_text)
+            except Exception as e:
+                error_msg = f"LLM 生成回答失敗: {e}"
+                await Log.objects.acreate(level='ERROR', category='rag-batch', message=error_msg,
+                                          traceback=traceback.format_exc())
+                return {"question": question, "error": error_msg, "timings": timings}
+            timings["generation_ms"] = elapsed_ms(step_start)
+
+        return {
+            "question": question,
+            "answer": answer,
+            "related_articles": related_articles,
+            "timings": timings,
+        }
+
+    results = await asyncio.gather(*[
+        answer_question(question, search_result) for question, search_result in zip(questions, search_results)
+    ])
+
+    return {
+        "results": results,
+        "timings": {"embedding_ms": embedding_ms, "db_ms": db_ms, "total_ms": elapsed_ms(started)},
+    }
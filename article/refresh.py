@@ -0,0 +1,54 @@
+"""
+熱門文章推文追蹤
+
+每次抓取文章時依「兩次抓取之間新增的推文數」計算推文速度 (EWMA 平滑)，並排定下次重新抓取的時間：
+- 推文越快，間隔越短 (目標每次抓到約 ARTICLE_REFRESH_TARGET_NEW_COMMENTS 則新推文)
+- 沒有新推文時速度會持續衰減、間隔持續拉長，最長為 ARTICLE_REFRESH_MAX_INTERVAL (之後才開始的推文潮仍會被發現)
+- 發文超過 ARTICLE_REFRESH_MAX_AGE 才停止追蹤 (next_refresh_at = None)
+重新抓取與文章是否還在看板首頁無關，由 refresh_hot_articles 任務統一處理
+"""
+from datetime import timedelta
+
+from django.conf import settings
+
+# 推文速度的平滑係數
+VELOCITY_ALPHA = 0.5
+# 計算首次速度時，文章年齡的最小值 (小時)，避免剛發文的文章速度被放大
+MIN_AGE_HOURS = 0.25
+# update_refresh_schedule 會修改的欄位
+REFRESH_FIELDS = ('comment_count', 'push_velocity', 'last_fetched_at', 'next_refresh_at')
+
+
+def update_refresh_schedule(article, comment_count: int, now):
+    """更新文章的推文數、推文速度與下次抓取時間 (只修改物件，不寫入資料庫)"""
+    if article.last_fetched_at:
+        hours = max((now - article.last_fetched_at).total_seconds() / 3600, 1 / 60)
+        observed = max(comment_count - article.comment_count, 0) / hours
+        velocity = VELOCITY_ALPHA * observed + (1 - VELOCITY_ALPHA) * article.push_velocity
+    else:
+        # 第一次抓取：以發文至今的平均推文速度估計
+        age_hours = max((now - article.post_time).total_seconds() / 3600, MIN_AGE_HOURS)
+        velocity = comment_count / age_hours
+
+    article.comment_count = comment_count
+    article.push_velocity = velocity
+    article.last_fetched_at = now
+    article.next_refresh_at = compute_next_refresh(article.post_time, velocity, now)
+
+
+def compute_next_refresh(post_time, velocity: float, now):
+    """回傳下次抓取時間；文章太舊則回傳 None 代表停止追蹤"""
+    if (now - post_time).total_seconds() > settings.ARTICLE_REFRESH_MAX_AGE:
+        return None
+
+    # 沒有推文 (新文章第一次抓取的常態) 或推文很慢時，以最長間隔繼續追蹤
+    interval = settings.ARTICLE_REFRESH_TARGET_NEW_COMMENTS / velocity * 3600 if velocity > 0 else float('inf')
+    interval = min(max(interval, settings.ARTICLE_REFRESH_MIN_INTERVAL), settings.ARTICLE_REFRESH_MAX_INTERVAL)
+    return now + timedelta(seconds=interval)
+
+
+def is_refresh_due(article, now) -> bool:
+    """看板首頁上的既有文章是否需要重新抓取 (從未追蹤過的舊資料一律抓取一次)"""
+    if article.last_fetched_at is None:
+        return True
+    return article.next_refresh_at is not None and article.next_refresh_at <= now
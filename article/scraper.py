@@ -1,4 +1,5 @@
 import os
+import re
 import sys
 import django
 import requests
@@ -20,14 +21,34 @@ django.setup()
 # ---------------------------------------------------------
 # 2. 引入 Models
 # ---------------------------------------------------------
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
 from article.models import Article, Comment
 from log_app.models import Log
+from article.cache import bump_data_version
+from article.search_index import index_article, index_new_articles
+from config.metrics import timed, RETRIES
+from article.refresh import REFRESH_FIELDS, update_refresh_schedule, is_refresh_due
+from celery_app.locks import article_lock, release_lock
 # 注意：這裡不再引入 store_data_in_pinecone，因為將由 Celery tasks.py 負責串接
 
 # ---------------------------------------------------------
 # 3. 爬蟲核心函式
 # ---------------------------------------------------------
 
+# 壓力測試時可指向本機的 PTT 替身服務 (見 article/fakes/)
+PTT_BASE_URL = settings.PTT_BASE_URL
+# 文章網址中的發文時間 (Unix timestamp)，例如 /bbs/Stock/M.1700000000.A.123.html
+ARTICLE_TIMESTAMP_RE = re.compile(r'/M\.(\d+)\.')
+# 看板列表頁「‹ 上頁」連結中的頁碼
+PAGE_NUMBER_RE = re.compile(r'index(\d+)\.html')
+
+def get_board_index_url(board: str, page: int = None) -> str:
+    """看板列表頁網址，page 為 None 時為最新一頁"""
+    return f"{PTT_BASE_URL}/bbs/{board}/index{page or ''}.html"
+
+
 def get_html(url: str) -> str:
     """取得網頁內容，包含偽裝 Headers 與重試機制"""
     session = requests.Session()
@@ -45,13 +66,18 @@ def get_html(url: str) -> str:
     session.headers.update({
         'User-Agent': 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
         'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/avif,image/webp,*/*;q=0.8',
-        'Referer': 'https://www.ptt.cc/'
+        'Referer': PTT_BASE_URL + '/'
     })
 
     # 直接設定 Cookie 通過 18 歲驗證
     session.cookies.set('over18', '1')
     
-    response = session.get(url, timeout=10)
+    with timed('fetch'):
+        response = session.get(url, timeout=10)
+    # urllib3 的重試紀錄 (5xx 自動重試)
+    retries = getattr(response.raw, 'retries', None)
+    if retries and retries.history:
+        RETRIES.labels('ptt_fetch').inc(len(retries.history))
     return response.text
 
 def get_urls_from_board_html(html: str) -> list:
@@ -62,9 +88,23 @@ def get_urls_from_board_html(html: str) -> list:
     for r_ent in r_ent_all:
         a_tag = r_ent.find('a')
         if a_tag and a_tag.get('href'):
-            urls.append('https://www.ptt.cc' + a_tag['href'])
+            urls.append(PTT_BASE_URL + a_tag['href'])
     return urls
 
+def get_latest_page(html: str) -> int:
+    """由最新一頁的「‹ 上頁」連結推算最新一頁的頁碼"""
+    html_soup = BeautifulSoup(html, 'html.parser')
+    for a_tag in html_soup.select('div.btn-group-paging a'):
+        match = PAGE_NUMBER_RE.search(a_tag.get('href', ''))
+        if match and '上頁' in a_tag.text:
+            return int(match.group(1)) + 1
+    raise ValueError("Cannot find previous page link")
+
+def get_article_timestamp(url: str):
+    """從文章網址取得發文時間 (Unix timestamp)，格式不符時回傳 None"""
+    match = ARTICLE_TIMESTAMP_RE.search(url)
+    return int(match.group(1)) if match else None
+
 def get_data_from_article_html(html: str) -> dict:
     """解析單篇文章內容與推文"""
     html_soup = BeautifulSoup(html, 'html.parser')
@@ -133,19 +173,153 @@ def get_data_from_article_html(html: str) -> dict:
     }
     return data
 
-def ptt_scrape(board: str) -> list:
+@timed('db_write')
+def save_article(board: str, article_url: str, article_data: dict, now=None):
+    """
+    寫入單篇文章與推文 (爬蟲與熱門文章追蹤共用)
+    - 文章欄位沒有變動時不寫入；標題或內文有變動才更新全文檢索索引
+    - 內文有變動時清除 MinHash 簽章，由呼叫端送出的向量化任務 (assign_duplicates) 重新比對
+    - 推文只新增多出來的部分 (PTT 推文只會往後加)，推文數減少時才整批重寫
+    回傳: (article, created, changed)
+    """
+    now = now or timezone.now()
+    defaults = {
+        'board': board,
+        'title': article_data['title'],
+        'author': article_data['author'],
+        'content': article_data['content'],
+        'post_time': article_data['post_time'],
+    }
+    comments_data = article_data.get('comments', [])
+
+    with transaction.atomic():
+        article_obj = Article.objects.filter(url=article_url).first()
+        created = article_obj is None
+
+        # 1. 寫入文章
+        if created:
+            article_obj = Article(url=article_url, **defaults)
+            changed_fields = list(defaults)
+        else:
+            changed_fields = [field for field, value in defaults.items() if getattr(article_obj, field) != value]
+            for field in changed_fields:
+                setattr(article_obj, field, defaults[field])
+            if 'content' in changed_fields:
+                article_obj.minhash = None
+
+        # 2. 處理推文
+        old_comment_count = 0 if created else article_obj.comments.count()
+        update_refresh_schedule(article_obj, len(comments_data), now)
+        if created:
+            article_obj.save()
+        else:
+            # 只寫入有變動的欄位與追蹤欄位
+            extra_fields = ['minhash'] if 'content' in changed_fields else []
+            article_obj.save(update_fields=changed_fields + extra_fields + list(REFRESH_FIELDS))
+
+        new_comments = comments_data[old_comment_count:]
+        if len(comments_data) < old_comment_count:
+            # 推文被刪除：先刪除舊推文，避免重複
+            Comment.objects.filter(article=article_obj).delete()
+            new_comments = comments_data
+        if new_comments:
+            # 批次寫入
+            Comment.objects.bulk_create([
+                Comment(
+                    article=article_obj,
+                    tag=c['tag'],
+                    user_id=c['user_id'],
+                    content=c['content'],
+                    ip_datetime=c['ip_datetime']
+                ) for c in new_comments
+            ])
+
+        # 更新全文檢索索引
+        if {'title', 'content'} & set(changed_fields):
+            index_article(article_obj)
+
+    changed = bool(changed_fields) or len(comments_data) != old_comment_count
+    return article_obj, created, changed
+
+@timed('db_write')
+def bulk_save_new_articles(board: str, items: list, now=None) -> list:
+    """
+    批次寫入多篇新文章 (歷史資料回補用)：文章、推文、全文檢索索引各只需少數幾次批次寫入
+    items: [(article_url, article_data), ...]，呼叫端需先排除已存在的文章
+    寫入前在交易內再確認一次，期間被其他任務寫入的文章略過 (網址有唯一限制，衝突的列不會重複新增)
+    回傳: list (新增的文章 ID)
+    """
+    if not items:
+        return []
+
+    now = now or timezone.now()
+    with transaction.atomic():
+        existing_urls = set(Article.objects.filter(url__in=[url for url, _ in items]).values_list('url', flat=True))
+        articles, new_items = [], []
+        for article_url, article_data in items:
+            if article_url in existing_urls:
+                continue
+            existing_urls.add(article_url)
+            article_obj = Article(
+                url=article_url,
+                board=board,
+                title=article_data['title'],
+                author=article_data['author'],
+                content=article_data['content'],
+                post_time=article_data['post_time'],
+            )
+            update_refresh_schedule(article_obj, len(article_data.get('comments', [])), now)
+            articles.append(article_obj)
+            new_items.append(article_data)
+        if not articles:
+            return []
+
+        Article.objects.bulk_create(articles, batch_size=500, ignore_conflicts=True)
+        # MySQL 的 bulk_create 不會回填主鍵 (ignore_conflicts 時各資料庫都不會)，以網址重新查出 ID
+        ids = dict(Article.objects.filter(url__in=[a.url for a in articles]).values_list('url', 'id'))
+        for article_obj in articles:
+            article_obj.id = ids[article_obj.url]
+
+        Comment.objects.bulk_create([
+            Comment(
+                article=article_obj,
+                tag=c['tag'],
+                user_id=c['user_id'],
+                content=c['content'],
+                ip_datetime=c['ip_datetime']
+            )
+            for article_obj, article_data in zip(articles, new_items)
+            for c in article_data.get('comments', [])
+        ], batch_size=1000)
+
+        index_new_articles(articles)
+
+    return [article_obj.id for article_obj in articles]
+
+def fetch_article(article_url: str):
+    """抓取並解析單篇文章，失敗時回傳 None"""
+    time.sleep(0.5) # 禮貌性延遲
+    print(f"[INFO] Processing: {article_url}")
+    article_html = get_html(article_url)
+    with timed('parse'):
+        return get_data_from_article_html(article_html)
+
+def ptt_scrape(board: str, embed=None) -> list:
     """
     爬取指定看板的最新一頁
+    已追蹤且尚未到期的既有文章不重新抓取 (由 refresh_hot_articles 依推文速度重新抓取)
+    embed: 接收文章 ID 列表的函式，內文有修改的既有文章交給它重新比對近似重複並向量化
     回傳: list (本次新增的文章 ID 列表，供 RAG 使用)
     """
     print(f"[INFO] Start scraping board: {board}")
     Log.objects.create(level='INFO', category=f'scrape-{board}', message=f'Start scraping {board}')
     
-    board_url = 'https://www.ptt.cc/bbs/' + board + '/index.html'
+    board_url = get_board_index_url(board)
     
     try:
         board_html = get_html(board_url)
-        article_urls = get_urls_from_board_html(board_html)
+        with timed('parse'):
+            article_urls = get_urls_from_board_html(board_html)
     except Exception as e:
         error_msg = f"Failed to fetch board index: {e}"
         print(f"[ERROR] {error_msg}")
@@ -153,58 +327,45 @@ def ptt_scrape(board: str) -> list:
         return []
 
     new_article_ids = [] # 用來存本次新增的文章 ID
+    edited_article_ids = [] # 內文有修改的既有文章 ID
     update_count = 0
     create_count = 0
+    skip_count = 0
+
+    # 一次查出首頁上已存在的文章，判斷是否需要重新抓取
+    now = timezone.now()
+    existing_articles = {a.url: a for a in Article.objects.filter(url__in=article_urls)}
     
     for article_url in article_urls:
+        existing = existing_articles.get(article_url)
+        if existing and not is_refresh_due(existing, now):
+            skip_count += 1
+            continue
+
+        lock = article_lock(article_url)
+        if not lock.acquire():
+            # 熱門文章追蹤正在寫入這篇文章 (仍為到期狀態，之後會再被抓取)
+            skip_count += 1
+            continue
+
         try:
-            time.sleep(0.5) # 禮貌性延遲
-            print(f"[INFO] Processing: {article_url}")
-            
-            article_html = get_html(article_url)
-            article_data = get_data_from_article_html(article_html)
+            article_data = fetch_article(article_url)
 
             if not article_data:
                 print(f"[WARN] Failed to parse or format incorrect: {article_url}")
                 Log.objects.create(level='WARNING', category=f'scrape-{board}', message=f'Parse failed: {article_url}')
                 continue
 
-            # 1. 寫入文章
-            article_obj, created = Article.objects.update_or_create(
-                url=article_url,
-                defaults={
-                    'board': board,
-                    'title': article_data['title'],
-                    'author': article_data['author'],
-                    'content': article_data['content'],
-                    'post_time': article_data['post_time']
-                }
-            )
+            article_obj, created, changed = save_article(board, article_url, article_data)
 
-            # 2. 統計與收集 ID
+            # 統計與收集 ID
             if created:
                 create_count += 1
                 new_article_ids.append(article_obj.id) # 只有新文章才回傳 ID
-            else:
+            elif changed:
                 update_count += 1
-
-            # 3. 處理推文
-            comments_data = article_data.get('comments', [])
-            if comments_data:
-                # 先刪除舊推文，避免重複
-                Comment.objects.filter(article=article_obj).delete()
-                
-                comments_objects = [
-                    Comment(
-                        article=article_obj,
-                        tag=c['tag'],
-                        user_id=c['user_id'],
-                        content=c['content'],
-                        ip_datetime=c['ip_datetime']
-                    ) for c in comments_data
-                ]
-                # 批次寫入
-                Comment.objects.bulk_create(comments_objects)
+                if existing.content != article_data['content']:
+                    edited_article_ids.append(article_obj.id)
 
         except Exception as e:
             print(f"[ERROR] Exception: {e}")
@@ -215,13 +376,74 @@ def ptt_scrape(board: str) -> list:
                 traceback=traceback.format_exc()
             )
             continue
+        finally:
+            release_lock(lock)
     
-    summary = f'Scrape {board} completed. Created: {create_count}, Updated: {update_count}'
+    summary = f'Scrape {board} completed. Created: {create_count}, Updated: {update_count}, Skipped: {skip_count}'
     print(f"[SUCCESS] {summary}")
     Log.objects.create(level='INFO', category=f'scrape-{board}', message=summary)
+
+    # 資料有異動才遞增版本號，讓 API 快取失效
+    if create_count or update_count:
+        bump_data_version(board)
+    if edited_article_ids and embed:
+        embed(edited_article_ids)
     
     return new_article_ids
 
+def refresh_hot_articles(limit: int, embed=None) -> dict:
+    """
+    重新抓取已到期的追蹤文章 (不論是否還在看板首頁)，推文速度快的優先，跨看板批次處理
+    每篇文章寫入前取得該文章的鎖 (不會擋住看板的爬蟲任務)，爬蟲正在寫入同一篇文章時略過
+    (仍為到期狀態，下一個 tick 再處理)，避免同時寫入而重複新增推文
+    embed: 接收文章 ID 列表的函式，內文有修改的文章交給它重新比對近似重複並向量化
+    回傳: {看板: 有異動的文章數}
+    """
+    now = timezone.now()
+    due_articles = Article.objects.filter(next_refresh_at__lte=now).order_by('-push_velocity')[:limit]
+
+    changed_boards = {}
+    edited_article_ids = []
+    skip_count = 0
+    for article in due_articles:
+        lock = article_lock(article.url)
+        if not lock.acquire():
+            skip_count += 1
+            continue
+
+        try:
+            article_data = fetch_article(article.url)
+            if not article_data:
+                # 文章可能已被刪除，停止追蹤
+                Article.objects.filter(id=article.id).update(next_refresh_at=None)
+                continue
+
+            _, _, changed = save_article(article.board, article.url, article_data)
+            if changed:
+                changed_boards[article.board] = changed_boards.get(article.board, 0) + 1
+            if article.content != article_data['content']:
+                edited_article_ids.append(article.id)
+
+        except Exception as e:
+            print(f"[ERROR] Exception: {e}")
+            Log.objects.create(
+                level='ERROR',
+                category=f'refresh-{article.board}',
+                message=f"Error refreshing article {article.url}: {e}",
+                traceback=traceback.format_exc()
+            )
+        finally:
+            release_lock(lock)
+
+    for board in changed_boards:
+        bump_data_version(board)
+    if edited_article_ids and embed:
+        embed(edited_article_ids)
+
+    summary = f'Refreshed hot articles. Changed: {changed_boards}, Skipped (being scraped): {skip_count}'
+    print(f"[SUCCESS] {summary}")
+    return changed_boards
+
 # ---------------------------------------------------------
 # 4. 主程式執行區塊 (僅供手動測試爬蟲功能)
 # ---------------------------------------------------------
@@ -0,0 +1,112 @@
+"""
+文章全文檢索 (倒排索引)
+
+- 中文以「二元組 (bigram)」切詞，例如「台積電」-> 「台積」「積電」
+- 英文 / 數字以連續英數字為一個詞 (例如 nvidia、2330)
+- 每篇文章的詞與權重存放在 ArticleTerm，查詢時以索引取出符合的文章並計算相關性分數
+"""
+import math
+import re
+import unicodedata
+from collections import Counter
+
+from django.db import transaction
+from django.db.models import Case, Count, F, FloatField, Sum, When
+
+from article.models import Article, ArticleTerm
+
+# 中日韓統一表意文字 (含擴充 A)
+CJK_RUN_RE = re.compile(r'[㐀-䶿一-鿿]+')
+WORD_RE = re.compile(r'[a-z0-9]+')
+
+MAX_TERM_LENGTH = 32
+# 標題中出現的詞權重較高
+TITLE_WEIGHT = 5
+# 內文中同一個詞最多計算的次數，避免洗版文章分數過高
+MAX_CONTENT_COUNT = 10
+# 查詢的詞至少要命中的比例 (查詢越長越容易有個別二元組沒出現，不強制全部命中)
+MIN_TERM_MATCH_RATIO = 0.75
+
+
+def tokenize(text: str) -> list:
+    """將文字切成檢索用的詞 (可重複)"""
+    if not text:
+        return []
+    text = unicodedata.normalize('NFKC', text).lower()
+
+    terms = []
+    for run in CJK_RUN_RE.findall(text):
+        if len(run) == 1:
+            terms.append(run)
+        else:
+            terms.extend(run[i:i + 2] for i in range(len(run) - 1))
+    for word in WORD_RE.findall(text):
+        if len(word) >= 2:
+            terms.append(word[:MAX_TERM_LENGTH])
+    return terms
+
+
+def build_terms(article: Article) -> Counter:
+    """計算文章每個詞的權重"""
+    weights = Counter()
+    for term, count in Counter(tokenize(article.title)).items():
+        weights[term] += count * TITLE_WEIGHT
+    for term, count in Counter(tokenize(article.content)).items():
+        weights[term] += min(count, MAX_CONTENT_COUNT)
+    return weights
+
+
+def index_article(article: Article):
+    """重建單篇文章的索引 (文章新增或更新後呼叫)"""
+    weights = build_terms(article)
+    with transaction.atomic():
+        ArticleTerm.objects.filter(article=article).delete()
+        ArticleTerm.objects.bulk_create(
+            [ArticleTerm(article=article, term=term, weight=weight) for term, weight in weights.items()],
+            batch_size=1000,
+        )
+
+
+def index_new_articles(articles):
+    """批次建立多篇新文章的索引 (歷史資料回補用，文章尚無索引因此不需先刪除)"""
+    ArticleTerm.objects.bulk_create(
+        [
+            ArticleTerm(article=article, term=term, weight=weight)
+            for article in articles
+            for term, weight in build_terms(article).items()
+        ],
+        batch_size=1000,
+    )
+
+
+def search_articles(articles, query: str):
+    """
+    在已篩選的 QuerySet 上進行關鍵字檢索，回傳依相關性 (score) 排序的 QuerySet
+    相關性 = Σ 詞權重 × idf，idf 依各詞出現的文章數計算，常見詞的影響較小
+    """
+    terms = sorted(set(tokenize(query)))
+    if not terms:
+        return articles.none()
+
+    # 各詞出現的文章數 (document frequency)
+    total_articles = Article.objects.count() or 1
+    doc_freq = dict(
+        ArticleTerm.objects.filter(term__in=terms).values_list('term').annotate(df=Count('id'))
+    )
+    idf = {term: math.log(1 + total_articles / (1 + doc_freq.get(term, 0))) for term in terms}
+
+    min_matched = max(1, math.ceil(len(terms) * MIN_TERM_MATCH_RATIO))
+    return (
+        articles.filter(terms__term__in=terms)
+        .annotate(
+            matched_terms=Count('terms'),
+            score=Sum(
+                Case(
+                    *[When(terms__term=term, then=F('terms__weight') * idf[term]) for term in terms],
+                    output_field=FloatField(),
+                )
+            ),
+        )
+        .filter(matched_terms__gte=min_matched)
+        .order_by('-score', '-post_time')
+    )
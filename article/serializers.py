@@ -1,5 +1,6 @@
 from rest_framework import serializers
-from .models import Article, Comment
+from django.conf import settings
+from .models import Article, BoardDigest, Comment
 
 class CommentSerializer(serializers.ModelSerializer):
     class Meta:
@@ -20,14 +21,31 @@ class ArticleSerializer(serializers.ModelSerializer):
         fields = ['id', 'board', 'title', 'author', 'post_time', 'url', 'content', 'comments']
 
 # 2. 查詢參數序列化 (負責驗證 GET 請求的參數，如 author_name, start_date 等)
-class ArticleListRequestSerializer(serializers.Serializer):
+class ArticleFilterRequestSerializer(serializers.Serializer):
     author_name = serializers.CharField(help_text="作者名稱", write_only=True, required=False)
     board_name = serializers.CharField(help_text="看板名稱", write_only=True, required=False)
     start_date = serializers.DateField(help_text="起始日期", write_only=True, required=False)
     end_date = serializers.DateField(help_text="結束日期", write_only=True, required=False)
+
+class ArticleListRequestSerializer(ArticleFilterRequestSerializer):
     limit = serializers.IntegerField(help_text="每頁返回的筆數 (預設 50)", write_only=True, default=50, min_value=1)
     offset = serializers.IntegerField(help_text="從第幾筆開始 (預設 0)", write_only=True, required=False, min_value=0)
 
+# 3. 關鍵字檢索參數 (沿用列表的作者、看板、日期與分頁參數)
+class ArticleSearchRequestSerializer(ArticleListRequestSerializer):
+    q = serializers.CharField(help_text="關鍵字", write_only=True, required=True, max_length=100, min_length=1)
+
+# 3-1. 匯出參數 (沿用列表的作者、看板、日期篩選，不分頁)
+class ArticleExportRequestSerializer(ArticleFilterRequestSerializer):
+    include_comments = serializers.BooleanField(help_text="是否包含推文 (預設 true)", write_only=True, default=True)
+
+# 4. 關鍵字檢索結果 (多一個相關性分數)
+class ArticleSearchResultSerializer(ArticleSerializer):
+    score = serializers.FloatField(read_only=True)
+
+    class Meta(ArticleSerializer.Meta):
+        fields = ArticleSerializer.Meta.fields + ['score']
+
 # --- [新增] RAG 搜尋用的 Serializer ---
 class QueryRequestSerializer(serializers.Serializer):
     # 輸入欄位
@@ -43,4 +61,53 @@ class QueryRequestSerializer(serializers.Serializer):
     # 輸出欄位 (唯讀)
     answer = serializers.CharField(required=False, read_only=True)
     # 這裡重用 ArticleSerializer 來格式化相關文章
-    related_articles = ArticleSerializer(many=True, read_only=True)
\ No newline at end of file
+    related_articles = ArticleSerializer(many=True, read_only=True)
+
+# --- 批次 RAG 搜尋用的 Serializer ---
+class BatchQueryRequestSerializer(serializers.Serializer):
+    questions = serializers.ListField(
+        child=serializers.CharField(max_length=100, min_length=1),
+        help_text="問題列表 (最多 50 題)",
+        min_length=1,
+        max_length=50,
+    )
+    top_k = serializers.IntegerField(help_text="每題檢索的文章片段數量 (預設 3)", default=3, min_value=1, max_value=10)
+
+class BatchQueryResultSerializer(serializers.Serializer):
+    question = serializers.CharField(read_only=True)
+    answer = serializers.CharField(read_only=True)
+    error = serializers.CharField(read_only=True)
+    related_articles = ArticleSerializer(many=True, read_only=True)
+    # 各階段耗時 (毫秒)：retrieval_ms、generation_ms
+    timings = serializers.DictField(child=serializers.FloatField(), read_only=True)
+
+class BatchQueryResponseSerializer(serializers.Serializer):
+    results = BatchQueryResultSerializer(many=True, read_only=True)
+    # 整批共用階段的耗時 (毫秒)：embedding_ms、db_ms、total_ms
+    timings = serializers.DictField(child=serializers.FloatField(), read_only=True)
+
+# --- 看板討論摘要用的 Serializer ---
+class BoardDigestRequestSerializer(serializers.Serializer):
+    board_name = serializers.CharField(help_text="看板名稱", write_only=True, required=True)
+    window_hours = serializers.IntegerField(help_text="時段長度 (小時，預設 24)", write_only=True, default=24)
+    limit = serializers.IntegerField(help_text="回傳最近幾個時段 (預設 1)", write_only=True, default=1,
+                                     min_value=1, max_value=30)
+
+    def validate_window_hours(self, value):
+        if value not in settings.DIGEST_WINDOW_HOURS:
+            raise serializers.ValidationError(f"可用的時段長度: {settings.DIGEST_WINDOW_HOURS}")
+        return value
+
+class BoardDigestSerializer(serializers.ModelSerializer):
+    # 推文中「推」的比例 (推 / (推 + 噓))，沒有推噓時為 None
+    push_ratio = serializers.SerializerMethodField()
+
+    class Meta:
+        model = BoardDigest
+        fields = ['board', 'window_hours', 'window_start', 'window_end', 'article_count',
+                  'push_count', 'boo_count', 'neutral_count', 'push_ratio',
+                  'topics', 'representative_articles', 'summary', 'generated_at']
+
+    def get_push_ratio(self, digest) -> float:
+        total = digest.push_count + digest.boo_count
+        return round(digest.push_count / total, 4) if total else None
@@ -0,0 +1,131 @@
+"""
+相同查詢的合併 (single-flight)
+
+新聞發生時，大量使用者會在幾秒內問幾乎相同的問題，每個請求都完整跑一次 RAG (embedding、Pinecone、Gemini)。
+正規化後問題與參數相同、且同時進行中的請求只計算一次，其他請求等待同一個結果：
+- 同一個 process：共用進行中的 asyncio.Future
+- 跨 web worker：以 Redis (Django cache) 的鎖決定由誰計算，結果短暫寫入 Redis 供其他 worker 讀取；
+  計算者失敗 (鎖已釋放但沒有結果) 或等待逾時，改由自己計算
+結果只保留 RAG_SINGLEFLIGHT_RESULT_TTL 秒，目的是合併同時間的請求，不是長期快取
+"""
+import asyncio
+import re
+import time
+import traceback
+import unicodedata
+
+from django.conf import settings
+from django.core.cache import cache
+
+from article.cache import make_fingerprint
+from config.metrics import COALESCED_REQUESTS
+from log_app.models import Log
+
+LOCK_KEY = 'singleflight:lock:{name}:{fingerprint}'
+RESULT_KEY = 'singleflight:result:{name}:{fingerprint}'
+
+# 同一 process 內進行中的計算 {(name, fingerprint): Future}
+_inflight = {}
+
+
+def normalize_question(question: str) -> str:
+    """全形半形統一、英文轉小寫、合併空白並移除結尾的標點 ('台積電  法說會？' 與 '台積電 法說會?' 視為相同)"""
+    text = unicodedata.normalize('NFKC', question).lower()
+    text = re.sub(r'\s+', ' ', text).strip()
+    return text.rstrip('?!.。~ ')
+
+
+async def single_flight(name: str, params: dict, compute, should_share=None):
+    """
+    合併相同的進行中請求
+    compute: 無參數的 async 函式
+    should_share: 判斷結果是否寫入 Redis 給其他 worker (例如錯誤結果不分享)；None 代表都分享
+    """
+    if not settings.RAG_SINGLEFLIGHT_ENABLED:
+        return await compute()
+
+    fingerprint = make_fingerprint(name, 0, params)
+    key = (name, fingerprint)
+
+    # 1. 同一 process 已有相同的計算：等待它的結果
+    if (future := _inflight.get(key)) is not None:
+        COALESCED_REQUESTS.labels(name, 'local').inc()
+        try:
+            return await asyncio.shield(future)
+        except asyncio.CancelledError:
+            if not future.cancelled() or asyncio.current_task().cancelling():
+                raise
+            # 計算者的請求被取消 (客戶端斷線)，改由自己計算
+            return await single_flight(name, params, compute, should_share)
+
+    future = asyncio.get_running_loop().create_future()
+    _inflight[key] = future
+    try:
+        result = await _compute_once(name, fingerprint, compute, should_share)
+    except asyncio.CancelledError:
+        future.cancel()
+        raise
+    except Exception as e:
+        future.set_exception(e)
+        # 標記例外已被讀取，沒有其他請求在等待時不會出現 "exception was never retrieved"
+        future.exception()
+        raise
+    else:
+        future.set_result(result)
+        return result
+    finally:
+        _inflight.pop(key, None)
+
+
+async def _compute_once(name: str, fingerprint: str, compute, should_share):
+    """2. 跨 worker：取得 Redis 鎖的 worker 計算，其他 worker 輪詢結果"""
+    lock_key = LOCK_KEY.format(name=name, fingerprint=fingerprint)
+    result_key = RESULT_KEY.format(name=name, fingerprint=fingerprint)
+
+    try:
+        # 其他 worker 剛完成的結果
+        result = await cache.aget(result_key)
+        if result is not None:
+            COALESCED_REQUESTS.labels(name, 'remote').inc()
+            return result
+        # timeout：計算者異常終止時鎖會自動過期
+        acquired = await cache.aadd(lock_key, 1, timeout=settings.RAG_SINGLEFLIGHT_LOCK_TIMEOUT)
+    except Exception:
+        # Redis 異常時不影響 API，直接計算
+        await Log.objects.acreate(level='WARNING', category='singleflight', message='讀取 Redis 失敗，略過跨 worker 合併',
+                                  traceback=traceback.format_exc())
+        return await compute()
+
+    if not acquired:
+        result = await _wait_for_result(lock_key, result_key)
+        if result is not None:
+            COALESCED_REQUESTS.labels(name, 'remote').inc()
+            return result
+        return await compute()
+
+    result = None
+    try:
+        result = await compute()
+        return result
+    finally:
+        try:
+            if result is not None and (should_share is None or should_share(result)):
+                await cache.aset(result_key, result, settings.RAG_SINGLEFLIGHT_RESULT_TTL)
+            await cache.adelete(lock_key)
+        except Exception:
+            # 鎖會在 RAG_SINGLEFLIGHT_LOCK_TIMEOUT 後過期，等待中的 worker 最多等到那時再自己計算
+            await Log.objects.acreate(level='WARNING', category='singleflight', message='分享結果或釋放 Redis 鎖失敗',
+                                      traceback=traceback.format_exc())
+
+
+async def _wait_for_result(lock_key: str, result_key: str):
+    """輪詢其他 worker 的結果；計算者結束但沒有分享結果 (錯誤) 或逾時回傳 None"""
+    deadline = time.monotonic() + settings.RAG_SINGLEFLIGHT_LOCK_TIMEOUT
+    while time.monotonic() < deadline:
+        await asyncio.sleep(settings.RAG_SINGLEFLIGHT_POLL_INTERVAL)
+        values = await cache.aget_many([result_key, lock_key])
+        if result_key in values:
+            return values[result_key]
+        if lock_key not in values:
+            return None
+    return None
@@ -1,3 +1,949 @@
-from django.test import TestCase
+import asyncio
+import math
+import os
+import random
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.request
+from io import StringIO
+from collections import defaultdict
+from datetime import datetime, timedelta
+from zoneinfo import ZoneInfo
+from pathlib import Path
+from unittest import mock
 
-# Create your tests here.
+import fakeredis
+from django.conf import settings
+from django.core.cache import cache
+from django.core.management import call_command, CommandError
+from django.db import connections, router
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from article.cache import aget_cache_stats, bump_data_version, make_fingerprint, RECENTLY_BUMPED_KEY
+from article.chunking import clean_content, chunk_text
+from article import dedup
+from article.dedup import assign_duplicates
+from article.fakes import ptt as fake_ptt
+from article.fakes.ai import FakeChatModel, FakeEmbeddings, FakeVectorStore, InMemoryIndex, RemoteIndex, get_fake_vector_store
+from article.fakes.server import make_server
+from article.digest import build_digest, update_board_digests, window_start
+from article.models import Article, ArticleMinHashBand, ArticleTerm, BoardDigest, Comment
+from article import rag_query
+from article.rag_query import arun_rag_batch, collapse_duplicates
+from article.refresh import update_refresh_schedule, is_refresh_due
+from article.scraper import (
+    save_article, refresh_hot_articles, ptt_scrape, get_data_from_article_html, get_latest_page,
+    get_urls_from_board_html,
+)
+from article.search_index import search_articles, MAX_CONTENT_COUNT, TITLE_WEIGHT
+from article.singleflight import single_flight, normalize_question, LOCK_KEY, RESULT_KEY
+from celery_app.locks import article_lock, board_lock, dedup_lock, DEDUP_LOCK_KEY
+from config.db_router import use_read_replica, use_primary
+from log_app.models import Log
+
+FIXTURES_DIR = Path(__file__).resolve().parent.parent / 'benchmarks' / 'fixtures'
+
+
+def make_comments(count, start=0):
+    return [
+        {'tag': '推', 'user_id': f'user{i}', 'content': f'推文 {i}', 'ip_datetime': '01/01 10:00'}
+        for i in range(start, start + count)
+    ]
+
+
+def make_article_data(comments, title='[新聞] 台積電法說會', content='台積電今天舉行法說會。', post_time=None):
+    return {
+        'title': title,
+        'author': 'tester',
+        'content': content,
+        'post_time': post_time or timezone.now() - timedelta(hours=1),
+        'comments': comments,
+    }
+
+
+# ---------------------------------------------------------
+# 熱門文章推文追蹤 (article/refresh.py、refresh_hot_articles)
+# ---------------------------------------------------------
+
+@override_settings(ARTICLE_REFRESH_MIN_INTERVAL=300, ARTICLE_REFRESH_MAX_INTERVAL=6 * 3600,
+                   ARTICLE_REFRESH_MAX_AGE=3 * 24 * 3600)
+class RefreshScheduleTests(TestCase):
+    def test_article_without_pushes_stays_scheduled(self):
+        now = timezone.now()
+        article = Article(board='Stock', post_time=now - timedelta(minutes=5))
+        update_refresh_schedule(article, 0, now)
+
+        self.assertEqual(article.push_velocity, 0)
+        self.assertEqual(article.next_refresh_at, now + timedelta(hours=6))
+        self.assertFalse(is_refresh_due(article, now))
+        self.assertTrue(is_refresh_due(article, now + timedelta(hours=6)))
+
+        # 之後才開始的推文潮：下一次抓取的速度提高，間隔縮短
+        later = now + timedelta(hours=6)
+        update_refresh_schedule(article, 100, later)
+        self.assertLess(article.next_refresh_at - later, timedelta(hours=6))
+
+    def test_cooled_article_refreshes_at_max_interval(self):
+        now = timezone.now()
+        article = Article(board='Stock', post_time=now - timedelta(hours=10))
+        update_refresh_schedule(article, 1, now)
+        self.assertEqual(article.next_refresh_at, now + timedelta(hours=6))
+
+    def test_old_article_stops_tracking(self):
+        now = timezone.now()
+        article = Article(board='Stock', post_time=now - timedelta(days=4))
+        update_refresh_schedule(article, 50, now)
+        self.assertIsNone(article.next_refresh_at)
+
+
+class RefreshHotArticlesTests(TestCase):
+    def setUp(self):
+        patcher = mock.patch('celery_app.locks.redis_client', fakeredis.FakeRedis())
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        self.url = 'https://www.ptt.cc/bbs/Stock/M.1700000000.A.001.html'
+        self.article, _, _ = save_article('Stock', self.url, make_article_data(make_comments(3)))
+        Article.objects.filter(id=self.article.id).update(next_refresh_at=timezone.now() - timedelta(minutes=1))
+
+    def test_skips_article_while_it_is_being_scraped(self):
+        scrape_lock = article_lock(self.url)
+        self.assertTrue(scrape_lock.acquire())
+        with mock.patch('article.scraper.fetch_article', return_value=make_article_data(make_comments(5))) as fetch:
+            self.assertEqual(refresh_hot_articles(10), {})
+        fetch.assert_not_called()
+        self.assertEqual(Comment.objects.filter(article=self.article).count(), 3)
+
+        # 爬蟲寫入完成後，文章仍為到期狀態，下一個 tick 補上新推文
+        scrape_lock.release()
+        with mock.patch('article.scraper.fetch_article', return_value=make_article_data(make_comments(5))):
+            self.assertEqual(refresh_hot_articles(10), {'Stock': 1})
+        self.assertEqual(Comment.objects.filter(article=self.article).count(), 5)
+
+    def test_does_not_block_board_scrape(self):
+        new_url = 'https://www.ptt.cc/bbs/Stock/M.1700000100.A.002.html'
+        board_html = fake_ptt.render_board_html('Stock', [self.url.replace(settings.PTT_BASE_URL, ''),
+                                                          new_url.replace(settings.PTT_BASE_URL, '')])
+        scraped = []
+
+        def scrape_fetch(url):
+            scraped.append(url)
+            return make_article_data(make_comments(1), title='[新聞] 新文章')
+
+        def refresh_fetch(url):
+            # 重新抓取期間看板的爬蟲照常執行：新文章寫入，正在重新抓取的文章略過
+            self.assertTrue(board_lock('Stock').acquire())
+            with mock.patch('article.scraper.get_html', return_value=board_html), \
+                    mock.patch('article.scraper.fetch_article', side_effect=scrape_fetch):
+                self.assertEqual(len(ptt_scrape('Stock')), 1)
+            return make_article_data(make_comments(5))
+
+        with mock.patch('article.scraper.fetch_article', side_effect=refresh_fetch):
+            self.assertEqual(refresh_hot_articles(10), {'Stock': 1})
+
+        self.assertEqual(scraped, [new_url])
+        self.assertEqual(Comment.objects.filter(article=self.article).count(), 5)
+        self.assertTrue(Article.objects.filter(url=new_url).exists())
+        self.assertTrue(article_lock(self.url).acquire())
+
+    def test_repeated_save_does_not_duplicate_comments(self):
+        data = make_article_data(make_comments(3) + make_comments(2, start=3))
+        save_article('Stock', self.url, data)
+        save_article('Stock', self.url, data)
+        self.assertEqual(
+            list(Comment.objects.filter(article=self.article).order_by('id').values_list('user_id', flat=True)),
+            [f'user{i}' for i in range(5)],
+        )
+
+
+# ---------------------------------------------------------
+# 文章切塊 (article/chunking.py)
+# ---------------------------------------------------------
+
+class ChunkingTests(TestCase):
+    SIGNATURE = '我的簽名檔\n歡迎來我的部落格 https://example.com/blog\n'
+
+    def parse_fixture(self, signature=None):
+        from article.scraper import get_data_from_article_html
+
+        html = (FIXTURES_DIR / 'article.html').read_text(encoding='utf-8')
+        if signature:
+            # 在 ※ 發信站 前的 -- 之後加上簽名檔 (PTT 的格式：內文 -- 簽名檔 -- ※ 發信站)
+            html = html.replace('\n--\n<span class="f2">※ 發信站', f'\n--\n{signature}--\n<span class="f2">※ 發信站', 1)
+        return get_data_from_article_html(html)['content']
+
+    def test_removes_signature_from_scraped_article(self):
+        without_signature = clean_content(self.parse_fixture())
+        with_signature = clean_content(self.parse_fixture(self.SIGNATURE))
+
+        self.assertNotIn('簽名檔', with_signature)
+        self.assertNotIn('--', with_signature)
+        self.assertEqual(with_signature, without_signature)
+        self.assertTrue(with_signature.endswith('亞利桑那廠預計 2025 年上半年量產'))
+
+    def test_removes_footer_and_signature(self):
+        self.assertEqual(clean_content('內文第一句。\n內文第二句。\n\n--\n我的簽名檔\n--\n'), '內文第一句。\n內文第二句。')
+        self.assertEqual(clean_content('內文第一句。\n--\n'), '內文第一句。')
+        self.assertEqual(clean_content('內文第一句。'), '內文第一句。')
+
+    def test_chunks_never_exceed_chunk_size(self):
+        chunks = chunk_text('a' * 10 + '。' + 'b' * 700, 300, 50)
+        self.assertEqual(max(map(len, chunks)), 300)
+        self.assertEqual(''.join(chunks), 'a' * 10 + '。' + 'b' * 700)
+
+        text = ''.join(f'第{i}句' + '字' * (i * 7 % 60) + '。' for i in range(200))
+        for chunk_size, chunk_overlap in ((100, 30), (300, 50), (500, 80)):
+            chunks = chunk_text(text, chunk_size, chunk_overlap)
+            self.assertLessEqual(max(map(len, chunks)), chunk_size)
+
+    def test_overlap_repeats_previous_sentences(self):
+        sentences = [f'第{i}句內容。' for i in range(10)]
+        chunks = chunk_text(''.join(sentences), 20, 7)
+        self.assertEqual(chunks[0], '第0句內容。第1句內容。第2句內容。')
+        self.assertTrue(chunks[1].startswith('第2句內容。'))
+
+
+# ---------------------------------------------------------
+# 讀寫分離 (config/db_router.py) 與 API 快取 (article/cache.py)
+# ---------------------------------------------------------
+
+class ApiCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+        for name, board in (('stock', 'Stock'), ('gossiping', 'Gossiping')):
+            Article.objects.create(board=board, title=name, author='tester', content='內文',
+                                   post_time=timezone.now(), url=f'https://www.ptt.cc/bbs/{board}/{name}.html')
+
+    async def get(self, path='/api/posts/', etag=None, **params):
+        headers = {'If-None-Match': etag} if etag else {}
+        return await self.async_client.get(path, params, headers=headers)
+
+    async def stats(self, name='article-list'):
+        counts = (await aget_cache_stats())[name]
+        return counts['hit'], counts['miss'], counts['not_modified']
+
+    async def test_etag_and_not_modified(self):
+        response = await self.get(board_name='Stock')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Cache-Control'], 'no-cache')
+        etag = response['ETag']
+
+        cached = await self.get(board_name='Stock')
+        self.assertEqual((cached['ETag'], cached.json()), (etag, response.json()))
+
+        for header in (etag, f'W/{etag}', f'"other", {etag}'):
+            not_modified = await self.get(etag=header, board_name='Stock')
+            self.assertEqual(not_modified.status_code, 304)
+            self.assertEqual(not_modified['ETag'], etag)
+            self.assertEqual(not_modified.content, b'')
+        self.assertEqual(await self.stats(), (1, 1, 3))
+
+        # 查詢參數不同，ETag 也不同
+        other = await self.get(etag=etag, board_name='Stock', limit=5)
+        self.assertEqual(other.status_code, 200)
+        self.assertNotEqual(other['ETag'], etag)
+
+    async def test_statistics_ignore_pagination_params(self):
+        response = await self.get('/api/statistics/', board_name='Stock', limit=10)
+        etag = response['ETag']
+        for params in ({'limit': 20}, {'limit': 5, 'offset': 40}, {}):
+            cached = await self.get('/api/statistics/', etag=etag, board_name='Stock', **params)
+            self.assertEqual(cached.status_code, 304)
+        self.assertEqual(await self.stats('article-statistics'), (0, 1, 3))
+
+    async def test_bump_invalidates_board_and_site_wide_entries(self):
+        stock_etag = (await self.get(board_name='Stock'))['ETag']
+        gossiping_etag = (await self.get(board_name='Gossiping'))['ETag']
+        all_etag = (await self.get())['ETag']
+
+        await Article.objects.acreate(board='Stock', title='new', author='tester', content='內文',
+                                      post_time=timezone.now(), url='https://www.ptt.cc/bbs/Stock/new.html')
+        bump_data_version('Stock')
+
+        response = await self.get(etag=stock_etag, board_name='Stock')
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], stock_etag)
+        self.assertEqual(response.json()['count'], 2)
+        self.assertEqual((await self.get(etag=all_etag)).status_code, 200)
+        # 其他看板的快取不受影響
+        self.assertEqual((await self.get(etag=gossiping_etag, board_name='Gossiping')).status_code, 304)
+
+    async def test_error_responses_are_not_cached(self):
+        for _ in range(2):
+            response = await self.get('/api/posts/999999/')
+            self.assertEqual(response.status_code, 404)
+            self.assertNotIn('ETag', response)
+        self.assertEqual(await self.stats('article-detail'), (0, 2, 0))
+
+    async def test_cache_failure_falls_back_to_database(self):
+        with mock.patch('article.cache.aget_data_version', side_effect=ConnectionError('redis down')):
+            response = await self.get(board_name='Stock')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['count'], 1)
+        self.assertNotIn('ETag', response)
+
+
+class ReplicaDatabaseMixin:
+    """另外建立一個 SQLite 資料庫作為 replica (資料不會自動同步，可模擬複寫延遲)"""
+    databases = {'default', 'replica'}
+
+    @classmethod
+    def setUpClass(cls):
+        fd, path = tempfile.mkstemp(suffix='.sqlite3')
+        os.close(fd)
+        config = connections.configure_settings({
+            'default': {}, 'replica': {'ENGINE': 'django.db.backends.sqlite3', 'NAME': path},
+        })['replica']
+        patcher = mock.patch.dict(settings.DATABASES, {'replica': config})
+        patcher.start()
+
+        def cleanup():
+            connections['replica'].close()
+            del connections['replica']
+            patcher.stop()
+            os.remove(path)
+        cls.addClassCleanup(cleanup)
+
+        # 建表需在 TestCase 開啟交易之前
+        with connections['replica'].schema_editor() as editor:
+            editor.create_model(Article)
+            editor.create_model(Comment)
+        super().setUpClass()
+
+    def create_article(self, title, using='default', board='Stock'):
+        return Article.objects.using(using).create(
+            board=board, title=title, author='tester', content='內文', post_time=timezone.now(),
+            url=f'https://www.ptt.cc/bbs/{board}/{title}.html',
+        )
+
+
+class ReadReplicaRouterTests(ReplicaDatabaseMixin, TestCase):
+    def test_routes_article_reads_inside_block(self):
+        self.create_article('primary')
+        self.create_article('replica', using='replica')
+
+        self.assertEqual(list(Article.objects.values_list('title', flat=True)), ['primary'])
+        with use_read_replica():
+            self.assertEqual(router.db_for_read(Article), 'replica')
+            self.assertEqual(list(Article.objects.values_list('title', flat=True)), ['replica'])
+            # 寫入與 log_app 的讀取一律走 primary
+            self.assertEqual(router.db_for_write(Article), 'default')
+            self.assertEqual(router.db_for_read(Log), 'default')
+            with use_primary():
+                self.assertEqual(list(Article.objects.values_list('title', flat=True)), ['primary'])
+            self.assertEqual(list(Article.objects.values_list('title', flat=True)), ['replica'])
+
+    def test_without_replica_reads_primary(self):
+        with mock.patch.dict(settings.DATABASES, clear=True, values={'default': settings.DATABASES['default']}):
+            with use_read_replica():
+                self.assertEqual(router.db_for_read(Article), 'default')
+
+
+class ReplicaLagCacheTests(ReplicaDatabaseMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        self.addCleanup(cache.clear)
+
+    async def get_titles(self, **params):
+        response = await self.async_client.get('/api/posts/', {'board_name': 'Stock', **params})
+        self.assertEqual(response.status_code, 200)
+        return [article['title'] for article in response.json()['results']], response['ETag']
+
+    async def test_does_not_cache_stale_replica_rows_after_bump(self):
+        for using in ('default', 'replica'):
+            await Article.objects.using(using).acreate(
+                board='Stock', title='old', author='tester', content='內文', post_time=timezone.now(), url='old',
+            )
+        titles, etag = await self.get_titles()
+        self.assertEqual(titles, ['old'])
+
+        # 爬蟲寫入 primary，replica 還沒複寫
+        await Article.objects.acreate(board='Stock', title='new', author='tester', content='內文',
+                                      post_time=timezone.now() + timedelta(minutes=1), url='new')
+        bump_data_version('Stock')
+
+        titles, new_etag = await self.get_titles()
+        self.assertNotEqual(new_etag, etag)
+        self.assertEqual(titles, ['new', 'old'])
+        # 快取內容也是 primary 的資料
+        self.assertEqual(await self.get_titles(), (['new', 'old'], new_etag))
+
+        # 超過 API_CACHE_PRIMARY_WINDOW 後，未命中的請求回到 replica 讀取
+        await cache.adelete(RECENTLY_BUMPED_KEY.format(board='Stock'))
+        titles, _ = await self.get_titles(limit=10)
+        self.assertEqual(titles, ['old'])
+
+
+# ---------------------------------------------------------
+# 大量匯出 (article/export.py、export_articles)
+# ---------------------------------------------------------
+
+class ExportArticlesCommandTests(TestCase):
+    def setUp(self):
+        for i in range(3):
+            article, _, _ = save_article('Stock', f'https://www.ptt.cc/bbs/Stock/M.{i}.html',
+                                         make_article_data(make_comments(i), title=f'文章 {i}'))
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.output = Path(directory.name) / 'articles.parquet'
+
+    def test_parquet_export(self):
+        import pyarrow.parquet as pq
+
+        call_command('export_articles', str(self.output), format='parquet', batch_size=2, stderr=StringIO())
+        parquet = pq.ParquetFile(self.output)
+        self.assertEqual(parquet.metadata.num_row_groups, 2)
+        rows = parquet.read().to_pylist()
+        self.assertEqual([row['title'] for row in rows], ['文章 0', '文章 1', '文章 2'])
+        self.assertEqual([len(row['comments']) for row in rows], [0, 1, 2])
+
+    def test_parquet_export_without_pyarrow(self):
+        with mock.patch('article.management.commands.export_articles.find_spec', return_value=None):
+            with self.assertRaisesMessage(CommandError, 'requires pyarrow'):
+                call_command('export_articles', str(self.output), format='parquet')
+        self.assertFalse(self.output.exists())
+
+
+# ---------------------------------------------------------
+# 看板討論摘要 (article/digest.py)
+# ---------------------------------------------------------
+
+@override_settings(DIGEST_WINDOW_HOURS=[6], AI_BACKEND='fake', FAKE_CHAT_DELAY=0)
+class BoardDigestTests(TestCase):
+    def test_window_start_aligns_to_local_day(self):
+        tz = ZoneInfo(settings.CELERY_TIMEZONE)
+        moment = datetime(2026, 10, 18, 14, 30, tzinfo=tz)
+        self.assertEqual(window_start(moment, 6), datetime(2026, 10, 18, 12, tzinfo=tz))
+        self.assertEqual(window_start(moment, 24), datetime(2026, 10, 18, tzinfo=tz))
+        # 以 UTC 傳入也依台灣時間對齊
+        self.assertEqual(window_start(moment.astimezone(ZoneInfo('UTC')), 24), datetime(2026, 10, 18, tzinfo=tz))
+
+    def test_rebuilds_earlier_window_after_refresh(self):
+        article, _, _ = save_article('Stock', 'https://www.ptt.cc/bbs/Stock/M.1.html',
+                                     make_article_data(make_comments(1), post_time=timezone.now() - timedelta(hours=8)))
+        start = window_start(article.post_time, 6)
+        build_digest('Stock', 6, start)
+        update_board_digests('Stock')
+        self.assertEqual(BoardDigest.objects.get(window_start=start).push_count, 1)
+
+        # 熱門文章追蹤抓到較早時段文章的新推文
+        save_article('Stock', article.url, make_article_data(make_comments(3), post_time=article.post_time))
+        digests = update_board_digests('Stock')
+
+        self.assertIn(start, [digest.window_start for digest in digests])
+        self.assertEqual(BoardDigest.objects.get(window_start=start).push_count, 3)
+
+
+# ---------------------------------------------------------
+# 全文檢索 (article/search_index.py)
+# ---------------------------------------------------------
+
+class SearchArticlesTests(TestCase):
+    def save(self, name, title, content, board='Stock', hours_ago=1):
+        article, _, _ = save_article(board, f'https://www.ptt.cc/bbs/{board}/M.{name}.html', make_article_data(
+            [], title=title, content=content, post_time=timezone.now() - timedelta(hours=hours_ago),
+        ))
+        return article
+
+    def search(self, query, articles=None):
+        return list(search_articles(Article.objects.all() if articles is None else articles, query))
+
+    def test_score_is_weighted_sum_of_matched_terms(self):
+        article = self.save('title', '[新聞] 台積電', '台積電法說會。台積電')
+        self.save('other', '[閒聊] 午餐', '今天吃什麼')
+
+        [result] = self.search('台積電')
+        self.assertEqual(result, article)
+        self.assertEqual(result.matched_terms, 2)
+        # 台積、積電各在標題出現 1 次 (×TITLE_WEIGHT)、內文出現 2 次；idf = log(1 + 2 / (1 + 1))
+        self.assertAlmostEqual(result.score, 2 * (TITLE_WEIGHT + 2) * math.log(2))
+
+    def test_orders_by_score_then_post_time(self):
+        older_title = self.save('older-title', '台積電', '內文', hours_ago=3)
+        newer_title = self.save('newer-title', '台積電', '內文', hours_ago=2)
+        content = self.save('content', '[新聞] 法說會', '台積電')
+        # 內文重複的次數有上限，洗版文章與剛好重複 MAX_CONTENT_COUNT 次的文章同分，再依發文時間排序
+        capped = self.save('capped', '[新聞] 營收', '台積電。' * MAX_CONTENT_COUNT, hours_ago=4)
+        spam = self.save('spam', '[廣告] 好康', '台積電。' * (MAX_CONTENT_COUNT * 3))
+
+        results = self.search('台積電')
+        self.assertEqual(results, [spam, capped, newer_title, older_title, content])
+        self.assertEqual(results[0].score, results[1].score)
+
+    def test_requires_most_query_terms(self):
+        # 台積電法說會 -> 台積、積電、電法、法說、說會，至少需命中 4 個
+        partial = self.save('partial', '台積電', '內文')
+        most = self.save('most', '台積電法說', '內文')
+        self.assertEqual(self.search('台積電法說會'), [most])
+        self.assertCountEqual(self.search('台積電'), [partial, most])
+        self.assertEqual(self.search('!!'), [])
+
+    def test_searches_within_filtered_queryset(self):
+        stock = self.save('stock', '台積電', '內文')
+        self.save('gossiping', '台積電', '內文', board='Gossiping')
+        self.assertEqual(self.search('台積電', Article.objects.filter(board='Stock')), [stock])
+
+    def test_edited_article_is_reindexed(self):
+        article = self.save('edited', '[新聞] 法說會', '台積電營收創新高')
+        self.assertEqual(self.search('營收'), [article])
+
+        self.save('edited', '[新聞] 法說會', '聯發科營收創新高')
+        self.assertEqual(self.search('台積電'), [])
+        self.assertEqual(self.search('聯發科'), [article])
+        self.assertFalse(ArticleTerm.objects.filter(article=article, term='台積').exists())
+
+        # 只有推文變動時不重建索引
+        with mock.patch('article.scraper.index_article') as index_article:
+            save_article('Stock', article.url, make_article_data(
+                make_comments(2), title='[新聞] 法說會', content='聯發科營收創新高', post_time=article.post_time,
+            ))
+        index_article.assert_not_called()
+
+
+# ---------------------------------------------------------
+# 近似重複文章 (article/dedup.py、rag_query.collapse_duplicates)
+# ---------------------------------------------------------
+
+def make_news(topic, length=200):
+    # 不同主題的內文用字不同 (固定亂數)，同主題的內容完全相同
+    rng = random.Random(topic)
+    return ''.join(chr(rng.randint(0x4E00, 0x9FFF)) for _ in range(length))
+
+
+@override_settings(DEDUP_ENABLED=True, DEDUP_MIN_SIMILARITY=0.7, DEDUP_MIN_SHINGLES=50)
+class AssignDuplicatesTests(TestCase):
+    def setUp(self):
+        self.redis = fakeredis.FakeRedis()
+        patcher = mock.patch('celery_app.locks.redis_client', self.redis)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def save(self, name, content):
+        article, _, _ = save_article('Stock', f'https://www.ptt.cc/bbs/Stock/M.{name}.html',
+                                     make_article_data([], title=name, content=content))
+        return article
+
+    def test_marks_near_duplicates_across_batches(self):
+        original = self.save('original', make_news('台積電'))
+        repost = self.save('repost', '※ [本文轉錄自 Stock 看板]\n' + make_news('台積電') + '\nhttps://example.com/news')
+        other = self.save('other', make_news('聯發科'))
+        short = self.save('short', '短文')
+
+        self.assertEqual(assign_duplicates([original.id, repost.id, other.id, short.id]),
+                         [original.id, other.id, short.id])
+        repost.refresh_from_db()
+        self.assertEqual(repost.duplicate_of_id, original.id)
+        short.refresh_from_db()
+        self.assertEqual(bytes(short.minhash), b'')
+        # 只有代表文章寫入分段索引
+        self.assertEqual(set(ArticleMinHashBand.objects.values_list('article_id', flat=True)),
+                         {original.id, other.id})
+
+        # 重試結果相同；之後的批次以分段索引比對到既有的代表文章
+        self.assertEqual(assign_duplicates([original.id, repost.id]), [original.id])
+        copy = self.save('copy', make_news('台積電') + '\n推')
+        self.assertEqual(assign_duplicates([copy.id]), [])
+
+    def test_recomputes_minhash_after_content_edit(self):
+        original = self.save('original', make_news('台積電'))
+        repost = self.save('repost', make_news('台積電'))
+        other = self.save('other', make_news('聯發科'))
+        assign_duplicates([original.id, repost.id, other.id])
+
+        # 重複文章修改成不同的內容：成為代表文章
+        repost = self.save('repost', make_news('鴻海'))
+        self.assertIsNone(repost.minhash)
+        self.assertEqual(assign_duplicates([repost.id]), [repost.id])
+        repost.refresh_from_db()
+        self.assertIsNone(repost.duplicate_of_id)
+
+        # 代表文章修改成另一篇的內容：改標記為重複，原本指向它的文章改指向新的代表文章
+        copy = self.save('copy', make_news('台積電'))
+        assign_duplicates([copy.id])
+        original = self.save('original', make_news('聯發科'))
+        self.assertEqual(assign_duplicates([original.id]), [])
+
+        original.refresh_from_db()
+        copy.refresh_from_db()
+        self.assertEqual((original.duplicate_of_id, copy.duplicate_of_id), (other.id, other.id))
+        self.assertFalse(ArticleMinHashBand.objects.filter(article=original).exists())
+
+        # 只有推文變動時不需要重新比對
+        save_article('Stock', original.url, make_article_data(make_comments(2), title='original',
+                                                              content=make_news('聯發科')))
+        original.refresh_from_db()
+        self.assertIsNotNone(original.minhash)
+
+    def test_edited_articles_are_sent_to_dedup(self):
+        original = self.save('original', make_news('台積電'))
+        other = self.save('other', make_news('聯發科'))
+        assign_duplicates([original.id, other.id])
+
+        # 熱門文章追蹤重新抓取時發現代表文章的內文改成另一篇的轉錄：送出重新比對，不再向量化
+        Article.objects.filter(id=other.id).update(next_refresh_at=timezone.now() - timedelta(minutes=1))
+        embedded = []
+        with mock.patch('article.scraper.fetch_article',
+                        return_value=make_article_data([], title='other', content=make_news('台積電'))):
+            refresh_hot_articles(10, embed=lambda ids: embedded.append(assign_duplicates(ids)))
+        self.assertEqual(embedded, [[]])
+        other.refresh_from_db()
+        self.assertEqual(other.duplicate_of_id, original.id)
+
+        # 爬蟲發現內文改成新的內容：重新成為代表文章並向量化；只有推文變動的文章不送出
+        Article.objects.update(next_refresh_at=timezone.now() - timedelta(minutes=1))
+        pages = {other.url: make_article_data(make_comments(1), title='other', content=make_news('鴻海')),
+                 original.url: make_article_data(make_comments(1), title='original', content=make_news('台積電'))}
+        board_html = fake_ptt.render_board_html('Stock', [url.replace(settings.PTT_BASE_URL, '') for url in pages])
+        embedded = []
+        with mock.patch('article.scraper.get_html', return_value=board_html), \
+                mock.patch('article.scraper.fetch_article', side_effect=pages.get):
+            self.assertEqual(ptt_scrape('Stock', embed=lambda ids: embedded.append(assign_duplicates(ids))), [])
+        self.assertEqual(embedded, [[other.id]])
+        other.refresh_from_db()
+        self.assertIsNone(other.duplicate_of_id)
+
+    def test_batches_are_marked_one_at_a_time(self):
+        first = self.save('first', make_news('台積電'))
+        second = self.save('second', make_news('台積電'))
+
+        # 另一個 worker 持有鎖，正在標記 first 所在的批次
+        self.assertTrue(dedup_lock().acquire())
+        dedup._assign_duplicates([first.id])
+        threading.Timer(0.3, self.redis.delete, [DEDUP_LOCK_KEY]).start()
+
+        original_load_candidates = dedup.load_candidates
+
+        def load_candidates(band_lists):
+            self.assertTrue(self.redis.exists(DEDUP_LOCK_KEY))
+            return original_load_candidates(band_lists)
+
+        started = time.monotonic()
+        with mock.patch('article.dedup.load_candidates', side_effect=load_candidates):
+            # 等到另一個 worker 寫入代表文章並釋放鎖後才比對，不會兩篇都成為代表文章
+            self.assertEqual(assign_duplicates([second.id]), [])
+        self.assertGreaterEqual(time.monotonic() - started, 0.3)
+        self.assertFalse(self.redis.exists(DEDUP_LOCK_KEY))
+
+
+class CollapseDuplicatesTests(TestCase):
+    def test_keeps_first_article_of_each_cluster(self):
+        articles = {
+            1: Article(id=1),
+            2: Article(id=2, duplicate_of_id=1),
+            3: Article(id=3, duplicate_of_id=4),
+            4: Article(id=4),
+            5: Article(id=5),
+        }
+        # 依相似度順序：重複文章排在代表文章前面時保留重複文章；查不到的文章 (已刪除) 略過
+        self.assertEqual([a.id for a in collapse_duplicates([3, 2, 9, 1, 4, 5], articles, 10)], [3, 2, 5])
+        self.assertEqual([a.id for a in collapse_duplicates([3, 2, 9, 1, 4, 5], articles, 2)], [3, 2])
+
+
+# ---------------------------------------------------------
+# 批次 RAG (article/rag_query.py arun_rag_batch、/api/search/batch/)
+# ---------------------------------------------------------
+
+@override_settings(RAG_BATCH_CONCURRENCY=2, RAG_RETRIEVAL_OVERFETCH=1)
+class RagBatchTests(TestCase):
+    TOPICS = ['台積電 法說會 營收', '輝達 財報 伺服器', '央行 升息 殖利率', '鴻海 電動車 產能']
+
+    def setUp(self):
+        self.embeddings = FakeEmbeddings(delay=0)
+        self.store = FakeVectorStore(self.embeddings, InMemoryIndex(), delay=0)
+        self.articles = [
+            Article.objects.create(board='Stock', title=topic, author='tester', content=topic,
+                                   post_time=timezone.now(), url=f'https://www.ptt.cc/bbs/Stock/M.{i}.html')
+            for i, topic in enumerate(self.TOPICS)
+        ]
+        self.store.add_texts(self.TOPICS, metadatas=[{'article_id': article.id} for article in self.articles])
+
+        for patcher in (
+            mock.patch.object(rag_query, 'get_vector_store', return_value=self.store),
+            mock.patch.object(rag_query, 'get_chat_model', return_value=FakeChatModel()),
+            mock.patch.object(self.embeddings, 'aembed_documents', wraps=self.embeddings.aembed_documents),
+            mock.patch.object(rag_query, 'fetch_articles', wraps=rag_query.fetch_articles),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    async def test_shares_embedding_and_db_fetch(self):
+        questions = list(reversed(self.TOPICS))
+        result = await arun_rag_batch(questions, 1)
+
+        self.embeddings.aembed_documents.assert_awaited_once_with(questions, task_type='RETRIEVAL_QUERY')
+        rag_query.fetch_articles.assert_awaited_once_with({article.id for article in self.articles})
+        self.assertEqual([item['question'] for item in result['results']], questions)
+        self.assertEqual([item['related_articles'][0].title for item in result['results']], questions)
+        self.assertEqual(set(result['timings']), {'embedding_ms', 'db_ms', 'total_ms'})
+
+    async def test_results_keep_request_order(self):
+        original = rag_query.agenerate_answer
+
+        async def agenerate_answer(question, merge_text):
+            # 前面的題目較晚完成
+            await asyncio.sleep(0.01 * (len(self.TOPICS) - self.TOPICS.index(question)))
+            return await original(question, merge_text)
+
+        with mock.patch.object(rag_query, 'agenerate_answer', side_effect=agenerate_answer):
+            result = await arun_rag_batch(self.TOPICS, 1)
+        self.assertEqual([item['question'] for item in result['results']], self.TOPICS)
+        for item, topic in zip(result['results'], self.TOPICS):
+            self.assertIn(topic, item['answer'])
+
+    async def test_failed_question_is_isolated(self):
+        original_search = self.store.asimilarity_search_by_vector_with_score
+        failed_vector = self.embeddings.embed_text(self.TOPICS[1])
+        original_answer = rag_query.agenerate_answer
+
+        async def search(vector, k=4, **kwargs):
+            if vector == failed_vector:
+                raise ConnectionError('pinecone timeout')
+            return await original_search(vector, k, **kwargs)
+
+        async def agenerate_answer(question, merge_text):
+            if question == self.TOPICS[2]:
+                raise RuntimeError('quota exceeded')
+            return await original_answer(question, merge_text)
+
+        with mock.patch.object(self.store, 'asimilarity_search_by_vector_with_score', side_effect=search), \
+                mock.patch.object(rag_query, 'agenerate_answer', side_effect=agenerate_answer):
+            response = await self.async_client.post('/api/search/batch/', {'questions': self.TOPICS, 'top_k': 1},
+                                                    content_type='application/json')
+
+        self.assertEqual(response.status_code, 200)
+        results = response.json()['results']
+        self.assertEqual([item['question'] for item in results], self.TOPICS)
+        self.assertIn('pinecone timeout', results[1]['error'])
+        self.assertIn('quota exceeded', results[2]['error'])
+        for item in (results[0], results[3]):
+            self.assertNotIn('error', item)
+            self.assertEqual(item['related_articles'][0]['title'], item['question'])
+        self.assertEqual(await Log.objects.filter(category='rag-batch', level='ERROR').acount(), 2)
+
+
+# ---------------------------------------------------------
+# 相同查詢的合併 (article/singleflight.py)
+# ---------------------------------------------------------
+
+@override_settings(RAG_SINGLEFLIGHT_ENABLED=True, RAG_SINGLEFLIGHT_LOCK_TIMEOUT=2,
+                   RAG_SINGLEFLIGHT_RESULT_TTL=10, RAG_SINGLEFLIGHT_POLL_INTERVAL=0.01)
+class SingleFlightTests(TestCase):
+    PARAMS = {'question': '台積電', 'top_k': 3}
+
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+        self.calls = 0
+        self.release = asyncio.Event()
+
+    def cache_key(self, template):
+        return template.format(name='test', fingerprint=make_fingerprint('test', 0, self.PARAMS))
+
+    async def compute(self, result=None):
+        self.calls += 1
+        await self.release.wait()
+        if isinstance(result, Exception):
+            raise result
+        return result or {'answer': f'第 {self.calls} 次計算'}
+
+    def start(self, compute=None, should_share=None):
+        return asyncio.ensure_future(single_flight('test', self.PARAMS, compute or self.compute, should_share))
+
+    async def test_concurrent_requests_compute_once(self):
+        tasks = [self.start() for _ in range(5)]
+        await asyncio.sleep(0.01)
+        self.release.set()
+
+        self.assertEqual(await asyncio.gather(*tasks), [{'answer': '第 1 次計算'}] * 5)
+        self.assertEqual(self.calls, 1)
+        # 剛完成的結果短暫保留給其他 worker
+        self.assertEqual(await cache.aget(self.cache_key(RESULT_KEY)), {'answer': '第 1 次計算'})
+        self.assertIsNone(await cache.aget(self.cache_key(LOCK_KEY)))
+
+    def test_normalize_question(self):
+        self.assertEqual(normalize_question('台積電　 法說會？'), normalize_question('台積電 法說會?'))
+        self.assertEqual(normalize_question('ＮＶＩＤＩＡ'), 'nvidia')
+
+    async def test_cancelled_leader_hands_over(self):
+        leader = self.start()
+        await asyncio.sleep(0.01)
+        follower = self.start()
+        await asyncio.sleep(0.01)
+
+        # 計算者的客戶端斷線：等待中的請求改由自己計算，不會跟著被取消
+        leader.cancel()
+        await asyncio.sleep(0.01)
+        self.release.set()
+
+        self.assertEqual(await follower, {'answer': '第 2 次計算'})
+        self.assertTrue(leader.cancelled())
+        self.assertIsNone(await cache.aget(self.cache_key(LOCK_KEY)))
+
+    async def test_cancelled_follower_does_not_cancel_leader(self):
+        leader = self.start()
+        await asyncio.sleep(0.01)
+        follower = self.start()
+        await asyncio.sleep(0.01)
+
+        follower.cancel()
+        await asyncio.sleep(0.01)
+        self.release.set()
+
+        self.assertEqual(await leader, {'answer': '第 1 次計算'})
+        self.assertTrue(follower.cancelled())
+        self.assertEqual(self.calls, 1)
+
+    async def test_errors_are_not_shared_across_workers(self):
+        # 例外：同一 process 等待中的請求收到同一個例外，結果不寫入 Redis，鎖釋放
+        tasks = [self.start(lambda: self.compute(RuntimeError('Gemini timeout'))) for _ in range(2)]
+        await asyncio.sleep(0.01)
+        self.release.set()
+        results = await asyncio.gather(*tasks, return_exceptions=True)
+        self.assertEqual([str(result) for result in results], ['Gemini timeout'] * 2)
+        self.assertIsNone(await cache.aget(self.cache_key(RESULT_KEY)))
+        self.assertIsNone(await cache.aget(self.cache_key(LOCK_KEY)))
+
+        # 錯誤結果 (should_share 為 False) 不分享，下一個請求重新計算
+        should_share = lambda data: 'error' not in data
+        self.assertEqual(await self.start(lambda: self.compute({'error': '失敗'}), should_share), {'error': '失敗'})
+        self.assertIsNone(await cache.aget(self.cache_key(RESULT_KEY)))
+        self.assertEqual(await self.start(should_share=should_share), {'answer': '第 3 次計算'})
+
+    async def test_waits_for_other_worker(self):
+        # 另一個 worker 持有鎖，計算完成後寫入結果
+        await cache.aset(self.cache_key(LOCK_KEY), 1)
+        task = self.start()
+        await asyncio.sleep(0.05)
+        await cache.aset(self.cache_key(RESULT_KEY), {'answer': '其他 worker'})
+        self.assertEqual(await task, {'answer': '其他 worker'})
+        self.assertEqual(self.calls, 0)
+
+    async def test_other_worker_fails_without_result(self):
+        await cache.aset(self.cache_key(LOCK_KEY), 1)
+        task = self.start()
+        await asyncio.sleep(0.05)
+        # 計算者失敗：釋放鎖但沒有結果，改由自己計算
+        await cache.adelete(self.cache_key(LOCK_KEY))
+        self.release.set()
+        self.assertEqual(await task, {'answer': '第 1 次計算'})
+
+
+# ---------------------------------------------------------
+# 本機替身 (article/fakes)
+# ---------------------------------------------------------
+
+class SyntheticPttTests(TestCase):
+    def setUp(self):
+        self.site = fake_ptt.SyntheticPtt(pages=3, articles_per_page=4, comments=5)
+
+    def test_board_pages(self):
+        latest = self.site.render('/bbs/Stock/index.html')
+        self.assertEqual(get_latest_page(latest), 3)
+        self.assertEqual(latest, self.site.render('/bbs/Stock/index3.html'))
+        self.assertEqual(
+            [url.split('/bbs/', 1)[1] for url in get_urls_from_board_html(self.site.render('/bbs/Stock/index1.html'))],
+            [fake_ptt.make_article_path('Stock', i).split('/bbs/', 1)[1] for i in range(4)],
+        )
+        self.assertIsNone(self.site.render('/bbs/Stock/index4.html'))
+
+    def test_article_page_parses_to_generated_data(self):
+        path = fake_ptt.make_article_path('Stock', 5)
+        expected = fake_ptt.make_article_data(5, comments=5)
+        data = get_data_from_article_html(self.site.render(path))
+
+        self.assertEqual((data['title'], data['author'].strip()), (expected['title'], expected['author']))
+        self.assertEqual(data['post_time'].replace(tzinfo=None), expected['post_time'].replace(tzinfo=None))
+        self.assertEqual(clean_content(data['content']), clean_content(expected['content']))
+        self.assertEqual([(c['tag'], c['user_id']) for c in data['comments']],
+                         [(c['tag'], c['user_id']) for c in expected['comments']])
+        # 不存在的文章 (超出範圍)
+        self.assertIsNone(self.site.render(fake_ptt.make_article_path('Stock', 12)))
+
+
+@override_settings(FAKE_VECTOR_STORE_URL=None, FAKE_VECTOR_QUERY_DELAY=0)
+class FakeVectorStoreTests(TestCase):
+    TEXTS = ['台積電 法說會 營收 創新高', '輝達 財報 伺服器 需求', '央行 升息 殖利率']
+    METADATAS = [{'article_id': 1, 'board': 'Stock'}, {'article_id': 2, 'board': 'Stock'},
+                 {'article_id': 3, 'board': 'Finance'}]
+
+    def setUp(self):
+        patcher = mock.patch('article.fakes.ai._local_indexes', defaultdict(InMemoryIndex))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.embeddings = FakeEmbeddings(delay=0)
+
+    def add(self, store):
+        store.add_texts(self.TEXTS, metadatas=self.METADATAS, ids=['1-0', '2-0', '3-0'])
+
+    def search_ids(self, store, query, **kwargs):
+        return [document.metadata['article_id'] for document in store.similarity_search(query, **kwargs)]
+
+    def test_similarity_search_and_filters(self):
+        store = get_fake_vector_store(self.embeddings)
+        self.add(store)
+
+        results = store.similarity_search_with_score('台積電 營收', k=3)
+        self.assertEqual(results[0][0].metadata['article_id'], 1)
+        scores = [score for _, score in results]
+        self.assertEqual(scores, sorted(scores, reverse=True))
+        self.assertEqual(self.search_ids(store, '升息', k=3)[0], 3)
+
+        self.assertNotIn(3, self.search_ids(store, '升息', k=3, filter={'board': 'Stock'}))
+        self.assertEqual(self.search_ids(store, '升息', k=3, filter={'article_id': {'$in': [2]}}), [2])
+
+        # 相同 ID 覆蓋；依條件刪除
+        store.add_texts(['央行 降息'], metadatas=[self.METADATAS[2]], ids=['3-0'])
+        self.assertEqual(store.index.stats(), {'count': 3})
+        store.delete(filter={'board': {'$eq': 'Finance'}})
+        self.assertEqual(store.index.stats(), {'count': 2})
+
+    def test_namespaces_are_separate(self):
+        self.add(get_fake_vector_store(self.embeddings, 'new'))
+        self.assertEqual(self.search_ids(get_fake_vector_store(self.embeddings), '台積電'), [])
+        self.assertEqual(self.search_ids(get_fake_vector_store(self.embeddings, 'new'), '台積電', k=1), [1])
+
+    async def test_async_search_matches_sync(self):
+        store = get_fake_vector_store(self.embeddings)
+        self.add(store)
+        results = await store.asimilarity_search_with_score('輝達 財報', k=2)
+        self.assertEqual([(doc.page_content, score) for doc, score in results],
+                         [(doc.page_content, score) for doc, score in store.similarity_search_with_score('輝達 財報', k=2)])
+
+
+class FakeServicesTests(TestCase):
+    def setUp(self):
+        server = make_server('127.0.0.1', 0, site=fake_ptt.SyntheticPtt(pages=2, articles_per_page=2))
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        self.addCleanup(server.server_close)
+        self.addCleanup(server.shutdown)
+        self.url = f'http://127.0.0.1:{server.server_address[1]}'
+
+    def get(self, path):
+        with urllib.request.urlopen(self.url + path, timeout=5) as response:
+            return response.status, response.read().decode()
+
+    def test_serves_synthetic_ptt(self):
+        status, html = self.get('/bbs/Stock/index.html')
+        self.assertEqual((status, get_latest_page(html)), (200, 2))
+        status, html = self.get(fake_ptt.make_article_path('Stock', 1))
+        self.assertEqual(get_data_from_article_html(html)['title'], fake_ptt.make_article_data(1)['title'])
+        with self.assertRaises(urllib.error.HTTPError) as context:
+            self.get('/bbs/Stock/index9.html')
+        self.assertEqual(context.exception.code, 404)
+
+    def test_remote_index_shares_vectors_by_namespace(self):
+        embeddings = FakeEmbeddings(delay=0)
+        writer = FakeVectorStore(embeddings, RemoteIndex(self.url, 'new'), delay=0)
+        writer.add_texts(['台積電 法說會'], metadatas=[{'article_id': 1}], ids=['1-0'])
+
+        # 另一個 process (新的 RemoteIndex) 看得到同一份資料，其他 namespace 看不到
+        reader = FakeVectorStore(embeddings, RemoteIndex(self.url, 'new'), delay=0)
+        [(document, score)] = reader.similarity_search_with_score('台積電', k=1)
+        self.assertEqual(document.metadata, {'article_id': 1})
+        self.assertGreater(score, 0)
+        self.assertEqual(RemoteIndex(self.url).stats(), {'count': 0})
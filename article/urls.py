@@ -5,12 +5,30 @@ urlpatterns = [
     # 設定 /api/posts/ 對應到 ArticleListView
     path('posts/', views.ArticleListView.as_view(), name='article-list'),
 
+    # 關鍵字檢索 API
+    path('posts/search/', views.ArticleSearchView.as_view(), name='article-keyword-search'),
+
+    # 大量匯出 API (NDJSON 串流)
+    path('posts/export/', views.ArticleExportView.as_view(), name='article-export'),
+
     # 詳細內容 API
     path('posts/<int:pk>/', views.ArticleDetailView.as_view(), name='article-detail'),
     
     # 統計 API
     path('statistics/', views.ArticleStatisticsView.as_view(), name='article-statistics'),
 
+    # 看板討論摘要 API
+    path('digests/', views.BoardDigestView.as_view(), name='board-digests'),
+
+    # 快取命中率 API
+    path('cache/stats/', views.CacheStatisticsView.as_view(), name='cache-statistics'),
+
+    # 爬蟲排程統計 API
+    path('scrape/stats/', views.ScrapeStatisticsView.as_view(), name='scrape-statistics'),
+
     # 搜尋 API
     path('search/', views.SearchAPIView.as_view(), name='article-search'),
+
+    # 批次搜尋 API
+    path('search/batch/', views.SearchBatchAPIView.as_view(), name='article-search-batch'),
 ]
\ No newline at end of file
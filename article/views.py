@@ -3,14 +3,27 @@ import traceback
 
 from rest_framework import status, serializers
 from rest_framework.response import Response
-from rest_framework.views import APIView
-from rest_framework.pagination import LimitOffsetPagination
+from adrf.views import APIView
+from asgiref.sync import sync_to_async
+from django.http import StreamingHttpResponse
 from drf_spectacular.utils import extend_schema, OpenApiParameter, OpenApiResponse, inline_serializer
 
-from .models import Article
-from .serializers import ArticleSerializer, ArticleListRequestSerializer, QueryRequestSerializer
-from .rag_query import run_rag_query
+from .models import Article, BoardDigest
+from .serializers import (
+    ArticleSerializer, ArticleFilterRequestSerializer, ArticleListRequestSerializer, ArticleSearchRequestSerializer,
+    ArticleSearchResultSerializer, ArticleExportRequestSerializer, BoardDigestRequestSerializer, BoardDigestSerializer,
+    QueryRequestSerializer, BatchQueryRequestSerializer, BatchQueryResponseSerializer,
+)
+from .cache import cached_response, aget_cache_stats
+from .export import aiter_batches, to_ndjson
+from .pagination import AsyncLimitOffsetPagination
+from .search_index import search_articles
+from .singleflight import normalize_question, single_flight
 from log_app.models import Log
+from config.db_router import read_from_replica
+from config.metrics import timed
+from celery_app.locks import get_scrape_metrics
+from celery_app.scheduling import get_schedule_state
 
 # --- 提取出來的共用篩選邏輯 ---
 def articles_filter(article_list_request_serializer):
@@ -66,28 +79,121 @@ class ArticleListView(APIView):
                         'results': ArticleSerializer(many=True, read_only=True),
                     }
                 ),
-            )
+            ),
+            304: OpenApiResponse(description="資料未變更 (If-None-Match 與 ETag 相同)"),
         },
     )
-    def get(self, request):
+    @read_from_replica
+    async def get(self, request):
         # 1. 驗證參數
         request_serializer = ArticleListRequestSerializer(data=request.query_params)
         if not request_serializer.is_valid():
-            Log.objects.create(level='ERROR', category='user-posts', message='查詢參數不合法',
-                               traceback=traceback.format_exc())
+            await Log.objects.acreate(level='ERROR', category='user-posts', message='查詢參數不合法',
+                                      traceback=traceback.format_exc())
             return Response(request_serializer.errors, status=status.HTTP_400_BAD_REQUEST)
         
-        # 2. 使用共用函式進行篩選
+        async def compute():
+            # 2. 使用共用函式進行篩選
+            articles = articles_filter(request_serializer)
+
+            # 3. 分頁處理 (加上 order_by 確保排序穩定；推文先 prefetch，序列化時不再查詢資料庫)
+            paginator = AsyncLimitOffsetPagination()
+            paginated_queryset = await paginator.apaginate_queryset(
+                articles.order_by('-post_time').prefetch_related('comments'), request
+            )
+
+            # 4. 回傳結果
+            with timed('serialization'):
+                data = ArticleSerializer(paginated_queryset, many=True).data
+            return paginator.get_paginated_response(data)
+
+        # 分頁連結 (next/previous) 含有完整網址，因此 host 也納入快取鍵
+        params = {**request_serializer.validated_data, 'host': request.get_host()}
+        board_name = request_serializer.validated_data.get('board_name')
+        return await cached_response(request, 'article-list', params, compute, board=board_name)
+
+# --- 1-1. 文章關鍵字檢索 API ---
+class ArticleSearchView(APIView):
+    @extend_schema(
+        description="以關鍵字檢索文章標題與內文 (不經過 LLM)，依相關性排序，可搭配作者名稱、版面、時間範圍過濾與 limit、offset 分頁。",
+        parameters=[
+            OpenApiParameter("q", str, OpenApiParameter.QUERY, required=True, description="關鍵字"),
+            OpenApiParameter("limit", int, OpenApiParameter.QUERY, description="每頁返回的筆數 (預設 50)"),
+            OpenApiParameter("offset", int, OpenApiParameter.QUERY, description="從第幾筆開始 (預設 0)"),
+            OpenApiParameter("author_name", str, OpenApiParameter.QUERY, description="篩選特定發文者的文章"),
+            OpenApiParameter("board_name", str, OpenApiParameter.QUERY, description="篩選特定版面的文章"),
+            OpenApiParameter("start_date", str, OpenApiParameter.QUERY, description="篩選起始日期 (YYYY-MM-DD)"),
+            OpenApiParameter("end_date", str, OpenApiParameter.QUERY, description="篩選結束日期 (YYYY-MM-DD)"),
+        ],
+        responses={
+            200: OpenApiResponse(
+                response=inline_serializer(
+                    name='ArticleSearchResponse',
+                    fields={
+                        'count': serializers.IntegerField(read_only=True),
+                        'next': serializers.CharField(read_only=True),
+                        'previous': serializers.CharField(read_only=True),
+                        'results': ArticleSearchResultSerializer(many=True, read_only=True),
+                    }
+                ),
+            ),
+            304: OpenApiResponse(description="資料未變更 (If-None-Match 與 ETag 相同)"),
+        },
+    )
+    @read_from_replica
+    async def get(self, request):
+        request_serializer = ArticleSearchRequestSerializer(data=request.query_params)
+        if not request_serializer.is_valid():
+            await Log.objects.acreate(level='ERROR', category='user-posts-search', message='查詢參數不合法')
+            return Response(request_serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+        async def compute():
+            # 先套用作者、看板、日期篩選，再進行關鍵字檢索 (已依相關性排序)
+            articles = articles_filter(request_serializer)
+            articles = await sync_to_async(search_articles)(articles, request_serializer.validated_data['q'])
+
+            paginator = AsyncLimitOffsetPagination()
+            paginated_queryset = await paginator.apaginate_queryset(articles.prefetch_related('comments'), request)
+
+            with timed('serialization'):
+                data = ArticleSearchResultSerializer(paginated_queryset, many=True).data
+            return paginator.get_paginated_response(data)
+
+        params = {**request_serializer.validated_data, 'host': request.get_host()}
+        board_name = request_serializer.validated_data.get('board_name')
+        return await cached_response(request, 'article-search', params, compute, board=board_name)
+
+# --- 1-2. 文章大量匯出 API (NDJSON 串流) ---
+class ArticleExportView(APIView):
+    @extend_schema(
+        description="以 NDJSON 串流匯出符合條件的所有文章 (每行一篇，欄位與 /api/posts/ 相同，依 id 排序)，"
+                    "可使用作者名稱、版面、時間範圍進行過濾。資料量大時不需逐頁呼叫 /api/posts/，伺服器端記憶體用量固定。",
+        parameters=[
+            OpenApiParameter("author_name", str, OpenApiParameter.QUERY, description="篩選特定發文者的文章"),
+            OpenApiParameter("board_name", str, OpenApiParameter.QUERY, description="篩選特定版面的文章"),
+            OpenApiParameter("start_date", str, OpenApiParameter.QUERY, description="篩選起始日期 (YYYY-MM-DD)"),
+            OpenApiParameter("end_date", str, OpenApiParameter.QUERY, description="篩選結束日期 (YYYY-MM-DD)"),
+            OpenApiParameter("include_comments", bool, OpenApiParameter.QUERY, description="是否包含推文 (預設 true)"),
+        ],
+        responses={200: OpenApiResponse(description="application/x-ndjson，每行一篇文章 (格式同 ArticleSerializer)")},
+    )
+    async def get(self, request):
+        request_serializer = ArticleExportRequestSerializer(data=request.query_params)
+        if not request_serializer.is_valid():
+            await Log.objects.acreate(level='ERROR', category='user-export', message='查詢參數不合法')
+            return Response(request_serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
         articles = articles_filter(request_serializer)
-        
-        # 3. 分頁處理 (加上 order_by 確保排序穩定)
-        paginator = LimitOffsetPagination()
-        paginator.default_limit = 50
-        paginated_queryset = paginator.paginate_queryset(articles.order_by('-post_time'), request)
-        
-        # 4. 回傳結果
-        serializer = ArticleSerializer(paginated_queryset, many=True)
-        return paginator.get_paginated_response(serializer.data)
+        include_comments = request_serializer.validated_data['include_comments']
+
+        async def stream():
+            # 回應送出後才逐批查詢 (串流期間 view 已返回，由 fetch_batch 自行切換到 replica)
+            async for batch in aiter_batches(articles, include_comments=include_comments):
+                yield to_ndjson(batch)
+
+        response = StreamingHttpResponse(stream(), content_type='application/x-ndjson')
+        response['Content-Disposition'] = 'attachment; filename="articles.ndjson"'
+        return response
 
 # --- 2. 單篇文章詳情 API (新增) ---
 class ArticleDetailView(APIView):
@@ -95,24 +201,32 @@ class ArticleDetailView(APIView):
         description="根據文章 ID 取得特定文章的詳細內容。",
         responses={
             200: ArticleSerializer(),
+            304: OpenApiResponse(description="資料未變更 (If-None-Match 與 ETag 相同)"),
             404: OpenApiResponse(response={"type": "object", "properties": {"error": {"type": "string"}}})
         }
     )
-    def get(self, request, pk):
+    @read_from_replica
+    async def get(self, request, pk):
         # 防呆檢查
         if pk <= 0:
             error_msg = "文章ID須為正數"
-            Log.objects.create(level='ERROR', category='user-posts_id', message=error_msg)
+            await Log.objects.acreate(level='ERROR', category='user-posts_id', message=error_msg)
             return Response({"error": error_msg}, status=status.HTTP_400_BAD_REQUEST)
         
-        try:
-            article = Article.objects.get(id=pk)
-        except Article.DoesNotExist:
-            error_msg = "找不到文章，請輸入正確文章ID"
-            Log.objects.create(level='ERROR', category='user-posts_id', message=error_msg, traceback=traceback.format_exc())
-            return Response({"error": error_msg}, status=status.HTTP_404_NOT_FOUND)
-            
-        return Response(ArticleSerializer(article).data, status=status.HTTP_200_OK)
+        async def compute():
+            try:
+                article = await Article.objects.prefetch_related('comments').aget(id=pk)
+            except Article.DoesNotExist:
+                error_msg = "找不到文章，請輸入正確文章ID"
+                await Log.objects.acreate(level='ERROR', category='user-posts_id', message=error_msg, traceback=traceback.format_exc())
+                return Response({"error": error_msg}, status=status.HTTP_404_NOT_FOUND)
+
+            with timed('serialization'):
+                data = ArticleSerializer(article).data
+            return Response(data, status=status.HTTP_200_OK)
+
+        # 查詢前無法得知文章所屬看板，使用全站版本號
+        return await cached_response(request, 'article-detail', {'pk': pk}, compute)
 
 # --- 3. 文章統計 API (新增) ---
 class ArticleStatisticsView(APIView):
@@ -126,21 +240,86 @@ class ArticleStatisticsView(APIView):
         ],
         responses={
             200: OpenApiResponse(response={"type": "object", "properties": {"total_articles": {"type": "integer"}}}),
+            304: OpenApiResponse(description="資料未變更 (If-None-Match 與 ETag 相同)"),
             400: OpenApiResponse(response={"type": "object", "properties": {"error": {"type": "string"}}}),
         }
     )
-    def get(self, request):
-        request_serializer = ArticleListRequestSerializer(data=request.query_params)
+    @read_from_replica
+    async def get(self, request):
+        # 統計不分頁：只驗證篩選欄位，快取鍵不含 limit / offset，不同分頁參數共用同一份快取
+        request_serializer = ArticleFilterRequestSerializer(data=request.query_params)
         
         if not request_serializer.is_valid():
-            Log.objects.create(level='ERROR', category='user-posts-stats', message='查詢參數不合法')
+            await Log.objects.acreate(level='ERROR', category='user-posts-stats', message='查詢參數不合法')
             return Response(request_serializer.errors, status=status.HTTP_400_BAD_REQUEST)
             
-        # 複用篩選邏輯，但這次我們只需要 count()
-        articles = articles_filter(request_serializer)
-        total_articles = articles.count()
-        
-        return Response({"total_articles": total_articles})
+        async def compute():
+            # 複用篩選邏輯，但這次我們只需要 count()
+            articles = articles_filter(request_serializer)
+            total_articles = await articles.acount()
+
+            return Response({"total_articles": total_articles})
+
+        board_name = request_serializer.validated_data.get('board_name')
+        return await cached_response(request, 'article-statistics', request_serializer.validated_data, compute,
+                                     board=board_name)
+
+# --- 看板討論摘要 API ---
+class BoardDigestView(APIView):
+    @extend_schema(
+        description="取得看板最近幾個時段的討論摘要：熱門話題、代表文章 (推噓差最高)、推噓統計與 Gemini 整理的摘要。"
+                    "摘要於每次爬蟲、向量化後預先產生，直接從資料庫回傳，不需即時呼叫 Gemini。",
+        parameters=[
+            OpenApiParameter("board_name", str, OpenApiParameter.QUERY, required=True, description="看板名稱"),
+            OpenApiParameter("window_hours", int, OpenApiParameter.QUERY, description="時段長度 (小時，預設 24)"),
+            OpenApiParameter("limit", int, OpenApiParameter.QUERY, description="回傳最近幾個時段 (預設 1，最多 30)"),
+        ],
+        responses={200: BoardDigestSerializer(many=True)},
+    )
+    @read_from_replica
+    async def get(self, request):
+        request_serializer = BoardDigestRequestSerializer(data=request.query_params)
+        if not request_serializer.is_valid():
+            await Log.objects.acreate(level='ERROR', category='user-digests', message='查詢參數不合法')
+            return Response(request_serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+        # 摘要在爬蟲寫入資料 (快取失效) 之後才產生，因此不使用 API 快取；以唯一索引查詢，不需快取
+        validated_data = request_serializer.validated_data
+        digests = BoardDigest.objects.filter(
+            board=validated_data['board_name'], window_hours=validated_data['window_hours']
+        ).order_by('-window_start')[:validated_data['limit']]
+        digests = [digest async for digest in digests]
+
+        with timed('serialization'):
+            data = BoardDigestSerializer(digests, many=True).data
+        return Response(data, status=status.HTTP_200_OK)
+
+# --- 快取命中率 API ---
+class CacheStatisticsView(APIView):
+    @extend_schema(
+        description="取得文章列表、檢索、詳情與統計 API 的快取命中 (hit)、未命中 (miss)、304 (not_modified) 次數與命中率。",
+        responses={200: OpenApiResponse(response={"type": "object"})}
+    )
+    async def get(self, request):
+        return Response(await aget_cache_stats())
+    
+# --- 爬蟲排程統計 API ---
+class ScrapeStatisticsView(APIView):
+    @extend_schema(
+        description="取得各看板爬蟲任務的送出 (dispatched)、略過 (skipped_queued / skipped_running)、完成 (completed)、失敗 (failed) 次數，"
+                    "以及排程狀態 (schedule)：估計的每分鐘新文章數 (rate)、目前間隔 (interval)、下次爬取時間 (next_run)。",
+        responses={200: OpenApiResponse(response={"type": "object"})}
+    )
+    async def get(self, request):
+        return Response(await sync_to_async(self.get_statistics)())
+
+    @staticmethod
+    def get_statistics():
+        # 讀取 Redis 為同步呼叫，放到執行緒中執行，不阻塞 event loop
+        metrics = get_scrape_metrics()
+        for board, state in get_schedule_state().items():
+            metrics.setdefault(board, {})['schedule'] = state
+        return metrics
     
 # [新增] 搜尋 API View
 class SearchAPIView(APIView):
@@ -151,24 +330,62 @@ class SearchAPIView(APIView):
         request=QueryRequestSerializer,
         responses={200: QueryRequestSerializer}
     )
-    def post(self, request):
+    async def post(self, request):
         # 1. 驗證輸入參數
         serializer = QueryRequestSerializer(data=request.data)
         if not serializer.is_valid():
-            Log.objects.create(level='ERROR', category='user-search', message='查詢參數不合法')
+            await Log.objects.acreate(level='ERROR', category='user-search', message='查詢參數不合法')
             return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
         
         question = serializer.validated_data.get("question")
         top_k = serializer.validated_data.get("top_k")
         
-        # 2. 呼叫我們封裝好的 RAG 服務
-        result = run_rag_query(question, top_k)
-        
+        # 2. 呼叫我們封裝好的 RAG 服務 (非同步：等待 Gemini / Pinecone 時不佔用 worker)
+        # RAG 相關套件較大，第一次使用時才載入 (見 article/ai_clients.py)
+        from .rag_query import arun_rag_query
+
+        async def compute():
+            result = await arun_rag_query(question, top_k)
+            if "error" in result:
+                return result
+            # 使用 Serializer 進行輸出格式化 (合併的請求共用序列化後的結果)
+            with timed('serialization'):
+                return QueryRequestSerializer(instance=result).data
+
+        # 同時進行中的相同問題只執行一次 RAG，錯誤結果不分享給其他 worker
+        params = {'question': normalize_question(question), 'top_k': top_k}
+        data = await single_flight('rag-search', params, compute, should_share=lambda data: "error" not in data)
+
         # 3. 處理錯誤
+        if "error" in data:
+            return Response(data, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+        # 4. 回傳結果 (合併的請求問題寫法可能略有不同，回傳各自的原始問題)
+        return Response({**data, "question": question}, status=status.HTTP_200_OK)
+
+# 批次搜尋 API
+class SearchBatchAPIView(APIView):
+    @extend_schema(
+        methods=["POST"],
+        summary="AI 語意搜尋 (批次)",
+        description="一次送出多個問題 (最多 50 題)：問題以單次 batch embedding 轉向量、同時查詢 Pinecone、"
+                    "以單一 SQL 取出文章，再以有限併發數由 Gemini 生成回答。回傳每題的結果與各階段耗時。",
+        request=BatchQueryRequestSerializer,
+        responses={200: BatchQueryResponseSerializer}
+    )
+    async def post(self, request):
+        serializer = BatchQueryRequestSerializer(data=request.data)
+        if not serializer.is_valid():
+            await Log.objects.acreate(level='ERROR', category='user-search-batch', message='查詢參數不合法')
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+        from .rag_query import arun_rag_batch
+        result = await arun_rag_batch(serializer.validated_data["questions"], serializer.validated_data["top_k"])
+
+        # 整批失敗 (例如 Embedding 失敗) 才回 500；單題失敗會記錄在該題的 error 欄位
         if "error" in result:
             return Response(result, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
-            
-        # 4. 回傳結果
-        # 使用 Serializer 進行輸出格式化
-        response_serializer = QueryRequestSerializer(instance=result)
-        return Response(response_serializer.data, status=status.HTTP_200_OK)
\ No newline at end of file
+
+        with timed('serialization'):
+            data = BatchQueryResponseSerializer(instance=result).data
+        return Response(data, status=status.HTTP_200_OK)
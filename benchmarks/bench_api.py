@@ -0,0 +1,27 @@
+"""文章列表 API：篩選與序列化"""
+import pytest
+
+from article.serializers import ArticleListRequestSerializer, ArticleSerializer
+from article.views import articles_filter
+
+
+def render_list_page(params):
+    """與 ArticleListView 相同的查詢與序列化 (不含快取與分頁連結)"""
+    request_serializer = ArticleListRequestSerializer(data=params)
+    request_serializer.is_valid(raise_exception=True)
+    limit = request_serializer.validated_data['limit']
+    offset = request_serializer.validated_data.get('offset', 0)
+
+    articles = articles_filter(request_serializer).order_by('-post_time').prefetch_related('comments')
+    return ArticleSerializer(articles[offset:offset + limit], many=True).data
+
+
+@pytest.mark.benchmark(group='api')
+@pytest.mark.parametrize('params', [
+    {},
+    {'board_name': 'Stock', 'offset': 200},
+    {'board_name': 'Stock', 'start_date': '2024-01-15', 'end_date': '2024-01-15'},
+], ids=['latest', 'board-offset', 'board-date-range'])
+def test_article_list_page(benchmark, corpus, params):
+    data = benchmark(render_list_page, params)
+    assert len(data) == 50
@@ -0,0 +1,51 @@
+"""大量匯出：NDJSON / Parquet 的吞吐量 (rows/s 記錄在 extra_info)"""
+import io
+
+import pytest
+
+from article.export import write_ndjson, write_parquet
+from article.models import Article
+from benchmarks.corpus import populate
+
+ARTICLES = 2000
+
+
+@pytest.fixture(scope='module')
+def export_corpus(django_db_setup, django_db_blocker):
+    """2000 篇文章、每篇 30 則推文 (建立較久，整個模組共用一份)"""
+    with django_db_blocker.unblock():
+        populate('Stock', articles=ARTICLES, comments=30)
+    yield
+    with django_db_blocker.unblock():
+        Article.objects.all().delete()
+
+
+def record_throughput(benchmark, rows):
+    if benchmark.stats:
+        benchmark.extra_info['rows_per_sec'] = round(rows / benchmark.stats.stats.mean)
+
+
+@pytest.mark.django_db
+@pytest.mark.benchmark(group='export')
+@pytest.mark.parametrize('batch_size', [200, 1000])
+def test_export_ndjson(benchmark, export_corpus, batch_size):
+    rows = benchmark(write_ndjson, io.BytesIO(), batch_size=batch_size)
+    assert rows == ARTICLES
+    record_throughput(benchmark, rows)
+
+
+@pytest.mark.django_db
+@pytest.mark.benchmark(group='export')
+def test_export_ndjson_without_comments(benchmark, export_corpus):
+    rows = benchmark(write_ndjson, io.BytesIO(), include_comments=False)
+    assert rows == ARTICLES
+    record_throughput(benchmark, rows)
+
+
+@pytest.mark.django_db
+@pytest.mark.benchmark(group='export')
+def test_export_parquet(benchmark, export_corpus, tmp_path):
+    pytest.importorskip('pyarrow')
+    rows = benchmark(write_parquet, tmp_path / 'articles.parquet')
+    assert rows == ARTICLES
+    record_throughput(benchmark, rows)
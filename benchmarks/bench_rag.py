@@ -0,0 +1,65 @@
+"""RAG：以替身取代 embedding / Pinecone / Gemini，量測文章查詢與 prompt 組合"""
+import asyncio
+from unittest import mock
+
+import pytest
+
+from django.core.cache import cache
+
+from article import rag_query
+from article.singleflight import normalize_question, single_flight
+from benchmarks.stubs import StubVectorStore, make_chat_model
+
+
+@pytest.fixture
+def stub_clients(corpus):
+    vector_store = StubVectorStore(corpus[::7])
+    with mock.patch.object(rag_query, 'get_vector_store', return_value=vector_store), \
+            mock.patch.object(rag_query, 'get_chat_model', side_effect=make_chat_model):
+        yield vector_store
+
+
+@pytest.mark.benchmark(group='rag')
+@pytest.mark.parametrize('top_k', [3, 10])
+def test_run_rag_query(benchmark, stub_clients, top_k):
+    result = benchmark(rag_query.run_rag_query, '最近大家對台積電的看法如何？', top_k)
+    assert len(result['related_articles']) == top_k
+
+
+@pytest.mark.benchmark(group='rag')
+def test_run_rag_batch(benchmark, stub_clients):
+    questions = [f'{word}的討論' for word in ('台積電', '輝達', 'ETF', '升息', '散熱')]
+    result = benchmark(rag_query.async_to_sync(rag_query.arun_rag_batch), questions, 5)
+    assert all(item['answer'] for item in result['results'])
+
+
+@pytest.mark.benchmark(group='rag')
+def test_build_merge_text(benchmark, stub_clients):
+    articles = rag_query.run_rag_query('台積電', 10)['related_articles']
+    merge_text = benchmark(rag_query.build_merge_text, articles)
+    assert merge_text.count('標題:') == 10
+
+
+@pytest.mark.benchmark(group='rag')
+def test_single_flight_burst(benchmark, stub_clients):
+    """20 個同時送出的相同問題 (空白與標點不同) 只執行一次 RAG"""
+    calls = []
+
+    async def compute():
+        calls.append(1)
+        return await rag_query.arun_rag_query('台積電法說會', 5)
+
+    async def burst():
+        # 清掉上一輪留在快取的結果，每輪都實際計算一次
+        await cache.aclear()
+        calls.clear()
+        questions = [f"台積電法說會{'？' if i % 2 else ' ?'}" for i in range(20)]
+        results = await asyncio.gather(*[
+            single_flight('rag-search', {'question': normalize_question(question), 'top_k': 5}, compute)
+            for question in questions
+        ])
+        assert len(calls) == 1
+        return results
+
+    results = benchmark(rag_query.async_to_sync(burst))
+    assert len(results) == 20 and all(result is results[0] for result in results)
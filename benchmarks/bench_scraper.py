@@ -0,0 +1,77 @@
+"""爬蟲：HTML 解析與資料庫寫入"""
+from datetime import timedelta
+from unittest import mock
+
+import fakeredis
+import pytest
+from django.utils import timezone
+
+from article import scraper
+from article.models import Article
+from benchmarks.corpus import FakePtt, make_article_data, make_article_url, render_article_html
+
+
+@pytest.mark.benchmark(group='parse')
+def test_get_urls_from_board_html(benchmark, board_html):
+    urls = benchmark(scraper.get_urls_from_board_html, board_html)
+    assert len(urls) == 18
+
+
+@pytest.mark.benchmark(group='parse')
+def test_get_data_from_article_html(benchmark, article_html):
+    data = benchmark(scraper.get_data_from_article_html, article_html)
+    assert len(data['comments']) == 180
+
+
+@pytest.mark.benchmark(group='parse')
+@pytest.mark.parametrize('comments', [0, 1000])
+def test_get_data_from_synthetic_article_html(benchmark, comments):
+    html = render_article_html('Stock', make_article_data(0, comments=comments, paragraphs=100))
+    data = benchmark(scraper.get_data_from_article_html, html)
+    assert len(data['comments']) == comments
+
+
+@pytest.fixture
+def fake_ptt():
+    """ptt_scrape 改從合成的看板 (20 篇、每篇 100 則推文) 取得 HTML，並移除禮貌性延遲；文章鎖改用 fakeredis"""
+    site = FakePtt('Stock', articles=20, comments=100)
+    with mock.patch.object(scraper, 'get_html', site.get_html), mock.patch.object(scraper.time, 'sleep'), \
+            mock.patch('celery_app.locks.redis_client', fakeredis.FakeRedis()):
+        yield site
+
+
+@pytest.mark.benchmark(group='persist')
+def test_ptt_scrape_new_articles(benchmark, db, fake_ptt):
+    """首頁 20 篇都是新文章：文章、推文與全文檢索索引的寫入"""
+    def reset():
+        Article.objects.all().delete()
+
+    result = benchmark.pedantic(scraper.ptt_scrape, args=('Stock',), setup=reset, rounds=10)
+    assert len(result) == 20
+
+
+@pytest.mark.benchmark(group='persist')
+def test_ptt_scrape_refresh_articles(benchmark, db, fake_ptt):
+    """首頁 20 篇都已存在且到期：只新增推文的更新路徑"""
+    scraper.ptt_scrape('Stock')
+
+    def make_due():
+        # 每篇刪掉最後 10 則推文，模擬兩次抓取之間有新推文
+        for article in Article.objects.all():
+            article.comments.filter(id__in=article.comments.order_by('-id').values('id')[:10]).delete()
+        Article.objects.update(next_refresh_at=timezone.now() - timedelta(minutes=1))
+
+    result = benchmark.pedantic(scraper.ptt_scrape, args=('Stock',), setup=make_due, rounds=10)
+    assert result == []
+
+
+@pytest.mark.benchmark(group='persist')
+def test_bulk_save_new_articles(benchmark, db):
+    """歷史資料回補的批次寫入路徑 (20 篇、每篇 100 則推文)"""
+    items = [(make_article_url('Stock', i), make_article_data(i, comments=100)) for i in range(20)]
+
+    def reset():
+        Article.objects.all().delete()
+
+    ids = benchmark.pedantic(scraper.bulk_save_new_articles, args=('Stock', items), setup=reset, rounds=10)
+    assert len(ids) == 20
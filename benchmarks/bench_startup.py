@@ -0,0 +1,70 @@
+"""
+啟動時間預算：以 python -X importtime 量測 Django 與 Celery worker 啟動時載入的模組
+- 不使用 AI 功能的 process 不應載入 Gemini / Pinecone / LangChain (見 article/ai_clients.py)
+- 總 import 時間不超過預算 (秒，可用 STARTUP_IMPORT_BUDGET 調整，CI 機器較慢時放寬)
+每個情境在獨立的 subprocess 執行，不受測試 process 已載入的模組影響
+"""
+import os
+import re
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest
+
+ROOT_DIR = Path(__file__).resolve().parent.parent
+
+IMPORT_BUDGET = float(os.getenv('STARTUP_IMPORT_BUDGET', 1.5))
+
+# 延遲載入的 AI 相關套件
+LAZY_MODULES = (
+    'langchain_google_genai', 'langchain_pinecone', 'pinecone', 'langchain_text_splitters',
+    'langchain_core.prompts', 'article.rag_query', 'article.ai_clients',
+)
+
+SCENARIOS = {
+    # manage.py migrate / runserver 等指令與 admin、列表 API
+    'django': "import django; django.setup(); import config.urls",
+    # 爬蟲 worker：載入所有任務模組 (celery -A config worker 啟動時的行為)
+    'celery-worker': (
+        "import django; django.setup(); from config.celery import app; app.loader.import_default_modules()"
+    ),
+}
+
+IMPORTTIME_RE = re.compile(r'^import time:\s+\d+ \|\s+(\d+) \|( +)(\S+)$')
+
+
+def measure_imports(code):
+    """回傳 {模組名稱: 累計微秒} 與最上層 import 的總秒數"""
+    env = {**os.environ, 'DJANGO_SETTINGS_MODULE': 'benchmarks.settings', 'PYTHONPATH': str(ROOT_DIR)}
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', code],
+        cwd=ROOT_DIR, env=env, capture_output=True, text=True, check=True,
+    )
+    modules, total = {}, 0
+    for line in result.stderr.splitlines():
+        match = IMPORTTIME_RE.match(line)
+        if not match:
+            continue
+        cumulative, indent, name = int(match.group(1)), match.group(2), match.group(3)
+        modules[name] = cumulative
+        if len(indent) == 1:
+            total += cumulative
+    return modules, total / 1_000_000
+
+
+@pytest.mark.parametrize('scenario', SCENARIOS)
+def test_startup_skips_ai_stack(scenario):
+    modules, _ = measure_imports(SCENARIOS[scenario])
+    loaded = [name for name in LAZY_MODULES if name in modules]
+    assert not loaded, f"{scenario} imports {loaded} at startup"
+
+
+@pytest.mark.parametrize('scenario', SCENARIOS)
+def test_startup_import_budget(scenario):
+    modules, total = measure_imports(SCENARIOS[scenario])
+    slowest = sorted(modules.items(), key=lambda item: -item[1])[:5]
+    assert total <= IMPORT_BUDGET, (
+        f"{scenario} import time {total:.2f}s exceeds {IMPORT_BUDGET}s; slowest: "
+        + ', '.join(f"{name} {us / 1000:.0f}ms" for name, us in slowest)
+    )
@@ -0,0 +1,27 @@
+from pathlib import Path
+
+import pytest
+
+from benchmarks.corpus import populate
+
+FIXTURES_DIR = Path(__file__).parent / 'fixtures'
+
+
+@pytest.fixture(scope='session')
+def board_html():
+    """實際的 PTT Stock 板列表頁 (含已刪除的文章)"""
+    return (FIXTURES_DIR / 'board_index.html').read_text(encoding='utf-8')
+
+
+@pytest.fixture(scope='session')
+def article_html():
+    """實際的 PTT 文章頁 (約 180 則推文)"""
+    return (FIXTURES_DIR / 'article.html').read_text(encoding='utf-8')
+
+
+@pytest.fixture
+def corpus(db):
+    """資料庫內的合成文章 (Stock 500 篇、Gossiping 100 篇，每篇 30 則推文)，回傳 Stock 的文章 ID"""
+    ids = populate('Stock', articles=500, comments=30)
+    populate('Gossiping', articles=100, comments=30, start=500)
+    return ids
@@ -0,0 +1,37 @@
+"""
+合成語料產生器：產生任意數量的文章資料、PTT 格式的 HTML 與資料庫內的文章，供 benchmark 調整資料規模
+頁面與文章內容沿用離線替身服務的合成 PTT (article/fakes/ptt.py)
+"""
+from datetime import timedelta
+
+from article.fakes.ptt import (  # noqa: F401
+    SyntheticPtt, make_article_data, make_article_path, render_article_html, render_board_html,
+)
+from article.scraper import PTT_BASE_URL, bulk_save_new_articles
+
+
+def make_article_url(board, index):
+    return PTT_BASE_URL + make_article_path(board, index)
+
+
+class FakePtt:
+    """以合成的單頁看板取代 scraper.get_html (不經過網路)"""
+
+    def __init__(self, board, articles=20, comments=50):
+        self.board = board
+        self.site = SyntheticPtt(pages=1, articles_per_page=articles, comments=comments)
+
+    def get_html(self, url):
+        return self.site.render(url.removeprefix(PTT_BASE_URL))
+
+
+def populate(board='Stock', articles=500, comments=30, start=0, batch_size=200):
+    """以批次寫入建立文章、推文與全文檢索索引，回傳文章 ID"""
+    ids = []
+    for offset in range(0, articles, batch_size):
+        items = [
+            (make_article_url(board, start + i), make_article_data(start + i, comments=comments))
+            for i in range(offset, min(offset + batch_size, articles))
+        ]
+        ids.extend(bulk_save_new_articles(board, items, now=items[-1][1]['post_time'] + timedelta(days=30)))
+    return ids
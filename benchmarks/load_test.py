@@ -0,0 +1,93 @@
+"""
+簡易壓力測試：以固定併發數對 API 發送請求，比較不同部署方式 (例如 WSGI runserver 與 ASGI uvicorn) 的吞吐量
+
+範例：
+    # 同步 (WSGI) 與非同步 (ASGI) 各啟動一份
+    python manage.py runserver 0.0.0.0:8001
+    uvicorn config.asgi:application --port 8000 --workers 2
+
+    python benchmarks/load_test.py \
+        --base-url http://127.0.0.1:8001 --base-url http://127.0.0.1:8000 \
+        --path /api/search/ --method POST --data '{"question": "最近大家對輝達的看法如何？", "top_k": 3}' \
+        --requests 200 --concurrency 20
+"""
+import argparse
+import json
+import statistics
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+
+def send_request(url, method, body, timeout):
+    request = urllib.request.Request(url, data=body, method=method, headers={'Content-Type': 'application/json'})
+    start = time.perf_counter()
+    try:
+        with urllib.request.urlopen(request, timeout=timeout) as response:
+            response.read()
+            ok = 200 <= response.status < 400
+    except (urllib.error.URLError, TimeoutError):
+        ok = False
+    return ok, time.perf_counter() - start
+
+
+def percentile(values, p):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    index = min(len(values) - 1, int(round(p / 100 * (len(values) - 1))))
+    return values[index]
+
+
+def run(base_url, args):
+    url = base_url.rstrip('/') + args.path
+    body = args.data.encode('utf-8') if args.data else None
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as executor:
+        results = list(executor.map(
+            lambda _: send_request(url, args.method, body, args.timeout), range(args.requests)
+        ))
+    elapsed = time.perf_counter() - started
+
+    latencies = [latency for ok, latency in results if ok]
+    return {
+        'base_url': base_url,
+        'requests': args.requests,
+        'errors': sum(1 for ok, _ in results if not ok),
+        'elapsed_s': round(elapsed, 2),
+        'rps': round(len(latencies) / elapsed, 2) if elapsed else 0.0,
+        'p50_ms': round(percentile(latencies, 50) * 1000, 1),
+        'p95_ms': round(percentile(latencies, 95) * 1000, 1),
+        'p99_ms': round(percentile(latencies, 99) * 1000, 1),
+        'mean_ms': round(statistics.mean(latencies) * 1000, 1) if latencies else 0.0,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="API 併發壓力測試")
+    parser.add_argument('--base-url', action='append', required=True, help="可重複指定，依序測試並比較")
+    parser.add_argument('--path', default='/api/posts/')
+    parser.add_argument('--method', default='GET')
+    parser.add_argument('--data', help="POST 的 JSON 內容")
+    parser.add_argument('--requests', type=int, default=200)
+    parser.add_argument('--concurrency', type=int, default=20)
+    parser.add_argument('--timeout', type=float, default=60)
+    parser.add_argument('--json', action='store_true', help="以 JSON 輸出結果")
+    args = parser.parse_args()
+
+    reports = [run(base_url, args) for base_url in args.base_url]
+
+    if args.json:
+        print(json.dumps(reports, indent=2))
+        return
+
+    columns = ['base_url', 'requests', 'errors', 'elapsed_s', 'rps', 'p50_ms', 'p95_ms', 'p99_ms', 'mean_ms']
+    print(' | '.join(columns))
+    for report in reports:
+        print(' | '.join(str(report[column]) for column in columns))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,24 @@
+"""
+Benchmark 與測試 (各 app 的 tests.py) 用設定：沿用專案設定，改用 SQLite 與本機記憶體快取，
+不需要 MariaDB / Redis / 外部 API (需要 Redis 的測試以 fakeredis 取代)
+"""
+import os
+
+# ai_clients 在 import 時會讀取環境變數，benchmark 不會真的呼叫外部 API
+for key in ('GOOGLE_API_KEY', 'PINECONE_API_KEY', 'PINECONE_INDEX_NAME'):
+    os.environ.setdefault(key, 'benchmark')
+
+from config.settings import *  # noqa: E402,F401,F403
+
+DATABASES = {
+    'default': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': ':memory:',
+    }
+}
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    }
+}
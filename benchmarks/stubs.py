@@ -0,0 +1,40 @@
+"""
+RAG 外部服務的替身 (embedding / Pinecone / Gemini)：固定回傳結果且不經過網路，
+benchmark 只量測本專案自己的程式 (文章查詢與 prompt 組合)
+"""
+from langchain_core.documents import Document
+from langchain_core.language_models.fake_chat_models import FakeListChatModel
+
+EMBEDDING_DIMENSION = 768
+
+
+class StubEmbeddings:
+    async def aembed_documents(self, texts, **kwargs):
+        return [[0.0] * EMBEDDING_DIMENSION for _ in texts]
+
+    async def aembed_query(self, text, **kwargs):
+        return [0.0] * EMBEDDING_DIMENSION
+
+
+class StubVectorStore:
+    """依序回傳指定的文章 ID 作為相似度搜尋結果"""
+
+    def __init__(self, article_ids):
+        self.article_ids = article_ids
+        self.embeddings = StubEmbeddings()
+
+    def _results(self, k):
+        return [
+            (Document(page_content='', metadata={'article_id': article_id}), 0.9)
+            for article_id in self.article_ids[:k]
+        ]
+
+    async def asimilarity_search_with_score(self, query, k=4, **kwargs):
+        return self._results(k)
+
+    async def asimilarity_search_by_vector_with_score(self, embedding, k=4, **kwargs):
+        return self._results(k)
+
+
+def make_chat_model():
+    return FakeListChatModel(responses=['根據文章內容，多數討論偏多。'])
@@ -0,0 +1,263 @@
+# celery_app/backfill.py
+"""
+歷史資料回補：依頁碼或日期範圍往回爬取看板的列表頁
+- 頁碼範圍切成多個連續的分片 (shard)，各分片可平行執行 (本機執行緒或 Celery 任務)
+- 每處理完一頁就把進度寫入 Redis (checkpoint)，中斷後以相同參數重新執行即可從斷點繼續
+  (工作以使用者指定的參數識別，未指定結束頁時的「最新一頁」在建立工作時決定並存入工作，不會因看板新增頁面而變成新工作)
+- 新文章走批次寫入 (bulk_save_new_articles)，累積到 PTT_BACKFILL_EMBED_BATCH 篇才送出一次向量化任務
+- 已存在的文章直接略過 (後續更新由熱門文章追蹤處理)
+- 不回補最新一頁：最新一頁由爬蟲任務處理，兩者不會同時新增同一篇文章
+"""
+import time
+import traceback
+from datetime import datetime
+from zoneinfo import ZoneInfo
+
+from django.conf import settings
+
+from article.models import Article
+from article.scraper import (
+    get_html, get_board_index_url, get_latest_page, get_urls_from_board_html,
+    get_article_timestamp, fetch_article, bulk_save_new_articles,
+)
+from article.cache import bump_data_version
+from celery_app.locks import redis_client, release_lock
+from log_app.models import Log
+
+JOB_KEY = 'ptt:backfill:{job_id}'
+PENDING_KEY = 'ptt:backfill:{job_id}:pending'
+# 同一工作的多個分片同時送出待向量化文章時，一次只由一個分片處理
+FLUSH_LOCK_KEY = 'ptt:backfill:{job_id}:flush'
+FLUSH_LOCK_TIMEOUT = 60
+
+
+def make_job_id(board: str, start_page=None, end_page=None, shards: int = None, since=None, until=None) -> str:
+    """
+    相同的參數對應到相同的工作，重新執行時會接續之前的進度
+    以使用者指定的參數 (而非推算出的頁碼範圍) 識別：未指定結束頁時，最新一頁會隨時間改變
+    """
+    return f"{board}:{start_page or ''}-{end_page or 'latest'}:{shards}:{since or ''}-{until or ''}"
+
+
+# ---------------------------------------------------------
+# 日期範圍 -> 頁碼範圍
+# ---------------------------------------------------------
+
+def get_page_timestamps(board: str, page: int) -> list:
+    urls = get_urls_from_board_html(get_html(get_board_index_url(board, page)))
+    return [ts for ts in map(get_article_timestamp, urls) if ts]
+
+
+def find_first_page(board: str, timestamp: int, low: int, high: int) -> int:
+    """
+    二分搜尋第一個含有發文時間 >= timestamp 文章的頁碼
+    列表頁依發文時間排序；整頁文章都被刪除的頁面視為較舊的頁面
+    """
+    while low < high:
+        middle = (low + high) // 2
+        timestamps = get_page_timestamps(board, middle)
+        if timestamps and max(timestamps) >= timestamp:
+            high = middle
+        else:
+            low = middle + 1
+        time.sleep(0.5) # 禮貌性延遲
+    return low
+
+
+def resolve_page_range(board: str, start_page=None, end_page=None, since=None, until=None) -> tuple:
+    """
+    決定要回補的頁碼範圍 (含頭尾)
+    since / until 為 Unix timestamp，優先於 start_page / end_page；未指定結束頁時到最新一頁的前一頁為止
+    (最新一頁由爬蟲任務處理，不與爬蟲同時寫入)
+    """
+    last_page = get_latest_page(get_html(get_board_index_url(board))) - 1
+    start_page = start_page or 1
+    end_page = min(end_page or last_page, last_page)
+
+    if since:
+        start_page = find_first_page(board, since, start_page, end_page)
+    if until:
+        # 第一個含有 until 之後文章的頁面仍可能有範圍內的文章，因此包含該頁
+        end_page = find_first_page(board, until, start_page, end_page)
+    return start_page, end_page
+
+
+# ---------------------------------------------------------
+# 工作與進度 (checkpoint)
+# ---------------------------------------------------------
+
+def create_job(board: str, start_page=None, end_page=None, shards: int = None, since=None, until=None,
+               restart=False) -> str:
+    """
+    建立回補工作：決定頁碼範圍 (見 resolve_page_range) 並切分，範圍存入工作
+    工作已存在時保留原本的進度與頁碼範圍 (restart=True 則重新開始)
+    """
+    shards = shards or settings.PTT_BACKFILL_SHARDS
+    job_id = make_job_id(board, start_page, end_page, shards, since, until)
+    key = JOB_KEY.format(job_id=job_id)
+
+    if restart:
+        redis_client.delete(key, PENDING_KEY.format(job_id=job_id))
+    if redis_client.exists(key):
+        return job_id
+
+    start_page, end_page = resolve_page_range(board, start_page, end_page, since, until)
+    total_pages = end_page - start_page + 1
+    shards = max(min(shards, total_pages), 1)
+    values = {
+        'board': board,
+        'since': since or 0,
+        'until': until or 0,
+        'shards': shards,
+        'start_page': start_page,
+        'end_page': end_page,
+    }
+    for shard in range(shards):
+        shard_start = start_page + total_pages * shard // shards
+        shard_end = start_page + total_pages * (shard + 1) // shards - 1
+        values.update({
+            f'{shard}:next': shard_start,
+            f'{shard}:start': shard_start,
+            f'{shard}:end': shard_end,
+            f'{shard}:articles': 0,
+            f'{shard}:seconds': 0,
+        })
+    redis_client.hset(key, mapping=values)
+    return job_id
+
+
+def load_job(job_id: str) -> dict:
+    raw = redis_client.hgetall(JOB_KEY.format(job_id=job_id))
+    if not raw:
+        raise KeyError(f"Backfill job not found: {job_id}")
+    job = {key.decode(): value.decode() for key, value in raw.items()}
+    return {key: (value if key == 'board' else float(value) if key.endswith(':seconds') else int(value))
+            for key, value in job.items()}
+
+
+def checkpoint(job_id: str, shard: int, page: int, article_ids: list, seconds: float):
+    """記錄已完成的頁面；本頁的新文章 ID 一併寫入待向量化清單，確保中斷後不會漏掉"""
+    key = JOB_KEY.format(job_id=job_id)
+    pipe = redis_client.pipeline()
+    pipe.hset(key, f'{shard}:next', page + 1)
+    pipe.hincrby(key, f'{shard}:articles', len(article_ids))
+    pipe.hincrbyfloat(key, f'{shard}:seconds', seconds)
+    if article_ids:
+        pipe.rpush(PENDING_KEY.format(job_id=job_id), *article_ids)
+    pipe.execute()
+
+
+def flush_pending(job_id: str, embed, min_size: int = 1) -> int:
+    """
+    待向量化的文章達到 min_size 篇時送出一次向量化任務，回傳送出的篇數
+    送出成功後才從清單移除，embed 失敗時文章 ID 保留到下次再送
+    """
+    pending_key = PENDING_KEY.format(job_id=job_id)
+    if redis_client.llen(pending_key) < min_size:
+        return 0
+
+    lock = redis_client.lock(FLUSH_LOCK_KEY.format(job_id=job_id), timeout=FLUSH_LOCK_TIMEOUT,
+                             blocking_timeout=FLUSH_LOCK_TIMEOUT)
+    if not lock.acquire():
+        return 0
+    try:
+        article_ids = [int(article_id) for article_id in redis_client.lrange(pending_key, 0, -1)]
+        if article_ids and embed:
+            embed(article_ids)
+        # 只移除已送出的部分 (送出期間其他分片新增的文章 ID 接在清單後面)
+        redis_client.ltrim(pending_key, len(article_ids), -1)
+    finally:
+        release_lock(lock)
+    return len(article_ids)
+
+
+# ---------------------------------------------------------
+# 執行分片
+# ---------------------------------------------------------
+
+def backfill_page(board: str, page: int, since=None, until=None) -> list:
+    """回補單一列表頁，回傳新增的文章 ID"""
+    article_urls = get_urls_from_board_html(get_html(get_board_index_url(board, page)))
+    if since or until:
+        article_urls = [
+            url for url in article_urls
+            if (timestamp := get_article_timestamp(url)) is None
+            or ((not since or timestamp >= since) and (not until or timestamp < until))
+        ]
+
+    existing_urls = set(Article.objects.filter(url__in=article_urls).values_list('url', flat=True))
+    items = []
+    for article_url in article_urls:
+        if article_url in existing_urls:
+            continue
+        article_data = fetch_article(article_url)
+        if not article_data:
+            print(f"[WARN] Failed to parse or format incorrect: {article_url}")
+            continue
+        items.append((article_url, article_data))
+
+    return bulk_save_new_articles(board, items)
+
+
+def run_shard(job_id: str, shard: int, embed=None, max_pages: int = None) -> bool:
+    """
+    從 checkpoint 繼續執行分片，最多處理 max_pages 頁 (None 代表做到完成)
+    embed: 接收文章 ID 列表的函式，負責送出向量化任務
+    回傳: 分片是否已完成
+    """
+    job = load_job(job_id)
+    board = job['board']
+    page, end_page = job[f'{shard}:next'], job[f'{shard}:end']
+    processed = 0
+
+    while page <= end_page and (max_pages is None or processed < max_pages):
+        started = time.monotonic()
+        try:
+            article_ids = backfill_page(board, page, job['since'], job['until'])
+        except Exception as e:
+            # 保留 checkpoint，下次從這一頁重新開始
+            Log.objects.create(level='ERROR', category=f'backfill-{board}',
+                               message=f'Backfill {board} page {page} failed: {e}', traceback=traceback.format_exc())
+            raise
+
+        checkpoint(job_id, shard, page, article_ids, time.monotonic() - started)
+        if article_ids:
+            bump_data_version(board)
+        flush_pending(job_id, embed, min_size=settings.PTT_BACKFILL_EMBED_BATCH)
+        page += 1
+        processed += 1
+
+    done = page > end_page
+    if done:
+        flush_pending(job_id, embed)
+    return done
+
+
+def get_job_report(job_id: str) -> dict:
+    """回補進度與吞吐量 (articles/min)；各分片平行執行，整體吞吐量為各分片的加總"""
+    job = load_job(job_id)
+    tz = ZoneInfo(settings.CELERY_TIMEZONE)
+    shards = []
+    for shard in range(job['shards']):
+        total_pages = job[f'{shard}:end'] - job[f'{shard}:start'] + 1
+        done_pages = job[f'{shard}:next'] - job[f'{shard}:start']
+        articles, seconds = job[f'{shard}:articles'], job[f'{shard}:seconds']
+        shards.append({
+            'shard': shard,
+            'pages': f"{done_pages}/{total_pages}",
+            'done': done_pages >= total_pages,
+            'articles': articles,
+            'articles_per_min': round(articles / seconds * 60, 1) if seconds else 0.0,
+        })
+
+    return {
+        'job_id': job_id,
+        'board': job['board'],
+        'pages': f"{job['start_page']}-{job['end_page']}",
+        'since': datetime.fromtimestamp(job['since'], tz).isoformat() if job['since'] else None,
+        'until': datetime.fromtimestamp(job['until'], tz).isoformat() if job['until'] else None,
+        'done': all(shard['done'] for shard in shards),
+        'articles': sum(shard['articles'] for shard in shards),
+        'articles_per_min': round(sum(shard['articles_per_min'] for shard in shards), 1),
+        'shards': shards,
+    }
@@ -3,20 +3,14 @@
 import time
 import random
 from math import ceil
-from langchain_text_splitters import RecursiveCharacterTextSplitter
-from pinecone import Pinecone
-from langchain_pinecone import PineconeVectorStore
-from langchain_google_genai import GoogleGenerativeAIEmbeddings
-from pydantic import SecretStr
-from langchain_core.documents import Document
-from env_settings import EnvSettings
 from article.models import Article
+from article.dedup import assign_duplicates
+from article.chunking import get_splitter
+from config.metrics import timed, observe_stage, RETRIES, DUPLICATE_ARTICLES
 
 # 引入 Celery app
 from config.celery import app
 
-env_settings = EnvSettings()
-
 BATCH_SIZE = 50
 MAX_RETRIES = 5
 BASE_DELAY = 2
@@ -31,6 +25,7 @@ def retry_with_backoff(func, *args, **kwargs):
         except Exception as e:
             error_msg = str(e)
             if "ResourceExhausted" in error_msg or "429" in error_msg or "503" in error_msg:
+                RETRIES.labels('embedding_upsert').inc()
                 delay = BASE_DELAY * (2 ** attempt) + random.uniform(0, 1)
                 print(f"[API Retry] Attempt {attempt+1}/{MAX_RETRIES} failed. Retrying in {delay:.2f}s...")
                 time.sleep(delay)
@@ -38,10 +33,39 @@ def retry_with_backoff(func, *args, **kwargs):
                 raise e
     raise RuntimeError("Max retries reached for embedding request")
 
+def build_documents(articles, split_text) -> tuple:
+    """
+    將文章切塊並轉成 Document，回傳 (documents, ids)
+    片段 ID 為「文章 ID-片段序號」，重複向量化同一篇文章 (重試、重新向量化) 時覆蓋而不是新增
+    """
+    from langchain_core.documents import Document
+
+    documents, ids = [], []
+    with timed('chunking'):
+        for article in articles:
+            # 切割文章內容
+            chunks = split_text(article.content)
+            for i, chunk in enumerate(chunks):
+                documents.append(Document(
+                    page_content=chunk,
+                    metadata={
+                        "article_id": article.id,
+                        "board": article.board,
+                        "title": article.title,
+                        "author": article.author,
+                        "post_time": str(article.post_time),
+                        "url": article.url,
+                        "chunk_index": i
+                    }
+                ))
+                ids.append(f"{article.id}-{i}")
+    return documents, ids
+
 @app.task
 def store_data_in_pinecone(article_id_list: list):
     """
     Celery 任務：將指定的文章 ID 列表進行向量化並存入 Pinecone
+    內文修改過的既有文章 (minhash 已清除) 也由這裡重新比對近似重複，仍為代表文章時以新內容覆蓋向量
     """
     
     # 如果沒有新文章，直接結束，避免浪費資源
@@ -50,46 +74,44 @@ def store_data_in_pinecone(article_id_list: list):
         return "No new articles."
 
     print(f"[Celery] Starting vectorization for {len(article_id_list)} articles...")
+
+    # AI 相關套件在任務執行時才載入，爬蟲 worker 匯入本模組不需負擔 (embedding worker 啟動時已預先載入)
+    from article.ai_clients import get_active_target, get_vector_store
+    from celery_app.reindex import get_building_target
     
+    # 近似重複的文章 (轉錄、複製貼上的新聞) 只向量化代表文章
+    canonical_ids = assign_duplicates(article_id_list)
+    if skipped := len(set(article_id_list)) - len(canonical_ids):
+        DUPLICATE_ARTICLES.inc(skipped)
+        print(f"[INFO] Skipped {skipped} near-duplicate articles")
+
     # 初始化 Pinecone 與 Embedding 模型
-    vector_store = PineconeVectorStore(
-        index=Pinecone(api_key=env_settings.PINECONE_API_KEY).Index(env_settings.PINECONE_INDEX_NAME),
-        embedding=GoogleGenerativeAIEmbeddings(
-            model=env_settings.GOOGLE_EMBEDDINGS_MODEL,
-            google_api_key=SecretStr(env_settings.GOOGLE_API_KEY),
-        ),
-    )
+    # 重新向量化進行中 (或剛切換，其他 process 可能仍使用舊的 target) 時，新文章同時寫入新的 namespace，
+    # 切換後不會缺少這段期間的文章
+    active_target = get_active_target()
+    vector_stores = [get_vector_store(active_target)]
+    if (building_target := get_building_target()) and building_target != active_target:
+        vector_stores.append(get_vector_store(building_target))
 
-    documents = []
-    # 設定文字切割器
-    text_splitter = RecursiveCharacterTextSplitter(chunk_size=300, chunk_overlap=50)
+    # 設定文字切割器 (依中文句子與 PTT 格式切塊，見 article/chunking.py)
+    split_text = get_splitter()
 
     # 從資料庫取出文章
-    articles = Article.objects.filter(id__in=article_id_list).all()
-    
-    for article in articles:
-        # 切割文章內容
-        chunks = text_splitter.split_text(article.content)
-        for i, chunk in enumerate(chunks):
-            documents.append(Document(
-                page_content=chunk,
-                metadata={
-                    "article_id": article.id,
-                    "board": article.board,
-                    "title": article.title,
-                    "author": article.author,
-                    "post_time": str(article.post_time),
-                    "url": article.url,
-                    "chunk_index": i
-                }
-            ))
+    articles = Article.objects.filter(id__in=canonical_ids).all()
+    documents, ids = build_documents(articles, split_text)
 
     # 分批上傳 (Batch Upload)
     if documents:
         total_batches = ceil(len(documents) / BATCH_SIZE)
         for i in range(total_batches):
             batch_docs = documents[i * BATCH_SIZE : (i + 1) * BATCH_SIZE]
-            retry_with_backoff(vector_store.add_documents, documents=batch_docs)
+            batch_ids = ids[i * BATCH_SIZE : (i + 1) * BATCH_SIZE]
+            for store in vector_stores:
+                # add_documents 內含 embedding 與 upsert，扣除 embedding 的時間即為 upsert 的時間
+                embedding_before = store.embeddings.elapsed
+                start = time.perf_counter()
+                retry_with_backoff(store.add_documents, documents=batch_docs, ids=batch_ids)
+                observe_stage('upsert', time.perf_counter() - start - (store.embeddings.elapsed - embedding_before))
             print(f"[Batch {i+1}/{total_batches}] Uploaded {len(batch_docs)} docs")
     
     print("[Celery] Vectorization task completed successfully.")
@@ -0,0 +1,86 @@
+# celery_app/locks.py
+"""
+以 Redis 控制每個看板同一時間只有一個爬蟲任務：
+- queued 標記：任務已送出但尚未開始，避免同一看板在佇列中堆積多個任務
+- 執行鎖 (singleton lock)：任務執行期間持有，避免兩個 worker 同時爬同一個看板
+- 文章鎖：爬蟲與熱門文章追蹤寫入同一篇文章前取得，避免同時寫入而重複新增推文
+- 指標：記錄送出、略過 (已在佇列 / 仍在執行)、完成、失敗次數
+"""
+import redis
+from django.conf import settings
+from redis.exceptions import LockError
+
+redis_client = redis.Redis.from_url(settings.CELERY_BROKER_URL)
+
+LOCK_KEY = 'ptt:scrape:lock:{board}'
+ARTICLE_LOCK_KEY = 'ptt:article:lock:{url}'
+QUEUED_KEY = 'ptt:scrape:queued:{board}'
+METRICS_KEY = 'ptt:scrape:metrics'
+REFRESH_LOCK_KEY = 'ptt:refresh:lock'
+REINDEX_LOCK_KEY = 'ptt:reindex:lock'
+DEDUP_LOCK_KEY = 'ptt:dedup:lock'
+# 標記一批文章的近似重複只需數秒，等待與持有都不需要太久
+DEDUP_LOCK_TIMEOUT = 60
+# 抓取並寫入單篇文章只需數秒 (含 HTTP 重試)，worker 異常終止時很快就會過期
+ARTICLE_LOCK_TIMEOUT = 60
+
+SCRAPE_METRICS = ('dispatched', 'skipped_queued', 'skipped_running', 'completed', 'failed')
+
+
+def board_lock(board: str):
+    # timeout 與任務時間上限相同：worker 異常終止時鎖會自動過期
+    return redis_client.lock(LOCK_KEY.format(board=board), timeout=settings.CELERY_TASK_TIME_LIMIT, blocking=False)
+
+
+def article_lock(url: str):
+    # 只鎖單篇文章：熱門文章追蹤不會擋住整個看板的爬蟲任務
+    return redis_client.lock(ARTICLE_LOCK_KEY.format(url=url), timeout=ARTICLE_LOCK_TIMEOUT, blocking=False)
+
+
+def refresh_lock():
+    # 熱門文章追蹤同一時間只執行一個
+    return redis_client.lock(REFRESH_LOCK_KEY, timeout=settings.CELERY_TASK_TIME_LIMIT, blocking=False)
+
+
+def reindex_lock():
+    # 重新向量化同一時間只由一個任務執行 (重複送出時不會平行處理同一批文章)
+    return redis_client.lock(REINDEX_LOCK_KEY, timeout=settings.CELERY_TASK_TIME_LIMIT, blocking=False)
+
+
+def dedup_lock():
+    # 多個 embedding worker 同時標記近似重複時依序進行，後面的批次才看得到前一批寫入的代表文章
+    return redis_client.lock(DEDUP_LOCK_KEY, timeout=DEDUP_LOCK_TIMEOUT, blocking_timeout=DEDUP_LOCK_TIMEOUT)
+
+
+def is_board_running(board: str) -> bool:
+    return board_lock(board).locked()
+
+
+def release_lock(lock):
+    try:
+        lock.release()
+    except LockError:
+        # 鎖已過期或被其他任務取得，不需要處理
+        pass
+
+
+def mark_queued(board: str, ttl: int) -> bool:
+    """標記看板已有任務在佇列中；已標記過則回傳 False"""
+    return bool(redis_client.set(QUEUED_KEY.format(board=board), 1, nx=True, ex=ttl))
+
+
+def clear_queued(board: str):
+    redis_client.delete(QUEUED_KEY.format(board=board))
+
+
+def incr_metric(board: str, name: str):
+    redis_client.hincrby(METRICS_KEY, f'{board}:{name}', 1)
+
+
+def get_scrape_metrics() -> dict:
+    """回傳 {看板: {指標: 次數}}"""
+    metrics = {}
+    for field, value in redis_client.hgetall(METRICS_KEY).items():
+        board, name = field.decode().rsplit(':', 1)
+        metrics.setdefault(board, dict.fromkeys(SCRAPE_METRICS, 0))[name] = int(value)
+    return metrics
@@ -0,0 +1,228 @@
+# celery_app/reindex.py
+"""
+重新向量化 (更換 embedding 模型)
+
+不同模型產生的向量無法互相比較，更換 GOOGLE_EMBEDDINGS_MODEL 後既有文章必須全部重新向量化：
+- 新模型的向量寫入新的 namespace (shadow；維度不同時可指定另一個 Pinecone index)，
+  完成前查詢繼續使用目前的 target，不會混用新舊向量
+- 依文章 ID 順序分批讀取代表文章 (近似重複的文章不向量化)，每批的片段分成多個 embedding 請求平行送出
+- 每批完成後把最後的文章 ID 寫入 Redis (checkpoint)，中斷後重新執行即從斷點繼續；進度與預估剩餘時間見 get_job_report
+- 執行期間 store_data_in_pinecone 會把新文章同時寫入新的 namespace；
+  切換後其他 process 最多 EMBEDDING_TARGET_REFRESH 秒仍使用舊的 target，因此完成後的一段時間 (SWITCH_GRACE_SECONDS) 繼續同時寫入
+- 全部完成後切換查詢與向量化使用的 target (見 article/ai_clients.py 的 switch_target)，舊的 namespace 保留供 rollback
+同一時間只有一個重新向量化工作
+"""
+import json
+import re
+import time
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from zoneinfo import ZoneInfo
+
+from django.conf import settings
+
+from article.chunking import get_splitter
+from article.models import Article
+from celery_app.data_processing import build_documents, retry_with_backoff
+from celery_app.locks import redis_client
+from log_app.models import Log
+
+# 同一時間只有一個工作：status 為 running / completed / cancelled
+JOB_KEY = 'ptt:reindex:job'
+# 切換後繼續同時寫入新 namespace 的時間 (秒)，加在 EMBEDDING_TARGET_REFRESH 之上，涵蓋 Redis 與各 process 的時間差
+SWITCH_GRACE_SECONDS = 60
+
+
+def make_namespace(model: str) -> str:
+    """例如 models/gemini-embedding-001 -> gemini-embedding-001-20261018-1530"""
+    name = re.sub(r'[^a-z0-9]+', '-', model.rsplit('/', 1)[-1].lower()).strip('-')
+    return f"{name}-{datetime.now(ZoneInfo(settings.CELERY_TIMEZONE)):%Y%m%d-%H%M}"
+
+
+def canonical_articles():
+    # 與 store_data_in_pinecone 相同，只向量化代表文章
+    return Article.objects.filter(duplicate_of__isnull=True)
+
+
+# ---------------------------------------------------------
+# 工作與進度 (checkpoint)
+# ---------------------------------------------------------
+
+def load_job():
+    raw = redis_client.hgetall(JOB_KEY)
+    if not raw:
+        return None
+    job = {key.decode(): value.decode() for key, value in raw.items()}
+    return {
+        'target': json.loads(job['target']),
+        'status': job['status'],
+        'last_id': int(job['last_id']),
+        'articles': int(job['articles']),
+        'chunks': int(job['chunks']),
+        'seconds': float(job['seconds']),
+        'started_at': float(job['started_at']),
+        'completed_at': float(job['completed_at']),
+    }
+
+
+def create_job(model: str, namespace: str = None, index: str = None, restart: bool = False) -> dict:
+    """
+    建立重新向量化工作；相同模型的工作仍在進行時沿用原本的進度 (restart=True 則重新開始)
+    未指定 namespace 時依模型名稱與時間產生，未指定 index 時使用目前的 index
+    """
+    from article.ai_clients import get_active_target
+
+    job = load_job()
+    if job and job['status'] == 'running' and not restart:
+        if job['target']['model'] == model and namespace in (None, job['target']['namespace']):
+            return job
+        raise ValueError(f"Re-embedding into {job['target']['namespace']} is still running (restart to replace it)")
+
+    active = get_active_target()
+    target = {'model': model, 'index': index or active['index'], 'namespace': namespace or make_namespace(model)}
+    if target == active:
+        raise ValueError(f"{target} is already the active target")
+
+    pipe = redis_client.pipeline()
+    pipe.delete(JOB_KEY)
+    pipe.hset(JOB_KEY, mapping={
+        'target': json.dumps(target),
+        'status': 'running',
+        'last_id': 0,
+        'articles': 0,
+        'chunks': 0,
+        'seconds': 0,
+        'started_at': time.time(),
+        'completed_at': 0,
+    })
+    pipe.execute()
+    return load_job()
+
+
+def get_building_target():
+    """
+    新文章需同時寫入的 target，沒有則回傳 None
+    工作進行中，或剛完成 (還有 process 使用快取的舊 target，只寫入舊的 namespace) 時回傳工作的 target
+    """
+    job = load_job()
+    if not job:
+        return None
+    if job['status'] == 'running':
+        return job['target']
+    if job['status'] == 'completed' and \
+            time.time() - job['completed_at'] < settings.EMBEDDING_TARGET_REFRESH + SWITCH_GRACE_SECONDS:
+        return job['target']
+    return None
+
+
+def cancel_job() -> bool:
+    """停止進行中的工作 (已寫入新 namespace 的向量保留，需要時自行從 Pinecone 刪除)"""
+    job = load_job()
+    if not job or job['status'] != 'running':
+        return False
+    redis_client.hset(JOB_KEY, 'status', 'cancelled')
+    return True
+
+
+def checkpoint(last_id: int, articles: int, chunks: int, seconds: float):
+    pipe = redis_client.pipeline()
+    pipe.hset(JOB_KEY, 'last_id', last_id)
+    pipe.hincrby(JOB_KEY, 'articles', articles)
+    pipe.hincrby(JOB_KEY, 'chunks', chunks)
+    pipe.hincrbyfloat(JOB_KEY, 'seconds', seconds)
+    pipe.execute()
+
+
+def complete_job(job: dict):
+    """全部文章都已寫入新的 namespace：切換使用中的 target"""
+    from article.ai_clients import switch_target
+
+    switch_target(job['target'])
+    redis_client.hset(JOB_KEY, mapping={'status': 'completed', 'completed_at': time.time()})
+
+    job = load_job()
+    summary = (f"Re-embedding completed: {job['articles']} articles ({job['chunks']} chunks) "
+               f"into {job['target']['namespace']}, now using {job['target']['model']}")
+    print(f"[SUCCESS] {summary}")
+    Log.objects.create(level='INFO', category='reindex', message=summary)
+
+
+# ---------------------------------------------------------
+# 執行
+# ---------------------------------------------------------
+
+def run_job(max_batches: int = None) -> bool:
+    """
+    從 checkpoint 繼續執行，最多處理 max_batches 批 (None 代表做到完成)
+    回傳: 工作是否已結束 (完成、被取消或沒有工作)
+    """
+    from article.ai_clients import get_vector_store
+
+    job = load_job()
+    if not job or job['status'] != 'running':
+        return True
+
+    vector_store = get_vector_store(job['target'])
+    split_text = get_splitter()
+    embed_batch = settings.REINDEX_EMBED_BATCH
+    last_id, processed = job['last_id'], 0
+
+    with ThreadPoolExecutor(max_workers=settings.REINDEX_CONCURRENCY) as executor:
+        while max_batches is None or processed < max_batches:
+            # 每批開始前確認工作沒有被取消或取代
+            current = load_job()
+            if not current or current['status'] != 'running' or current['target'] != job['target']:
+                return True
+
+            articles = list(canonical_articles().filter(id__gt=last_id).order_by('id')[:settings.REINDEX_BATCH_SIZE])
+            if not articles:
+                complete_job(job)
+                return True
+
+            started = time.monotonic()
+            documents, ids = build_documents(articles, split_text)
+            try:
+                # 每個請求 embed_batch 個片段，最多 REINDEX_CONCURRENCY 個請求同時進行
+                futures = [
+                    executor.submit(retry_with_backoff, vector_store.add_documents,
+                                    documents=documents[i:i + embed_batch], ids=ids[i:i + embed_batch])
+                    for i in range(0, len(documents), embed_batch)
+                ]
+                for future in futures:
+                    future.result()
+            except Exception as e:
+                # checkpoint 不前進，下次從這一批重新開始 (片段 ID 固定，重複寫入會覆蓋)
+                Log.objects.create(level='ERROR', category='reindex',
+                                   message=f'Re-embedding articles after {last_id} failed: {e}',
+                                   traceback=traceback.format_exc())
+                raise
+
+            last_id = articles[-1].id
+            checkpoint(last_id, len(articles), len(documents), time.monotonic() - started)
+            processed += 1
+    return False
+
+
+def get_job_report():
+    """進度、吞吐量 (articles/min) 與預估剩餘時間；沒有工作時回傳 None"""
+    job = load_job()
+    if not job:
+        return None
+    tz = ZoneInfo(settings.CELERY_TIMEZONE)
+
+    remaining = canonical_articles().filter(id__gt=job['last_id']).count() if job['status'] == 'running' else 0
+    total = job['articles'] + remaining
+    # 以實際處理的時間計算 (不含任務在佇列中等待的時間)
+    rate = job['articles'] / job['seconds'] if job['seconds'] else 0.0
+    return {
+        'target': job['target'],
+        'status': job['status'],
+        'articles': f"{job['articles']}/{total}",
+        'progress': round(job['articles'] / total * 100, 1) if total else 100.0,
+        'chunks': job['chunks'],
+        'articles_per_min': round(rate * 60, 1),
+        'eta_seconds': round(remaining / rate) if rate and remaining else None,
+        'started_at': datetime.fromtimestamp(job['started_at'], tz).isoformat(),
+        'completed_at': datetime.fromtimestamp(job['completed_at'], tz).isoformat() if job['completed_at'] else None,
+    }
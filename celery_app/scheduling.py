@@ -0,0 +1,105 @@
+# celery_app/scheduling.py
+"""
+依看板活躍度調整爬蟲頻率：
+- 每次爬完以「新增文章數 / 距離上次爬取的分鐘數」估計發文速率 (EWMA 平滑)
+- 下次間隔 = 目標新增篇數 / 發文速率，再乘上時段係數 (例如台股交易時段加快)，並限制在看板的上下限內
+- 首頁全部都是新文章時代表可能有漏抓，直接使用最短間隔
+狀態存放在 Redis，排程 tick 只負責檢查哪些看板到期
+"""
+import time
+from datetime import datetime
+from zoneinfo import ZoneInfo
+
+from django.conf import settings
+
+from celery_app.locks import redis_client
+
+STATE_KEY = 'ptt:scrape:schedule:{board}'
+
+# 發文速率的平滑係數 (越大越重視最近一次的觀察值)
+EWMA_ALPHA = 0.5
+# PTT 看板首頁約 20 篇文章，新增數達到這個比例視為首頁已被洗過一輪
+SATURATION_RATIO = 0.9
+PAGE_SIZE = 20
+
+
+def get_board_config(board: str) -> dict:
+    return settings.PTT_SCRAPE_BOARDS[board]
+
+
+def load_state(board: str) -> dict:
+    raw = redis_client.hgetall(STATE_KEY.format(board=board))
+    return {key.decode(): float(value) for key, value in raw.items()}
+
+
+def save_state(board: str, **values):
+    redis_client.hset(STATE_KEY.format(board=board), mapping=values)
+
+
+def profile_factor(board: str, now: datetime) -> float:
+    """取得目前時段的係數：看板專屬設定優先，其次為 '*' 的共用設定，都沒有則為 1"""
+    current = now.strftime('%H:%M')
+    for key in (board, '*'):
+        for start, end, factor in settings.PTT_SCRAPE_PROFILES.get(key, []):
+            # 支援跨午夜的時段，例如 ('23:00', '02:00')
+            if start <= end and start <= current < end:
+                return factor
+            if start > end and (current >= start or current < end):
+                return factor
+    return 1.0
+
+
+def compute_interval(board: str, rate, created_count: int, now: datetime) -> int:
+    """計算下次爬取間隔 (秒)"""
+    config = get_board_config(board)
+
+    if created_count >= PAGE_SIZE * SATURATION_RATIO:
+        # 首頁幾乎都是新文章，可能已漏掉被擠到第二頁的文章
+        return config['min_interval']
+
+    if rate is None:
+        interval = config['interval']
+    elif rate <= 0:
+        interval = config['max_interval']
+    else:
+        interval = settings.PTT_SCRAPE_TARGET_NEW_ARTICLES / rate * 60
+
+    interval *= profile_factor(board, now)
+    return int(min(max(interval, config['min_interval']), config['max_interval']))
+
+
+def record_scrape_result(board: str, created_count: int, now_ts=None) -> int:
+    """爬蟲完成後呼叫：更新發文速率並排定下次爬取時間，回傳下次間隔 (秒)"""
+    now_ts = now_ts or time.time()
+    state = load_state(board)
+
+    rate = state.get('rate')
+    last_run = state.get('last_run')
+    if last_run and now_ts > last_run:
+        observed = created_count / ((now_ts - last_run) / 60)
+        rate = observed if rate is None else EWMA_ALPHA * observed + (1 - EWMA_ALPHA) * rate
+
+    now = datetime.fromtimestamp(now_ts, ZoneInfo(settings.CELERY_TIMEZONE))
+    interval = compute_interval(board, rate, created_count, now)
+
+    values = {'last_run': now_ts, 'next_run': now_ts + interval, 'interval': interval, 'last_created': created_count}
+    if rate is not None:
+        values['rate'] = rate
+    save_state(board, **values)
+    return interval
+
+
+def due_boards(now_ts=None) -> list:
+    """回傳已到期 (或從未爬過) 的看板"""
+    now_ts = now_ts or time.time()
+    return [board for board in settings.PTT_SCRAPE_BOARDS if load_state(board).get('next_run', 0) <= now_ts]
+
+
+def postpone(board: str, seconds: int, now_ts=None):
+    """送出任務後先把下次時間往後延，避免任務執行期間每個 tick 都重複送出；任務完成時會重新計算"""
+    now_ts = now_ts or time.time()
+    save_state(board, next_run=now_ts + seconds)
+
+
+def get_schedule_state() -> dict:
+    return {board: load_state(board) for board in settings.PTT_SCRAPE_BOARDS}
@@ -1,19 +1,169 @@
 from celery import chain
+from django.conf import settings
 from config.celery import app
-from article.scraper import ptt_scrape  # <--- 修正這行
+from article.scraper import ptt_scrape, refresh_hot_articles  # <--- 修正這行
 from celery_app.data_processing import store_data_in_pinecone
+from celery_app.locks import (
+    board_lock, refresh_lock, reindex_lock, is_board_running, release_lock, mark_queued, clear_queued, incr_metric,
+)
+from celery_app.scheduling import record_scrape_result, due_boards, postpone
+from celery_app.backfill import create_job, load_job, run_shard, get_job_report
+from celery_app import reindex
+from log_app.models import Log
+from log_app.retention import purge_logs
+from article.digest import update_board_digests
 
 @app.task
 def scrape_task(board):
-    return ptt_scrape(board)
+    # 任務已開始執行，清除 queued 標記，讓下一次排程可以再送出
+    clear_queued(board)
+
+    lock = board_lock(board)
+    if not lock.acquire():
+        # 另一個 worker 正在爬同一個看板 (例如手動觸發與排程重疊)
+        incr_metric(board, 'skipped_running')
+        Log.objects.create(level='WARNING', category=f'scrape-{board}', message=f'Skip scraping {board}: already running')
+        # dispatch_due_boards 已把下次時間延後到間隔上限，改為依間隔下限盡快重試
+        postpone(board, settings.PTT_SCRAPE_BOARDS[board]['min_interval'])
+        return []
+
+    try:
+        # 內文有修改的既有文章另外送出向量化任務 (重新比對近似重複)，新文章由任務鏈向量化
+        result = ptt_scrape(board, embed=store_data_in_pinecone.delay)
+        incr_metric(board, 'completed')
+        # 依本次新增的文章數調整下次爬取時間
+        interval = record_scrape_result(board, len(result))
+        print(f"[INFO] Next scrape of {board} in {interval}s")
+        return result
+    except Exception:
+        incr_metric(board, 'failed')
+        raise
+    finally:
+        release_lock(lock)
+
+@app.task
+def dispatch_board_scrape(board):
+    """
+    排程入口：送出單一看板的「爬蟲 -> 向量化」任務鏈
+    上一次仍在執行或仍在佇列中時略過，避免重疊
+    """
+    if is_board_running(board):
+        incr_metric(board, 'skipped_running')
+        Log.objects.create(level='WARNING', category=f'scrape-{board}',
+                           message=f'Skip dispatching {board}: previous run still in progress')
+        return f"Skipped {board}: running"
+
+    max_interval = settings.PTT_SCRAPE_BOARDS[board]['max_interval']
+    if not mark_queued(board, ttl=max_interval):
+        incr_metric(board, 'skipped_queued')
+        Log.objects.create(level='WARNING', category=f'scrape-{board}',
+                           message=f'Skip dispatching {board}: previous run still queued')
+        return f"Skipped {board}: queued"
+
+    # scrape_task 與 store_data_in_pinecone 依 CELERY_TASK_ROUTES 分別送到 scrape / embedding 佇列
+    tasks = [scrape_task.s(board), store_data_in_pinecone.s()]
+    if settings.DIGEST_ENABLED:
+        # 向量化後 (近似重複已標記) 更新看板摘要；不需要上一個任務的回傳值
+        tasks.append(update_board_digests_task.si(board))
+    task_chain = chain(*tasks)
+    task_chain.apply_async()
+    incr_metric(board, 'dispatched')
+    print(f"Sent task chain for {board}")
+    return f"Dispatched {board}"
+
+@app.task
+def dispatch_due_boards():
+    """排程 tick：送出已到期看板的爬蟲任務"""
+    boards = due_boards()
+    for board in boards:
+        # 先以間隔上限延後，任務完成後會依活躍度重新排定
+        postpone(board, settings.PTT_SCRAPE_BOARDS[board]['max_interval'])
+        dispatch_board_scrape(board)
+    return boards
 
 @app.task
 def period_send_ptt_scrape_task():
-    board_list = ['Stock', 'Gossiping']
-    for board in board_list:
-        task_chain = chain(
-            scrape_task.s(board),
-            store_data_in_pinecone.s()
-        )
-        task_chain.apply_async()
-        print(f"Sent task chain for {board}")
\ No newline at end of file
+    """一次送出所有設定看板的爬蟲任務 (手動觸發用，排程改為依各看板活躍度執行)"""
+    for board in settings.PTT_SCRAPE_BOARDS:
+        dispatch_board_scrape.delay(board)
+
+@app.task
+def refresh_hot_articles_task():
+    """
+    排程 tick：重新抓取推文速度快、已到期的追蹤文章 (不限看板首頁)
+    爬蟲正在寫入的文章本次略過 (逐篇取得文章鎖)，下一個 tick 再處理
+    """
+    lock = refresh_lock()
+    if not lock.acquire():
+        return {}
+
+    try:
+        return refresh_hot_articles(settings.ARTICLE_REFRESH_BATCH_SIZE, embed=store_data_in_pinecone.delay)
+    finally:
+        release_lock(lock)
+
+@app.task
+def backfill_board_task(board, start_page=None, end_page=None, since=None, until=None, shards=None, restart=False):
+    """
+    歷史資料回補入口：決定頁碼範圍後，每個分片送出一個 backfill_shard_task 平行執行
+    相同參數重新送出時會從上次的 checkpoint 繼續
+    """
+    job_id = create_job(board, start_page, end_page, shards, since, until, restart)
+
+    for shard in range(load_job(job_id)['shards']):
+        backfill_shard_task.delay(job_id, shard)
+    Log.objects.create(level='INFO', category=f'backfill-{board}', message=f'Start backfill job {job_id}')
+    return job_id
+
+@app.task
+def backfill_shard_task(job_id, shard):
+    """
+    執行分片的下一段 (最多 PTT_BACKFILL_PAGES_PER_TASK 頁)，未完成時再送出自己接續
+    每段任務都很短，不會超過任務時間上限，也讓一般爬蟲任務有機會穿插執行
+    """
+    done = run_shard(job_id, shard, embed=store_data_in_pinecone.delay,
+                     max_pages=settings.PTT_BACKFILL_PAGES_PER_TASK)
+    if not done:
+        backfill_shard_task.delay(job_id, shard)
+        return f"Shard {shard} of {job_id} continues"
+
+    report = get_job_report(job_id)
+    if report['done']:
+        summary = f"Backfill {job_id} completed. Articles: {report['articles']}, {report['articles_per_min']} articles/min"
+        print(f"[SUCCESS] {summary}")
+        Log.objects.create(level='INFO', category=f"backfill-{report['board']}", message=summary)
+    return report
+
+@app.task
+def purge_logs_task():
+    """排程 tick：刪除超過保存期限 (LOG_RETENTION_DAYS) 的 Log 與效能分析紀錄"""
+    result = purge_logs()
+    print(f"[INFO] Purged logs: {result}")
+    return result
+
+@app.task
+def update_board_digests_task(board):
+    """更新看板有新資料的時段摘要 (接在爬蟲、向量化之後執行)"""
+    digests = update_board_digests(board)
+    print(f"[INFO] Updated {len(digests)} digests for {board}")
+    return [str(digest) for digest in digests]
+
+@app.task
+def reindex_embeddings_task():
+    """
+    重新向量化的下一段 (最多 REINDEX_BATCHES_PER_TASK 批)，未完成時再送出自己接續
+    每段任務都很短，不會超過任務時間上限，也讓一般向量化任務有機會穿插執行
+    """
+    lock = reindex_lock()
+    if not lock.acquire():
+        return "Skipped: re-embedding already running"
+    try:
+        done = reindex.run_job(max_batches=settings.REINDEX_BATCHES_PER_TASK)
+    finally:
+        # 先釋放鎖再送出下一段，接續的任務才能取得鎖
+        release_lock(lock)
+
+    if not done:
+        reindex_embeddings_task.delay()
+        return "Re-embedding continues"
+    return reindex.get_job_report()
@@ -0,0 +1,339 @@
+import os
+import time
+from collections import defaultdict
+from datetime import datetime
+from zoneinfo import ZoneInfo
+from unittest import mock
+
+import fakeredis
+from asgiref.sync import sync_to_async
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.utils import timezone
+
+from article import ai_clients
+from article.fakes.ai import InMemoryIndex
+from article.models import Article
+from article.scraper import save_article
+from celery_app import backfill, reindex, scheduling
+from celery_app.locks import board_lock, get_scrape_metrics, QUEUED_KEY
+from celery_app.tasks import scrape_task, dispatch_board_scrape, dispatch_due_boards
+from celery_app.data_processing import store_data_in_pinecone
+from config.celery import delete_metrics_on_shutdown
+from config.metrics import push_metrics
+from log_app.models import Log
+
+
+class BackfillJobTests(SimpleTestCase):
+    def setUp(self):
+        self.redis = fakeredis.FakeRedis()
+        patcher = mock.patch('celery_app.backfill.redis_client', self.redis)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_default_range_resumes_after_new_pages(self):
+        # 未指定結束頁：第一次執行時最新一頁為 100，重新執行時看板已新增到 105 頁
+        with mock.patch('celery_app.backfill.resolve_page_range', side_effect=[(1, 100), (1, 105)]) as resolve:
+            job_id = backfill.create_job('Stock', shards=2)
+            backfill.checkpoint(job_id, 0, 10, [], 1.0)
+            self.assertEqual(backfill.create_job('Stock', shards=2), job_id)
+        resolve.assert_called_once()
+
+        job = backfill.load_job(job_id)
+        self.assertEqual((job['start_page'], job['end_page']), (1, 100))
+        self.assertEqual(job['0:next'], 11)
+        self.assertEqual(job['1:end'], 100)
+
+    def test_restart_resolves_range_again(self):
+        with mock.patch('celery_app.backfill.resolve_page_range', side_effect=[(1, 100), (1, 105)]):
+            job_id = backfill.create_job('Stock', shards=1)
+            self.assertEqual(backfill.create_job('Stock', shards=1, restart=True), job_id)
+        self.assertEqual(backfill.load_job(job_id)['end_page'], 105)
+
+    def test_default_range_stops_before_latest_page(self):
+        # 最新一頁由爬蟲任務處理，回補只到前一頁
+        with mock.patch('celery_app.backfill.get_html'), \
+                mock.patch('celery_app.backfill.get_latest_page', return_value=100):
+            self.assertEqual(backfill.resolve_page_range('Stock'), (1, 99))
+            self.assertEqual(backfill.resolve_page_range('Stock', 90, 120), (90, 99))
+
+    def test_pending_ids_kept_when_embed_fails(self):
+        backfill.checkpoint('job', 0, 1, [1, 2, 3], 1.0)
+        embed = mock.Mock(side_effect=ConnectionError('broker down'))
+        with self.assertRaises(ConnectionError):
+            backfill.flush_pending('job', embed)
+
+        embed = mock.Mock()
+        self.assertEqual(backfill.flush_pending('job', embed), 3)
+        embed.assert_called_once_with([1, 2, 3])
+        self.assertEqual(self.redis.llen(backfill.PENDING_KEY.format(job_id='job')), 0)
+
+    def test_ids_added_while_embedding_are_kept(self):
+        backfill.checkpoint('job', 0, 1, [1, 2], 1.0)
+
+        def embed(article_ids):
+            # 送出期間另一個分片完成一頁
+            backfill.checkpoint('job', 1, 50, [3], 1.0)
+
+        self.assertEqual(backfill.flush_pending('job', embed), 2)
+        embed = mock.Mock()
+        backfill.flush_pending('job', embed)
+        embed.assert_called_once_with([3])
+
+
+class BackfillPageTests(TestCase):
+    URLS = [f'https://www.ptt.cc/bbs/Stock/M.170000000{i}.A.00{i}.html' for i in range(3)]
+
+    def make_data(self, url):
+        return {
+            'title': f'[新聞] {url}', 'author': 'tester', 'content': '內文', 'post_time': timezone.now(),
+            'comments': [{'tag': '推', 'user_id': 'user', 'content': '推文', 'ip_datetime': '01/01 10:00'}],
+        }
+
+    def test_skips_article_saved_while_fetching(self):
+        def fetch(url):
+            if url == self.URLS[1]:
+                # 回補抓取期間，另一個任務先寫入了同一篇文章
+                save_article('Stock', url, self.make_data(url))
+            return self.make_data(url)
+
+        with mock.patch('celery_app.backfill.get_html'), \
+                mock.patch('celery_app.backfill.get_urls_from_board_html', return_value=self.URLS), \
+                mock.patch('celery_app.backfill.fetch_article', side_effect=fetch):
+            article_ids = backfill.backfill_page('Stock', 1)
+
+        articles = {article.url: article for article in Article.objects.all()}
+        self.assertEqual(len(articles), 3)
+        self.assertEqual(sorted(article_ids), sorted(articles[url].id for url in (self.URLS[0], self.URLS[2])))
+        for article in articles.values():
+            self.assertEqual(article.comments.count(), 1)
+
+
+@override_settings(PTT_SCRAPE_BOARDS={'Stock': {'interval': 600, 'min_interval': 120, 'max_interval': 1800}},
+                   PTT_SCRAPE_PROFILES={}, PTT_SCRAPE_TARGET_NEW_ARTICLES=8, CELERY_TIMEZONE='Asia/Taipei')
+class SchedulingTests(SimpleTestCase):
+    # 2024-01-15 10:00 (台灣時間)
+    NOW = datetime(2024, 1, 15, 10, 0, tzinfo=ZoneInfo('Asia/Taipei'))
+
+    def setUp(self):
+        patcher = mock.patch('celery_app.scheduling.redis_client', fakeredis.FakeRedis())
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def record(self, created_count, minutes):
+        return scheduling.record_scrape_result('Stock', created_count, now_ts=self.NOW.timestamp() + minutes * 60)
+
+    def test_ewma_rate(self):
+        # 第一次爬取沒有速率可估計，使用看板的初始間隔
+        self.assertEqual(self.record(5, 0), 600)
+        self.assertNotIn('rate', scheduling.load_state('Stock'))
+
+        # 10 分鐘 4 篇：0.4 篇/分，8 篇需要 20 分鐘
+        self.assertEqual(self.record(4, 10), 1200)
+        self.assertAlmostEqual(scheduling.load_state('Stock')['rate'], 0.4)
+
+        # 10 分鐘 12 篇 (1.2 篇/分)：與上次的速率各占一半
+        self.assertEqual(self.record(12, 20), 600)
+        state = scheduling.load_state('Stock')
+        self.assertAlmostEqual(state['rate'], 0.8)
+        self.assertEqual(state['next_run'], self.NOW.timestamp() + 20 * 60 + 600)
+        self.assertEqual(scheduling.due_boards(now_ts=state['next_run'] - 1), [])
+        self.assertEqual(scheduling.due_boards(now_ts=state['next_run']), ['Stock'])
+
+    def test_interval_bounds(self):
+        self.assertEqual(scheduling.compute_interval('Stock', 100, 10, self.NOW), 120)
+        self.assertEqual(scheduling.compute_interval('Stock', 0.01, 1, self.NOW), 1800)
+        # 沒有新文章
+        self.assertEqual(scheduling.compute_interval('Stock', 0, 0, self.NOW), 1800)
+
+    def test_saturated_page_uses_min_interval(self):
+        # 首頁 20 篇中有 18 篇是新文章，不論估計的速率多低都用最短間隔
+        self.assertEqual(scheduling.compute_interval('Stock', 0.01, 18, self.NOW), 120)
+        self.assertEqual(scheduling.compute_interval('Stock', 0.01, 17, self.NOW), 1800)
+        self.assertEqual(self.record(20, 0), 120)
+
+    @override_settings(PTT_SCRAPE_PROFILES={
+        '*': [('23:00', '02:00', 2.0)],
+        'Stock': [('08:30', '13:30', 0.5)],
+    })
+    def test_profile_factor(self):
+        self.assertEqual(scheduling.profile_factor('Stock', self.NOW), 0.5)
+        self.assertEqual(scheduling.profile_factor('Gossiping', self.NOW), 1.0)
+        # 跨午夜的時段
+        for hour, factor in ((23, 2.0), (1, 2.0), (2, 1.0), (22, 1.0)):
+            self.assertEqual(scheduling.profile_factor('Stock', self.NOW.replace(hour=hour)), factor)
+
+        # 時段係數在上下限之前套用
+        self.assertEqual(scheduling.compute_interval('Stock', 0.8, 8, self.NOW), 300)
+        self.assertEqual(scheduling.compute_interval('Stock', 0.8, 8, self.NOW.replace(hour=23)), 1200)
+        self.assertEqual(scheduling.compute_interval('Stock', 4, 8, self.NOW), 120)
+        self.assertEqual(scheduling.compute_interval('Stock', 0.2, 2, self.NOW.replace(hour=23)), 1800)
+
+
+@override_settings(AI_BACKEND='fake', FAKE_VECTOR_STORE_URL=None, FAKE_EMBEDDING_DELAY=0, DEDUP_ENABLED=False,
+                   REINDEX_BATCH_SIZE=2, REINDEX_CONCURRENCY=1, EMBEDDING_TARGET_REFRESH=5)
+class ReindexTests(TestCase):
+    MODEL = 'models/new-embedding'
+
+    def setUp(self):
+        self.redis = fakeredis.FakeRedis()
+        self.indexes = defaultdict(InMemoryIndex)
+        for patcher in (
+            mock.patch('celery_app.reindex.redis_client', self.redis),
+            mock.patch('article.ai_clients.redis_client', self.redis),
+            mock.patch('article.ai_clients._active_target', (0.0, None)),
+            mock.patch('article.fakes.ai._local_indexes', self.indexes),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.articles = [self.create_article(i) for i in range(5)]
+
+    def create_article(self, i):
+        return Article.objects.create(
+            board='Stock', title=f'文章 {i}', author='tester', content=f'第 {i} 篇文章的內文。',
+            post_time=timezone.now(), url=f'https://www.ptt.cc/bbs/Stock/M.{i}.html',
+        )
+
+    def article_ids(self, namespace):
+        return {int(record_id.split('-')[0]) for record_id in self.indexes[namespace]._records}
+
+    def use_stale_target(self, target):
+        # 其他 process 還沒重新讀取 Redis，仍使用快取的舊 target
+        ai_clients._active_target = (time.monotonic(), target)
+
+    def test_resumes_from_checkpoint_and_switches(self):
+        old_target = ai_clients.get_active_target()
+        job = reindex.create_job(self.MODEL, 'new')
+        self.assertFalse(reindex.run_job(max_batches=1))
+        self.assertEqual(self.article_ids('new'), {self.articles[0].id, self.articles[1].id})
+        self.assertEqual(ai_clients.get_active_target(), old_target)
+
+        # 中斷後以相同模型重新執行：沿用進度，從 checkpoint 繼續
+        job = reindex.create_job(self.MODEL)
+        self.assertEqual(job['last_id'], self.articles[1].id)
+        with mock.patch.object(InMemoryIndex, 'upsert', autospec=True, side_effect=InMemoryIndex.upsert) as upsert:
+            self.assertTrue(reindex.run_job())
+        self.assertEqual(sum(len(call.args[1]) for call in upsert.call_args_list), 3)
+
+        self.assertEqual(self.article_ids('new'), {article.id for article in self.articles})
+        self.assertEqual(ai_clients.get_active_target(), job['target'])
+        self.assertEqual(ai_clients.get_previous_target(), old_target)
+        self.assertEqual(reindex.get_job_report()['status'], 'completed')
+
+    def test_new_articles_written_to_both_namespaces_around_switch(self):
+        old_target = ai_clients.get_active_target()
+        reindex.create_job(self.MODEL, 'new')
+        reindex.run_job(max_batches=1)
+
+        # 重新向量化進行中
+        during = self.create_article(10)
+        store_data_in_pinecone([during.id])
+        self.assertIn(during.id, self.article_ids(''))
+        self.assertIn(during.id, self.article_ids('new'))
+
+        reindex.run_job()
+        # 切換後，使用快取舊 target 的 process 寫入的新文章仍會寫入新的 namespace
+        self.use_stale_target(old_target)
+        after = self.create_article(11)
+        store_data_in_pinecone([after.id])
+        self.assertIn(after.id, self.article_ids(''))
+        self.assertIn(after.id, self.article_ids('new'))
+
+        # 寬限期過後只寫入使用中的 target
+        self.redis.hset(reindex.JOB_KEY, 'completed_at', time.time() - 5 - reindex.SWITCH_GRACE_SECONDS)
+        self.assertIsNone(reindex.get_building_target())
+        ai_clients._active_target = (0.0, None)
+        late = self.create_article(12)
+        store_data_in_pinecone([late.id])
+        self.assertNotIn(late.id, self.article_ids(''))
+        self.assertIn(late.id, self.article_ids('new'))
+
+
+@override_settings(PROMETHEUS_PUSHGATEWAY='pushgateway:9091')
+class PushMetricsTests(SimpleTestCase):
+    def test_process_shutdown_deletes_its_group(self):
+        with mock.patch('config.metrics.push_to_gateway') as push, \
+                mock.patch('config.metrics.delete_from_gateway') as delete:
+            push_metrics(force=True)
+            delete_metrics_on_shutdown()
+
+        grouping_key = push.call_args.kwargs['grouping_key']
+        self.assertTrue(grouping_key['instance'].endswith(f'-{os.getpid()}'))
+        delete.assert_called_once_with('pushgateway:9091', job='celery', grouping_key=grouping_key, timeout=2)
+
+    def test_delete_error_does_not_raise(self):
+        with mock.patch('config.metrics.delete_from_gateway', side_effect=OSError('connection refused')):
+            delete_metrics_on_shutdown()
+
+
+@override_settings(PTT_SCRAPE_BOARDS={'Stock': {'interval': 600, 'min_interval': 120, 'max_interval': 1800}})
+class ScrapeTaskTests(TestCase):
+    def setUp(self):
+        self.redis = fakeredis.FakeRedis()
+        for patcher in (
+            mock.patch('celery_app.locks.redis_client', self.redis),
+            mock.patch('celery_app.scheduling.redis_client', self.redis),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def test_skipped_run_is_rescheduled_at_min_interval(self):
+        # dispatch_due_boards 送出前已把下次時間延後到間隔上限
+        now_ts = time.time()
+        scheduling.postpone('Stock', 1800, now_ts=now_ts)
+        lock = board_lock('Stock')
+        self.assertTrue(lock.acquire())
+
+        with mock.patch('celery_app.tasks.ptt_scrape') as scrape:
+            self.assertEqual(scrape_task('Stock'), [])
+        scrape.assert_not_called()
+        self.assertEqual(get_scrape_metrics()['Stock']['skipped_running'], 1)
+        self.assertLessEqual(scheduling.load_state('Stock')['next_run'], time.time() + 120)
+        self.assertEqual(scheduling.due_boards(now_ts=time.time() + 120), ['Stock'])
+
+    def test_dispatch_skips_queued_and_running_boards(self):
+        with mock.patch('celery_app.tasks.chain') as chain:
+            self.assertEqual(dispatch_board_scrape('Stock'), 'Dispatched Stock')
+            # 上一輪仍在佇列中
+            self.assertEqual(dispatch_board_scrape('Stock'), 'Skipped Stock: queued')
+            self.assertEqual(chain.return_value.apply_async.call_count, 1)
+            self.assertLessEqual(self.redis.ttl(QUEUED_KEY.format(board='Stock')), 1800)
+
+            # 任務開始執行時清除 queued 標記；執行期間再送出會被略過
+            def scrape(board, embed=None):
+                self.assertEqual(dispatch_board_scrape(board), f'Skipped {board}: running')
+                return []
+
+            with mock.patch('celery_app.tasks.ptt_scrape', side_effect=scrape):
+                scrape_task('Stock')
+            self.assertEqual(chain.return_value.apply_async.call_count, 1)
+
+            # 執行結束後釋放鎖，可以再次送出
+            self.assertEqual(dispatch_board_scrape('Stock'), 'Dispatched Stock')
+
+        self.assertEqual(get_scrape_metrics()['Stock'], {
+            'dispatched': 2, 'skipped_queued': 1, 'skipped_running': 1, 'completed': 1, 'failed': 0,
+        })
+        self.assertEqual(Log.objects.filter(category='scrape-Stock', level='WARNING').count(), 2)
+
+    def test_failed_scrape_releases_lock(self):
+        with mock.patch('celery_app.tasks.ptt_scrape', side_effect=ConnectionError('ptt down')), \
+                self.assertRaises(ConnectionError):
+            scrape_task('Stock')
+        self.assertEqual(get_scrape_metrics()['Stock']['failed'], 1)
+        self.assertTrue(board_lock('Stock').acquire())
+
+    def test_due_boards_are_postponed_until_finished(self):
+        with mock.patch('celery_app.tasks.dispatch_board_scrape') as dispatch:
+            self.assertEqual(dispatch_due_boards(), ['Stock'])
+            # 任務完成前不會在下一個 tick 重複送出
+            self.assertEqual(dispatch_due_boards(), [])
+        dispatch.assert_called_once_with('Stock')
+
+    async def test_statistics_endpoint(self):
+        scheduling.record_scrape_result('Stock', 5)
+        with mock.patch('celery_app.tasks.chain'):
+            await sync_to_async(dispatch_board_scrape)('Stock')
+
+        data = (await self.async_client.get('/api/scrape/stats/')).json()
+        self.assertEqual(data['Stock']['dispatched'], 1)
+        self.assertEqual(data['Stock']['schedule']['last_created'], 5.0)
@@ -14,3 +14,10 @@ from django.core.asgi import get_asgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'config.settings')
 
 application = get_asgi_application()
+
+# RAG 相關套件改為延遲載入，web 啟動時預先載入，第一個查詢請求不用等待
+from django.conf import settings  # noqa: E402
+
+if settings.AI_PREWARM_WEB:
+    from article.ai_clients import prewarm  # noqa: E402
+    prewarm()
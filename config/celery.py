@@ -1,5 +1,6 @@
 import os
 from celery import Celery
+from celery.signals import task_postrun, worker_init, worker_process_shutdown
 
 # 1. 設定 Django 環境變數
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'config.settings')
@@ -24,13 +25,51 @@ app.conf.imports = [
     "celery_app.data_processing", # 包含 Pinecone 向量化邏輯
 ]
 
-# 6. 設定排程 (Beat Schedule)
-app.conf.beat_schedule = {
-    'scrape-every-hour': {
+# 6. Worker 沒有 HTTP 端點，任務結束後把 Prometheus 指標推送到 Pushgateway (有間隔限制)
+@task_postrun.connect
+def push_metrics_after_task(**kwargs):
+    from config.metrics import push_metrics
+    push_metrics()
+
+# 子 process 結束 (含 max-tasks-per-child 重啟) 時刪除自己的一組，Pushgateway 不會累積過期的 instance
+@worker_process_shutdown.connect
+def delete_metrics_on_shutdown(**kwargs):
+    from config.metrics import delete_metrics
+    delete_metrics()
+
+# 7. 消費 AI_PREWARM_QUEUES (預設 embedding) 的 worker 在主 process fork 前預先載入 AI 相關套件，
+# 子 process (含 max-tasks-per-child 重啟的) 直接沿用；爬蟲 worker 不載入
+@worker_init.connect
+def prewarm_ai_stack(sender, **kwargs):
+    from django.conf import settings
+
+    queues = set(sender.app.amqp.queues.consume_from)
+    if queues & set(settings.AI_PREWARM_QUEUES):
+        from article.ai_clients import prewarm
+        prewarm()
+
+# 8. 設定排程 (Beat Schedule)
+# Beat 只負責固定頻率的 tick，各看板的實際爬取間隔依活躍度動態調整 (見 celery_app/scheduling.py)
+# 在 Celery 設定完成後才讀取 Django settings，避免 import 順序問題
+@app.on_after_configure.connect
+def setup_periodic_tasks(sender, **kwargs):
+    from django.conf import settings
+
+    sender.add_periodic_task(
+        settings.PTT_SCHEDULER_TICK,
         # 注意：這裡指向的是 tasks.py，因為那是我們定義 @app.task 的地方
-        'task': 'celery_app.tasks.period_send_ptt_scrape_task', 
-        
-        # 設定執行頻率 (秒)
-        'schedule': 600, 
-    }
-}
\ No newline at end of file
+        sender.signature('celery_app.tasks.dispatch_due_boards'),
+        name='scrape-scheduler-tick',
+    )
+
+    sender.add_periodic_task(
+        settings.ARTICLE_REFRESH_TICK,
+        sender.signature('celery_app.tasks.refresh_hot_articles_task'),
+        name='article-refresh-tick',
+    )
+
+    sender.add_periodic_task(
+        settings.LOG_PURGE_TICK,
+        sender.signature('celery_app.tasks.purge_logs_task'),
+        name='log-retention-tick',
+    )
@@ -0,0 +1,80 @@
+"""
+資料庫讀寫分離
+
+- 預設所有讀寫都走 primary (default)，爬蟲與 Celery 任務剛寫入的資料可以立刻讀到
+- 在 use_read_replica() 區塊內 (文章列表、詳情、統計與 RAG 文章查詢)，
+  article app 的讀取改走 replica (未設定 replica 時仍走 primary)
+- 寫入 (包含 API 內的 Log 紀錄) 一律走 primary
+- use_primary() 區塊內即使在 use_read_replica() 之內也改回 primary
+  (API 快取在資料剛更新後改從 primary 計算，避免把 replica 延遲的舊資料存進新版本的快取，見 article/cache.py)
+"""
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import wraps
+from inspect import iscoroutinefunction
+
+from django.conf import settings
+
+PRIMARY_ALIAS = 'default'
+REPLICA_ALIAS = 'replica'
+# 只有文章相關的資料會從 replica 讀取
+REPLICA_APPS = {'article'}
+
+# 使用 ContextVar：非同步 view 透過 sync_to_async 執行 ORM 時也能帶到執行緒內
+_use_replica = ContextVar('use_read_replica', default=False)
+
+
+@contextmanager
+def use_read_replica():
+    token = _use_replica.set(True)
+    try:
+        yield
+    finally:
+        _use_replica.reset(token)
+
+
+@contextmanager
+def use_primary():
+    token = _use_replica.set(False)
+    try:
+        yield
+    finally:
+        _use_replica.reset(token)
+
+
+def read_from_replica(func):
+    """View 方法的 decorator：整個請求期間的讀取都走 replica (支援 async 與 sync 函式)"""
+    if iscoroutinefunction(func):
+        @wraps(func)
+        async def async_wrapper(*args, **kwargs):
+            with use_read_replica():
+                return await func(*args, **kwargs)
+        return async_wrapper
+
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        with use_read_replica():
+            return func(*args, **kwargs)
+    return wrapper
+
+
+class ReadReplicaRouter:
+    def db_for_read(self, model, **hints):
+        if (
+            _use_replica.get()
+            and model._meta.app_label in REPLICA_APPS
+            and REPLICA_ALIAS in settings.DATABASES
+        ):
+            return REPLICA_ALIAS
+        return PRIMARY_ALIAS
+
+    def db_for_write(self, model, **hints):
+        return PRIMARY_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # replica 是 primary 的複本，兩邊的物件可以互相關聯
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # replica 的資料表由資料庫複寫 (replication) 同步，不直接執行 migrate
+        return db == PRIMARY_ALIAS
@@ -0,0 +1,123 @@
+"""
+Prometheus 指標
+
+- ptt_stage_duration_seconds{stage}: 各處理階段的耗時 (爬蟲、向量化、RAG、API 序列化)
+- ptt_rag_prompt_chars: 送給 LLM 的參考文章字數
+- ptt_retries_total{operation}: 外部呼叫的重試次數
+- ptt_api_cache_requests_total{name, result}: API 快取命中 / 未命中 / 304
+- ptt_duplicate_articles_total: 向量化時略過的近似重複文章數
+- ptt_coalesced_requests_total{name, scope}: 與進行中的相同查詢合併的請求數 (同 process / 跨 worker)
+
+Web process 由 /metrics 提供 (多個 uvicorn worker 時設定 PROMETHEUS_MULTIPROC_DIR 彙總)，
+Celery worker 沒有 HTTP 端點，任務結束後推送到 Pushgateway (PROMETHEUS_PUSHGATEWAY)
+每次記錄只是記憶體內的計數，可常駐開啟
+"""
+import os
+import socket
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.http import HttpResponse
+from prometheus_client import (
+    CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Counter, Histogram, generate_latest, multiprocess,
+    delete_from_gateway, push_to_gateway,
+)
+
+STAGES = (
+    'fetch', 'parse', 'db_write',                        # 爬蟲
+    'chunking', 'embedding', 'upsert',                   # 向量化
+    'retrieval', 'db_fetch', 'generation',               # RAG
+    'serialization',                                     # API
+)
+
+STAGE_SECONDS = Histogram(
+    'ptt_stage_duration_seconds', '各處理階段的耗時 (秒)', ['stage'],
+    buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60),
+)
+PROMPT_CHARS = Histogram(
+    'ptt_rag_prompt_chars', 'RAG prompt 中參考文章的字數',
+    buckets=(500, 1000, 2500, 5000, 10000, 25000, 50000, 100000),
+)
+RETRIES = Counter('ptt_retries_total', '外部呼叫的重試次數', ['operation'])
+CACHE_REQUESTS = Counter('ptt_api_cache_requests_total', 'API 快取結果', ['name', 'result'])
+DUPLICATE_ARTICLES = Counter('ptt_duplicate_articles_total', '向量化時略過的近似重複文章數')
+COALESCED_REQUESTS = Counter('ptt_coalesced_requests_total', '與進行中的相同查詢合併的請求數', ['name', 'scope'])
+
+
+# 目前請求各階段的累計耗時 (秒)，只有被效能分析的請求才會設定 (見 log_app/profiling.py)
+request_stages = ContextVar('request_stages', default=None)
+
+
+@contextmanager
+def timed(stage: str):
+    """記錄區塊的耗時；也可當 decorator 使用 (@timed('db_write'))"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe_stage(stage, time.perf_counter() - start)
+
+
+def observe_stage(stage: str, seconds: float):
+    STAGE_SECONDS.labels(stage).observe(seconds)
+    stages = request_stages.get()
+    if stages is not None:
+        stages[stage] = stages.get(stage, 0.0) + seconds
+
+
+def metrics_view(request):
+    if os.getenv('PROMETHEUS_MULTIPROC_DIR'):
+        # 彙總所有 worker process 寫入的指標
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return HttpResponse(generate_latest(registry), content_type=CONTENT_TYPE_LATEST)
+
+
+_last_push = 0.0
+
+
+def pushgateway_grouping_key() -> dict:
+    return {'instance': f'{socket.gethostname()}-{os.getpid()}'}
+
+
+def push_metrics(force: bool = False):
+    """
+    Celery worker 將指標推送到 Pushgateway (每個 process 一組，以 instance 區分，查詢時再加總)
+    為了降低開銷，同一個 process 至少間隔 PROMETHEUS_PUSH_INTERVAL 秒才推送一次
+    """
+    global _last_push
+    if not settings.PROMETHEUS_PUSHGATEWAY:
+        return
+
+    now = time.monotonic()
+    if not force and now - _last_push < settings.PROMETHEUS_PUSH_INTERVAL:
+        return
+    _last_push = now
+
+    try:
+        push_to_gateway(
+            settings.PROMETHEUS_PUSHGATEWAY, job='celery', registry=REGISTRY, timeout=2,
+            grouping_key=pushgateway_grouping_key(),
+        )
+    except Exception as e:
+        # 指標推送失敗不影響任務
+        print(f"[WARN] Failed to push metrics: {e}")
+
+
+def delete_metrics():
+    """
+    Process 結束時刪除自己的一組指標
+    Pushgateway 不會自動清除，max-tasks-per-child 每次重啟 process (pid 不同) 都會留下一組不再更新的指標；
+    刪除後加總的計數會變小，rate() / increase() 視為計數重設
+    """
+    if not settings.PROMETHEUS_PUSHGATEWAY:
+        return
+    try:
+        delete_from_gateway(settings.PROMETHEUS_PUSHGATEWAY, job='celery', grouping_key=pushgateway_grouping_key(),
+                            timeout=2)
+    except Exception as e:
+        print(f"[WARN] Failed to delete metrics: {e}")
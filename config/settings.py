@@ -13,6 +13,8 @@ https://docs.djangoproject.com/en/5.2/ref/settings/
 from pathlib import Path
 import os
 
+from django.core.exceptions import ImproperlyConfigured
+
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
@@ -47,6 +49,8 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    # 請求效能分析 (預設關閉，見 PROFILING_* 設定)，放在前面以涵蓋其他 middleware 的耗時
+    'log_app.profiling.RequestProfilingMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -78,17 +82,44 @@ WSGI_APPLICATION = 'config.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
 
-DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.mysql',
+# 連線池 (SQLAlchemy QueuePool)：每個 process 共用一組連線，借出前先 ping 檢查連線是否仍有效
+# ASGI 下每個請求的 ORM 會在不同執行緒執行，Django 內建的 CONN_MAX_AGE 無法跨請求重用連線，因此改用連線池
+DB_POOL_OPTIONS = {
+    'POOL_SIZE': int(os.getenv('DB_POOL_SIZE', 10)),
+    'MAX_OVERFLOW': int(os.getenv('DB_POOL_MAX_OVERFLOW', 10)),
+    'RECYCLE': int(os.getenv('DB_POOL_RECYCLE', 300)),  # 需小於 MariaDB 的 wait_timeout
+    'PRE_PING': True,
+}
+
+
+def mysql_database(host, port, **extra):
+    return {
+        'ENGINE': 'dj_db_conn_pool.backends.mysql',
         'NAME': os.getenv('MYSQL_DATABASE', 'mydatabase'),
         'USER': os.getenv('MYSQL_USER', 'ptt_rag'),
         'PASSWORD': os.getenv('MYSQL_PASSWORD', 'ptt_rag'),
-        'HOST': os.getenv('MYSQL_HOST', '127.0.0.1'),
-        'PORT': os.getenv('MYSQL_PORT', '3306'),
+        'HOST': host,
+        'PORT': port,
+        'POOL_OPTIONS': DB_POOL_OPTIONS,
+        **extra,
     }
+
+
+DATABASES = {
+    'default': mysql_database(os.getenv('MYSQL_HOST', '127.0.0.1'), os.getenv('MYSQL_PORT', '3306')),
 }
 
+# 讀取用的 replica (選填)：API 的文章查詢會改從 replica 讀取，爬蟲與 Log 寫入仍走 primary
+if os.getenv('MYSQL_REPLICA_HOST'):
+    DATABASES['replica'] = mysql_database(
+        os.getenv('MYSQL_REPLICA_HOST'),
+        os.getenv('MYSQL_REPLICA_PORT', '3306'),
+        # 測試時 replica 直接指向 primary 的測試資料庫
+        TEST={'MIRROR': 'default'},
+    )
+
+DATABASE_ROUTERS = ['config.db_router.ReadReplicaRouter']
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
@@ -153,4 +184,242 @@ CELERY_TIMEZONE = 'Asia/Taipei'
 # 讓 Celery 顯示任務啟動狀態
 CELERY_TASK_TRACK_STARTED = True
 # 設定任務超時時間 (例如 30 分鐘)，避免卡死
-CELERY_TASK_TIME_LIMIT = 30 * 60
\ No newline at end of file
+CELERY_TASK_TIME_LIMIT = 30 * 60
+
+# 爬蟲與向量化使用不同佇列，可各自調整 worker 數量
+CELERY_TASK_ROUTES = {
+    'celery_app.tasks.scrape_task': {'queue': 'scrape'},
+    'celery_app.tasks.refresh_hot_articles_task': {'queue': 'scrape'},
+    'celery_app.tasks.backfill_board_task': {'queue': 'backfill'},
+    'celery_app.tasks.backfill_shard_task': {'queue': 'backfill'},
+    'celery_app.data_processing.store_data_in_pinecone': {'queue': 'embedding'},
+    # 摘要會呼叫 Gemini，與向量化同樣由已預先載入 AI 套件的 worker 執行
+    'celery_app.tasks.update_board_digests_task': {'queue': 'embedding'},
+    'celery_app.tasks.reindex_embeddings_task': {'queue': 'embedding'},
+}
+
+# AI 相關套件 (Gemini / Pinecone / LangChain) 改為第一次使用時才載入 (見 article/ai_clients.py)
+# 消費這些佇列的 worker 啟動時預先載入，其他 worker (爬蟲、回補) 不需負擔
+AI_PREWARM_QUEUES = [queue for queue in os.getenv('AI_PREWARM_QUEUES', 'embedding').split(',') if queue]
+# web (ASGI) 啟動時預先載入，避免每個 uvicorn worker 的第一個 RAG 請求多等數秒；manage.py 指令不受影響
+AI_PREWARM_WEB = os.getenv('AI_PREWARM_WEB', 'True') == 'True'
+
+# ---------------------------------------------------------
+# 爬蟲排程 (依看板活躍度自動調整間隔)
+# ---------------------------------------------------------
+
+# 排程 tick：每隔多少秒檢查一次哪些看板到期
+PTT_SCHEDULER_TICK = int(os.getenv('PTT_SCHEDULER_TICK', 60))
+# 每個看板預設的間隔上下限 (秒)
+PTT_SCRAPE_MIN_INTERVAL = int(os.getenv('PTT_SCRAPE_MIN_INTERVAL', 120))
+PTT_SCRAPE_MAX_INTERVAL = int(os.getenv('PTT_SCRAPE_MAX_INTERVAL', 1800))
+# 希望每次爬取大約抓到幾篇新文章 (首頁約 20 篇，需在文章被擠到第二頁前抓到)
+PTT_SCRAPE_TARGET_NEW_ARTICLES = int(os.getenv('PTT_SCRAPE_TARGET_NEW_ARTICLES', 8))
+
+
+def parse_scrape_boards(value):
+    """格式：「看板:初始間隔[:下限[:上限]]」，以逗號分隔，例如 Stock:600:120:1800,Gossiping:300"""
+    boards = {}
+    for item in value.split(','):
+        if not item.strip():
+            continue
+        board, *numbers = item.strip().split(':')
+        numbers = [int(n) for n in numbers]
+        boards[board] = {
+            'interval': numbers[0] if len(numbers) > 0 else 600,
+            'min_interval': numbers[1] if len(numbers) > 1 else PTT_SCRAPE_MIN_INTERVAL,
+            'max_interval': numbers[2] if len(numbers) > 2 else PTT_SCRAPE_MAX_INTERVAL,
+        }
+    return boards
+
+
+PTT_SCRAPE_BOARDS = parse_scrape_boards(os.getenv('PTT_SCRAPE_BOARDS', 'Stock:600,Gossiping:600'))
+
+# 時段係數 (依 CELERY_TIMEZONE)：< 1 代表該時段爬得更頻繁，> 1 代表放慢；'*' 套用到所有看板
+# 看板專屬的設定優先於 '*'，同一看板內取第一個符合的時段
+PTT_SCRAPE_PROFILES = {
+    '*': [('01:00', '07:00', 2.0)],       # 深夜發文少
+    'Stock': [('08:30', '13:30', 0.5)],   # 台股交易時段
+}
+
+# ---------------------------------------------------------
+# 熱門文章推文追蹤 (依推文速度重新抓取，見 article/refresh.py)
+# ---------------------------------------------------------
+
+# 檢查到期文章的頻率 (秒) 與每次最多重新抓取的篇數
+ARTICLE_REFRESH_TICK = int(os.getenv('ARTICLE_REFRESH_TICK', 120))
+ARTICLE_REFRESH_BATCH_SIZE = int(os.getenv('ARTICLE_REFRESH_BATCH_SIZE', 30))
+# 目標：每次重新抓取約可取得的新推文數
+ARTICLE_REFRESH_TARGET_NEW_COMMENTS = int(os.getenv('ARTICLE_REFRESH_TARGET_NEW_COMMENTS', 20))
+# 重新抓取間隔的下限與上限 (沒有推文的文章也以上限間隔持續追蹤)
+ARTICLE_REFRESH_MIN_INTERVAL = int(os.getenv('ARTICLE_REFRESH_MIN_INTERVAL', 300))
+ARTICLE_REFRESH_MAX_INTERVAL = int(os.getenv('ARTICLE_REFRESH_MAX_INTERVAL', 6 * 3600))
+# 發文超過此時間 (秒) 的文章不再追蹤
+ARTICLE_REFRESH_MAX_AGE = int(os.getenv('ARTICLE_REFRESH_MAX_AGE', 3 * 24 * 3600))
+
+# ---------------------------------------------------------
+# 歷史資料回補 (見 celery_app/backfill.py)
+# ---------------------------------------------------------
+
+# 預設的分片數 (平行執行數)
+PTT_BACKFILL_SHARDS = int(os.getenv('PTT_BACKFILL_SHARDS', 4))
+# 累積多少篇新文章才送出一次向量化任務
+PTT_BACKFILL_EMBED_BATCH = int(os.getenv('PTT_BACKFILL_EMBED_BATCH', 500))
+# Celery 模式下每個任務最多處理的列表頁數，處理完後再送出下一段
+PTT_BACKFILL_PAGES_PER_TASK = int(os.getenv('PTT_BACKFILL_PAGES_PER_TASK', 20))
+
+# ---------------------------------------------------------
+# 大量匯出 (見 article/export.py)
+# ---------------------------------------------------------
+
+# 每批讀取的文章數 (推文依每批文章一次查詢)
+EXPORT_BATCH_SIZE = int(os.getenv('EXPORT_BATCH_SIZE', 1000))
+
+
+# ---------------------------------------------------------
+# 快取設定 (API 回應快取)
+# ---------------------------------------------------------
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        # 與 Celery 分開使用 db 1，避免互相影響
+        'LOCATION': f'redis://{REDIS_HOST}:6379/1',
+    }
+}
+
+# 快取內容的存活時間 (秒)；資料更新時會透過版本號立即失效，這裡只是上限
+API_CACHE_TIMEOUT = int(os.getenv('API_CACHE_TIMEOUT', 60 * 60))
+# 資料更新後的這段時間 (秒) 內，快取未命中時改從 primary 計算 (需大於 replica 的複寫延遲)
+API_CACHE_PRIMARY_WINDOW = int(os.getenv('API_CACHE_PRIMARY_WINDOW', 30))
+
+
+# ---------------------------------------------------------
+# RAG 設定
+# ---------------------------------------------------------
+
+# 批次搜尋時同時呼叫 Gemini 的最大數量
+RAG_BATCH_CONCURRENCY = int(os.getenv('RAG_BATCH_CONCURRENCY', 5))
+# 向量檢索多取幾倍的片段，合併同一篇與近似重複的文章後仍有 top_k 篇不同的文章
+RAG_RETRIEVAL_OVERFETCH = int(os.getenv('RAG_RETRIEVAL_OVERFETCH', 2))
+
+# 同時進行中的相同問題只呼叫一次 RAG (見 article/singleflight.py)
+RAG_SINGLEFLIGHT_ENABLED = os.getenv('RAG_SINGLEFLIGHT_ENABLED', 'True') == 'True'
+# 跨 worker 鎖的存活時間 (秒)，也是其他 worker 最多等待的時間；需大於一次 RAG 查詢的耗時
+RAG_SINGLEFLIGHT_LOCK_TIMEOUT = int(os.getenv('RAG_SINGLEFLIGHT_LOCK_TIMEOUT', 60))
+# 結果保留在 Redis 的秒數 (只為了讓等待中的 worker 讀取，不是長期快取)
+RAG_SINGLEFLIGHT_RESULT_TTL = int(os.getenv('RAG_SINGLEFLIGHT_RESULT_TTL', 10))
+# 其他 worker 輪詢結果的間隔 (秒)
+RAG_SINGLEFLIGHT_POLL_INTERVAL = float(os.getenv('RAG_SINGLEFLIGHT_POLL_INTERVAL', 0.1))
+
+
+# ---------------------------------------------------------
+# 文章切塊 (向量化用，見 article/chunking.py)
+# ---------------------------------------------------------
+
+# 'cjk': 依中文句子與 PTT 格式切塊並移除樣板；'recursive': LangChain RecursiveCharacterTextSplitter
+CHUNKER = os.getenv('CHUNKER', 'cjk')
+# 每個片段的字數上限與片段之間重疊的字數
+CHUNK_SIZE = int(os.getenv('CHUNK_SIZE', 300))
+CHUNK_OVERLAP = int(os.getenv('CHUNK_OVERLAP', 50))
+
+
+# ---------------------------------------------------------
+# 近似重複文章偵測 (見 article/dedup.py)
+# ---------------------------------------------------------
+
+# 關閉時所有文章都向量化 (仍會在查詢時合併同一篇文章的多個片段)
+DEDUP_ENABLED = os.getenv('DEDUP_ENABLED', 'True') == 'True'
+# 內文片段集合的相似度 (Jaccard，0 ~ 1) 達到此值視為近似重複
+DEDUP_MIN_SIMILARITY = float(os.getenv('DEDUP_MIN_SIMILARITY', 0.7))
+# 片段 (連續 4 個字) 少於此數的短文不參與比對
+DEDUP_MIN_SHINGLES = int(os.getenv('DEDUP_MIN_SHINGLES', 50))
+
+
+# ---------------------------------------------------------
+# 重新向量化 (更換 embedding 模型，見 celery_app/reindex.py)
+# ---------------------------------------------------------
+
+# 各 process 重新讀取使用中 target (模型與 namespace) 的間隔 (秒)；切換後最多這麼久全部生效
+EMBEDDING_TARGET_REFRESH = int(os.getenv('EMBEDDING_TARGET_REFRESH', 5))
+# 每批讀取的文章數 (完成一批寫入一次 checkpoint)
+REINDEX_BATCH_SIZE = int(os.getenv('REINDEX_BATCH_SIZE', 500))
+# 每個 embedding / upsert 請求的片段數，與同時進行的請求數
+REINDEX_EMBED_BATCH = int(os.getenv('REINDEX_EMBED_BATCH', 100))
+REINDEX_CONCURRENCY = int(os.getenv('REINDEX_CONCURRENCY', 4))
+# 每個 Celery 任務處理的批數，完成後送出下一個任務接續
+REINDEX_BATCHES_PER_TASK = int(os.getenv('REINDEX_BATCHES_PER_TASK', 10))
+
+
+# ---------------------------------------------------------
+# 看板討論摘要 (見 article/digest.py)
+# ---------------------------------------------------------
+
+# 每次爬蟲、向量化後更新看板摘要 (會呼叫 Gemini)
+DIGEST_ENABLED = os.getenv('DIGEST_ENABLED', 'True') == 'True'
+# 摘要的時段長度 (小時，依台灣時間對齊，需能整除 24)
+DIGEST_WINDOW_HOURS = [int(hours) for hours in os.getenv('DIGEST_WINDOW_HOURS', '24,6').split(',') if hours]
+if any(hours <= 0 or 24 % hours for hours in DIGEST_WINDOW_HOURS):
+    # 時段依台灣時間的 0 點對齊，不能整除 24 時跨日的時段會重疊
+    raise ImproperlyConfigured(f"DIGEST_WINDOW_HOURS must divide 24: {DIGEST_WINDOW_HOURS}")
+# 每個時段的熱門話題數與代表文章數 (代表文章會交給 Gemini 整理)
+DIGEST_TOPICS = int(os.getenv('DIGEST_TOPICS', 10))
+DIGEST_ARTICLES = int(os.getenv('DIGEST_ARTICLES', 10))
+
+
+# ---------------------------------------------------------
+# Prometheus 指標 (見 config/metrics.py)
+# ---------------------------------------------------------
+
+# Celery worker 推送指標的 Pushgateway，例如 pushgateway:9091；未設定時不推送
+PROMETHEUS_PUSHGATEWAY = os.getenv('PROMETHEUS_PUSHGATEWAY')
+# 同一個 worker process 兩次推送的最小間隔 (秒)
+PROMETHEUS_PUSH_INTERVAL = int(os.getenv('PROMETHEUS_PUSH_INTERVAL', 15))
+
+
+# ---------------------------------------------------------
+# 請求效能分析 (見 log_app/profiling.py)
+# ---------------------------------------------------------
+
+# 隨機抽樣比例 (0 ~ 1)，0 代表不抽樣
+PROFILING_SAMPLE_RATE = float(os.getenv('PROFILING_SAMPLE_RATE', 0))
+# 請求帶 X-Profile: <PROFILING_TOKEN> 時分析該請求；未設定則只能靠抽樣
+PROFILING_TOKEN = os.getenv('PROFILING_TOKEN')
+# 'cprofile' 或 'pyinstrument' (需另外安裝)
+PROFILING_PROFILER = os.getenv('PROFILING_PROFILER', 'cprofile')
+PROFILING_PATHS = ['/api/']
+PROFILING_EXCLUDE_PATHS = ['/api/profiles/', '/api/schema/', '/api/logs/']
+# 效能分析紀錄的保存天數 (與 Log 一起清理)
+PROFILING_RETENTION_DAYS = int(os.getenv('PROFILING_RETENTION_DAYS', 7))
+
+
+# ---------------------------------------------------------
+# Log 保存期限 (見 log_app/retention.py)
+# ---------------------------------------------------------
+
+# 各等級的保存天數，'*' 套用到未列出的等級
+LOG_RETENTION_DAYS = {
+    'INFO': int(os.getenv('LOG_RETENTION_DAYS_INFO', 14)),
+    'WARNING': int(os.getenv('LOG_RETENTION_DAYS_WARNING', 30)),
+    '*': int(os.getenv('LOG_RETENTION_DAYS', 90)),
+}
+# 清理頻率 (秒)；頻率越高每次刪除的量越少
+LOG_PURGE_TICK = int(os.getenv('LOG_PURGE_TICK', 3600))
+# 每次 DELETE 的筆數上限
+LOG_PURGE_BATCH_SIZE = int(os.getenv('LOG_PURGE_BATCH_SIZE', 5000))
+
+
+# ---------------------------------------------------------
+# 本機替身服務 (離線壓力測試用，見 article/fakes/)
+# ---------------------------------------------------------
+
+# 'google': Gemini + Pinecone；'fake': 本機替身 (不需要 API Key)
+AI_BACKEND = os.getenv('AI_BACKEND', 'google')
+# 爬蟲的 PTT 網址，可指向 run_fake_services，例如 http://fake-services:8090
+PTT_BASE_URL = os.getenv('PTT_BASE_URL', 'https://www.ptt.cc')
+# 替身向量資料庫的位置；未設定時資料只存在各 process 的記憶體內 (web 與 worker 不共用)
+FAKE_VECTOR_STORE_URL = os.getenv('FAKE_VECTOR_STORE_URL')
+# 替身服務每次呼叫的延遲 (秒)
+FAKE_EMBEDDING_DELAY = float(os.getenv('FAKE_EMBEDDING_DELAY', 0.05))
+FAKE_VECTOR_QUERY_DELAY = float(os.getenv('FAKE_VECTOR_QUERY_DELAY', 0.02))
+FAKE_CHAT_DELAY = float(os.getenv('FAKE_CHAT_DELAY', 0.8))
@@ -17,10 +17,13 @@ Including another URLconf
 from django.contrib import admin
 from django.urls import path, include
 from drf_spectacular.views import SpectacularAPIView, SpectacularSwaggerView, SpectacularRedocView
+from config.metrics import metrics_view
 
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('api/', include('article.urls')), # 連結到 Article App
+    path('api/', include('log_app.urls')), # 請求效能分析紀錄
+    path('metrics', metrics_view, name='metrics'), # Prometheus 指標
     
     # API 文件路由
     path('api/schema/', SpectacularAPIView.as_view(), name='schema'),
@@ -9,6 +9,8 @@ class EnvSettings(BaseSettings):
     PINECONE_API_KEY: str = None
     PINECONE_INDEX_NAME: str = None
     GOOGLE_EMBEDDINGS_MODEL: str = "models/text-embedding-004"
+    # 選填：直接指定 index host，可省去啟動時查詢 describe_index
+    PINECONE_INDEX_HOST: str | None = None
 
     model_config = SettingsConfigDict(
         env_file=BASE_DIR / '.env',
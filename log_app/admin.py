@@ -1,3 +1,22 @@
 from django.contrib import admin
 
-# Register your models here.
+from .models import Log, RequestProfile
+
+
+@admin.register(Log)
+class LogAdmin(admin.ModelAdmin):
+    list_display = ['created_at', 'level', 'category', 'message']
+    list_filter = ['level']
+    search_fields = ['category']
+    ordering = ['-created_at']
+    # 資料量大時不計算總筆數
+    show_full_result_count = False
+
+
+@admin.register(RequestProfile)
+class RequestProfileAdmin(admin.ModelAdmin):
+    list_display = ['created_at', 'method', 'path', 'status_code', 'duration_ms', 'sql_count', 'sql_ms',
+                    'serialization_ms', 'external_ms', 'trigger']
+    list_filter = ['trigger', 'method', 'status_code']
+    search_fields = ['path']
+    ordering = ['-created_at']
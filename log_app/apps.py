@@ -4,3 +4,10 @@ from django.apps import AppConfig
 class LogAppConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'log_app'
+
+    def ready(self):
+        from django.db.backends.signals import connection_created
+        from log_app.profiling import install_sql_wrapper
+
+        # 請求效能分析：記錄 SQL 查詢數與耗時
+        connection_created.connect(install_sql_wrapper)
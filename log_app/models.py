@@ -5,7 +5,33 @@ class Log(models.Model):
     category = models.CharField(max_length=100)
     message = models.TextField()
     traceback = models.TextField(null=True, blank=True, default=None)
-    created_at = models.DateTimeField(auto_now_add=True)
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    class Meta:
+        # 對應 /api/logs/ 的篩選 (等級 / 分類 + 時間排序) 與保存期限清理 (見 log_app/retention.py)
+        indexes = [
+            models.Index(fields=['level', 'created_at'], name='log_level_created_idx'),
+            models.Index(fields=['category', 'created_at'], name='log_category_created_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.level} - {self.created_at}'
+
+class RequestProfile(models.Model):
+    # API 請求的效能分析紀錄 (由 log_app.profiling.RequestProfilingMiddleware 寫入)
+    method = models.CharField(max_length=10)
+    path = models.CharField(max_length=255)
+    query_string = models.TextField(blank=True, default='')
+    status_code = models.PositiveSmallIntegerField()
+    trigger = models.CharField(max_length=10)               # header: 以 X-Profile 指定 / sample: 隨機抽樣
+    duration_ms = models.FloatField()                       # 整個請求的耗時
+    sql_count = models.PositiveIntegerField()               # SQL 查詢數
+    sql_ms = models.FloatField()                            # SQL 查詢耗時
+    serialization_ms = models.FloatField()                  # DRF 序列化耗時
+    external_ms = models.FloatField()                       # 外部 API (Embedding / Pinecone / Gemini) 耗時
+    stages = models.JSONField(default=dict)                 # 各階段耗時 (ms)，階段名稱同 Prometheus 指標
+    profile = models.TextField(blank=True, default='')      # cProfile / pyinstrument 輸出
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
 
     def __str__(self):
-        return f'{self.level} - {self.created_at}'
\ No newline at end of file
+        return f'{self.method} {self.path} ({self.duration_ms:.0f} ms)'
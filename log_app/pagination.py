@@ -0,0 +1,12 @@
+from rest_framework.pagination import CursorPagination
+
+
+class LogCursorPagination(CursorPagination):
+    """
+    以 created_at 為游標分頁 (最新的在前)：每頁都是索引範圍查詢，
+    不需要 COUNT(*) 也不需要 OFFSET，資料量再大、翻到多後面的頁都一樣快，且新寫入的 Log 不會讓頁面錯位
+    """
+    ordering = '-created_at'
+    page_size = 50
+    page_size_query_param = 'limit'
+    max_page_size = 500
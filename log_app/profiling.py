@@ -0,0 +1,193 @@
+"""
+API 請求效能分析 (預設關閉，不需重新部署即可針對單一請求開啟)
+
+觸發方式：
+- 請求帶 X-Profile header，且值與 PROFILING_TOKEN 相同
+- 依 PROFILING_SAMPLE_RATE 隨機抽樣
+
+記錄內容 (RequestProfile)：SQL 查詢數與耗時、DRF 序列化耗時、外部 API 耗時、各階段耗時與 cProfile 輸出
+- SQL 以 execute wrapper 記錄 (連線建立時安裝，未分析的請求只多一次 ContextVar 讀取)
+- 各階段耗時沿用 config.metrics.timed 的量測點
+- 使用 ContextVar 保存本次請求的統計，非同步 view 透過 sync_to_async 執行的 ORM 也能記錄到
+- cProfile 只記錄處理請求的執行緒；PROFILING_PROFILER = 'pyinstrument' 時改用 pyinstrument (async 友善，需另外安裝)
+- 同一個 process 同時只有一個請求開啟 profiler (Python 3.12 起 cProfile 不能重疊啟動)，
+  其他同時被觸發的請求只記錄 SQL 與各階段耗時；非同步請求的 cProfile 輸出也會包含同時在 event loop 上執行的其他請求
+- 分析過程發生任何錯誤都只記錄警告，不影響請求本身
+"""
+import cProfile
+import io
+import pstats
+import random
+import threading
+import time
+from contextvars import ContextVar
+from inspect import iscoroutinefunction
+
+from asgiref.sync import markcoroutinefunction
+from django.conf import settings
+
+from config.metrics import request_stages
+from log_app.models import RequestProfile
+
+PROFILE_HEADER = 'X-Profile'
+PROFILE_ID_HEADER = 'X-Profile-Id'
+# 計入外部 API 耗時的階段
+EXTERNAL_STAGES = ('embedding', 'retrieval', 'generation')
+# cProfile 輸出的函式數量
+PROFILE_LINES = 40
+
+_sql_stats = ContextVar('request_sql_stats', default=None)
+# 同一時間只有一個請求開啟 profiler
+_profiler_lock = threading.Lock()
+
+
+def profile_sql(execute, sql, params, many, context):
+    stats = _sql_stats.get()
+    if stats is None:
+        return execute(sql, params, many, context)
+
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        stats['count'] += 1
+        stats['seconds'] += time.perf_counter() - start
+
+
+def install_sql_wrapper(sender, connection, **kwargs):
+    """connection_created signal：在每個新連線安裝 SQL 記錄 (重新連線時不重複安裝)"""
+    if profile_sql not in connection.execute_wrappers:
+        connection.execute_wrappers.append(profile_sql)
+
+
+class RequestProfiler:
+    def __init__(self):
+        self.stages = {}
+        self.sql = {'count': 0, 'seconds': 0.0}
+        self.profiler = None
+        self.output = ''
+
+    def start(self):
+        self.tokens = (request_stages.set(self.stages), _sql_stats.set(self.sql))
+        if not _profiler_lock.acquire(blocking=False):
+            self.output = '(略過函式分析：另一個請求正在分析中)'
+        else:
+            try:
+                if settings.PROFILING_PROFILER == 'pyinstrument':
+                    from pyinstrument import Profiler
+                    self.profiler = Profiler(async_mode='enabled')
+                    self.profiler.start()
+                else:
+                    self.profiler = cProfile.Profile()
+                    self.profiler.enable()
+            except Exception as e:
+                # 例如其他工具 (debugger、coverage) 已啟用 profiler
+                print(f"[WARN] Failed to start profiler: {e}")
+                self.profiler = None
+                self.output = f'(略過函式分析：{e})'
+                _profiler_lock.release()
+        self.started = time.perf_counter()
+
+    def stop(self):
+        self.duration = time.perf_counter() - self.started
+        request_stages.reset(self.tokens[0])
+        _sql_stats.reset(self.tokens[1])
+        if self.profiler is None:
+            return
+
+        try:
+            if settings.PROFILING_PROFILER == 'pyinstrument':
+                self.profiler.stop()
+                self.output = self.profiler.output_text()
+            else:
+                self.profiler.disable()
+                stream = io.StringIO()
+                pstats.Stats(self.profiler, stream=stream).sort_stats('cumulative').print_stats(PROFILE_LINES)
+                self.output = stream.getvalue()
+        except Exception as e:
+            print(f"[WARN] Failed to collect profile: {e}")
+            self.output = f'(函式分析失敗：{e})'
+        finally:
+            self.profiler = None
+            _profiler_lock.release()
+
+    def to_record(self, request, response, trigger) -> RequestProfile:
+        return RequestProfile(
+            method=request.method,
+            path=request.path[:255],
+            query_string=request.META.get('QUERY_STRING', ''),
+            status_code=response.status_code,
+            trigger=trigger,
+            duration_ms=round(self.duration * 1000, 1),
+            sql_count=self.sql['count'],
+            sql_ms=round(self.sql['seconds'] * 1000, 1),
+            serialization_ms=round(self.stages.get('serialization', 0) * 1000, 1),
+            external_ms=round(sum(self.stages.get(stage, 0) for stage in EXTERNAL_STAGES) * 1000, 1),
+            stages={stage: round(seconds * 1000, 1) for stage, seconds in self.stages.items()},
+            profile=self.output,
+        )
+
+
+class RequestProfilingMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def get_trigger(self, request):
+        """回傳觸發方式 (header / sample)，不需要分析時回傳 None"""
+        path = request.path
+        if not any(path.startswith(prefix) for prefix in settings.PROFILING_PATHS):
+            return None
+        if any(path.startswith(prefix) for prefix in settings.PROFILING_EXCLUDE_PATHS):
+            return None
+        if settings.PROFILING_TOKEN and request.headers.get(PROFILE_HEADER) == settings.PROFILING_TOKEN:
+            return 'header'
+        if settings.PROFILING_SAMPLE_RATE and random.random() < settings.PROFILING_SAMPLE_RATE:
+            return 'sample'
+        return None
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+
+        trigger = self.get_trigger(request)
+        if not trigger:
+            return self.get_response(request)
+
+        profiler = RequestProfiler()
+        profiler.start()
+        try:
+            response = self.get_response(request)
+        finally:
+            profiler.stop()
+        try:
+            record = profiler.to_record(request, response, trigger)
+            record.save()
+            response[PROFILE_ID_HEADER] = str(record.id)
+        except Exception as e:
+            print(f"[WARN] Failed to save request profile: {e}")
+        return response
+
+    async def __acall__(self, request):
+        trigger = self.get_trigger(request)
+        if not trigger:
+            return await self.get_response(request)
+
+        profiler = RequestProfiler()
+        profiler.start()
+        try:
+            response = await self.get_response(request)
+        finally:
+            profiler.stop()
+        try:
+            record = profiler.to_record(request, response, trigger)
+            await record.asave()
+            response[PROFILE_ID_HEADER] = str(record.id)
+        except Exception as e:
+            print(f"[WARN] Failed to save request profile: {e}")
+        return response
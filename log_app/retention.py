@@ -0,0 +1,45 @@
+"""
+Log / RequestProfile 的保存期限
+
+依等級設定保存天數 (LOG_RETENTION_DAYS)，由 Celery beat 定期清理 (purge_logs_task)
+- 每次只刪除 LOG_PURGE_BATCH_SIZE 筆 (以主鍵刪除)，避免長時間鎖表或產生過大的交易，影響同時寫入的 Log
+- 依 created_at 索引找出過期資料，保存天數固定時每次清理的量大致等於新增的量，資料表大小維持穩定
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.utils import timezone
+
+from log_app.models import Log, RequestProfile
+
+
+def delete_in_batches(queryset, batch_size: int) -> int:
+    """分批刪除 queryset 的資料，回傳刪除筆數"""
+    model = queryset.model
+    deleted = 0
+    while True:
+        ids = list(queryset.values_list('id', flat=True)[:batch_size])
+        if not ids:
+            return deleted
+        deleted += model.objects.filter(id__in=ids).delete()[0]
+
+
+def purge_logs(now=None, batch_size=None) -> dict:
+    """刪除超過保存期限的 Log 與效能分析紀錄，回傳各等級的刪除筆數"""
+    now = now or timezone.now()
+    batch_size = batch_size or settings.LOG_PURGE_BATCH_SIZE
+    retention = dict(settings.LOG_RETENTION_DAYS)
+    default_days = retention.pop('*')
+
+    result = {}
+    for level, days in retention.items():
+        queryset = Log.objects.filter(level=level, created_at__lt=now - timedelta(days=days))
+        result[level] = delete_in_batches(queryset, batch_size)
+
+    # 其餘等級套用 '*'
+    queryset = Log.objects.exclude(level__in=retention).filter(created_at__lt=now - timedelta(days=default_days))
+    result['*'] = delete_in_batches(queryset, batch_size)
+
+    queryset = RequestProfile.objects.filter(created_at__lt=now - timedelta(days=settings.PROFILING_RETENTION_DAYS))
+    result['request_profiles'] = delete_in_batches(queryset, batch_size)
+    return result
@@ -0,0 +1,38 @@
+from rest_framework import serializers
+
+from .models import Log, RequestProfile
+
+
+# 1. 效能分析紀錄列表 (不含 profile 輸出)
+class RequestProfileSummarySerializer(serializers.ModelSerializer):
+    class Meta:
+        model = RequestProfile
+        exclude = ['profile']
+
+
+# 2. 效能分析紀錄詳情
+class RequestProfileSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = RequestProfile
+        fields = '__all__'
+
+
+# 3. 列表查詢參數
+class RequestProfileListRequestSerializer(serializers.Serializer):
+    path = serializers.CharField(help_text="路徑開頭，例如 /api/search/", required=False)
+    min_duration_ms = serializers.FloatField(help_text="只列出耗時超過此值的請求", required=False, min_value=0)
+
+
+# 4. Log
+class LogSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Log
+        fields = '__all__'
+
+
+# 5. Log 查詢參數
+class LogListRequestSerializer(serializers.Serializer):
+    level = serializers.CharField(help_text="等級，例如 ERROR", required=False)
+    category = serializers.CharField(help_text="分類，例如 scrape-Stock", required=False)
+    since = serializers.DateTimeField(help_text="起始時間 (含)，例如 2024-01-01T00:00:00+08:00", required=False)
+    until = serializers.DateTimeField(help_text="結束時間 (不含)", required=False)
@@ -1,3 +1,157 @@
-from django.test import TestCase
+import asyncio
+from datetime import timedelta
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.http import HttpResponse
+from django.test import TestCase, RequestFactory, override_settings
+from django.utils import timezone
+
+from celery_app.tasks import purge_logs_task
+from log_app.models import Log, RequestProfile
+from log_app.profiling import RequestProfilingMiddleware, PROFILE_HEADER, PROFILE_ID_HEADER
+
+
+@override_settings(PROFILING_TOKEN='secret', PROFILING_SAMPLE_RATE=0, PROFILING_PROFILER='cprofile')
+class RequestProfilingTests(TestCase):
+    def make_request(self):
+        return RequestFactory().get('/api/posts/', headers={PROFILE_HEADER: 'secret'})
+
+    async def test_overlapping_async_requests(self):
+        both_started = asyncio.Event()
+        started = []
+
+        async def get_response(request):
+            # 兩個請求都開始後才結束，確保分析期間重疊
+            started.append(request)
+            if len(started) == 2:
+                both_started.set()
+            await both_started.wait()
+            return HttpResponse('ok')
+
+        middleware = RequestProfilingMiddleware(get_response)
+        responses = await asyncio.wait_for(
+            asyncio.gather(middleware(self.make_request()), middleware(self.make_request())), timeout=5,
+        )
+
+        self.assertEqual([response.status_code for response in responses], [200, 200])
+        profiles = [await RequestProfile.objects.aget(id=response[PROFILE_ID_HEADER]) for response in responses]
+        # 只有一個請求開啟 cProfile，另一個只記錄 SQL 與各階段耗時
+        self.assertEqual(sorted('略過函式分析' in profile.profile for profile in profiles), [False, True])
+
+        # 分析結束後下一個請求可以再開啟 profiler
+        response = await middleware(self.make_request())
+        profile = await RequestProfile.objects.aget(id=response[PROFILE_ID_HEADER])
+        self.assertIn('function calls', profile.profile)
+
+    def test_profiler_error_does_not_fail_request(self):
+        middleware = RequestProfilingMiddleware(lambda request: HttpResponse('ok'))
+        with mock.patch('cProfile.Profile.enable', side_effect=ValueError('Another profiling tool is already active')):
+            response = middleware(self.make_request())
+
+        self.assertEqual(response.status_code, 200)
+        profile = RequestProfile.objects.get(id=response[PROFILE_ID_HEADER])
+        self.assertIn('Another profiling tool is already active', profile.profile)
+
+        # 失敗後沒有殘留鎖，下一個請求仍可分析
+        response = middleware(self.make_request())
+        self.assertIn('function calls', RequestProfile.objects.get(id=response[PROFILE_ID_HEADER]).profile)
+
+    def test_save_error_does_not_fail_request(self):
+        middleware = RequestProfilingMiddleware(lambda request: HttpResponse('ok'))
+        with mock.patch.object(RequestProfile, 'save', side_effect=RuntimeError('database is locked')):
+            response = middleware(self.make_request())
+
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn(PROFILE_ID_HEADER, response)
+
+
+def create_log(level, category, age, message=''):
+    log = Log.objects.create(level=level, category=category, message=message)
+    # created_at 為 auto_now_add，建立後再改成指定的時間
+    Log.objects.filter(id=log.id).update(created_at=timezone.now() - age)
+    log.refresh_from_db()
+    return log
+
+
+@override_settings(LOG_RETENTION_DAYS={'INFO': 14, 'WARNING': 30, '*': 90}, PROFILING_RETENTION_DAYS=7,
+                   LOG_PURGE_BATCH_SIZE=2)
+class LogRetentionTests(TestCase):
+    def test_purges_only_expired_rows(self):
+        kept = [
+            create_log('INFO', 'scrape-Stock', timedelta(days=13)),
+            create_log('WARNING', 'scrape-Stock', timedelta(days=29)),
+            create_log('ERROR', 'rag-search', timedelta(days=89)),
+        ]
+        for _ in range(3):
+            create_log('INFO', 'scrape-Stock', timedelta(days=15))
+        create_log('WARNING', 'scrape-Stock', timedelta(days=31))
+        create_log('ERROR', 'rag-search', timedelta(days=91))
+
+        profiles = [
+            RequestProfile.objects.create(method='GET', path='/api/posts/', status_code=200, trigger='header',
+                                          duration_ms=1, sql_count=1, sql_ms=1, serialization_ms=0, external_ms=0)
+            for _ in range(2)
+        ]
+        RequestProfile.objects.filter(id=profiles[1].id).update(created_at=timezone.now() - timedelta(days=8))
+
+        # 每批只刪 2 筆，過期的 3 筆 INFO 分兩批刪完
+        self.assertEqual(purge_logs_task(), {'INFO': 3, 'WARNING': 1, '*': 1, 'request_profiles': 1})
+        self.assertEqual(set(Log.objects.values_list('id', flat=True)), {log.id for log in kept})
+        self.assertEqual(list(RequestProfile.objects.values_list('id', flat=True)), [profiles[0].id])
+
+        # 沒有過期資料時不刪除任何資料
+        self.assertEqual(purge_logs_task(), {'INFO': 0, 'WARNING': 0, '*': 0, 'request_profiles': 0})
+
+
+class LogListViewTests(TestCase):
+    def setUp(self):
+        self.client.force_login(User.objects.create_superuser('admin', 'admin@example.com', 'password'))
+        # 每分鐘一筆，logs[0] 最新
+        self.logs = [
+            create_log(level, category, timedelta(minutes=i), message=str(i))
+            for i, (level, category) in enumerate([
+                ('INFO', 'scrape-Stock'), ('ERROR', 'scrape-Stock'), ('INFO', 'scrape-Gossiping'),
+                ('WARNING', 'scrape-Stock'), ('ERROR', 'rag-search'), ('INFO', 'scrape-Stock'),
+                ('INFO', 'scrape-Stock'),
+            ])
+        ]
+
+    def fetch_all(self, **params):
+        """依 next 網址翻完所有頁面，回傳每頁的 message"""
+        pages = []
+        response = self.client.get('/api/logs/', params)
+        while True:
+            self.assertEqual(response.status_code, 200)
+            data = response.json()
+            pages.append([log['message'] for log in data['results']])
+            if not data['next']:
+                return pages
+            response = self.client.get(data['next'])
+
+    def test_cursor_pagination(self):
+        self.assertEqual(self.fetch_all(limit=3), [['0', '1', '2'], ['3', '4', '5'], ['6']])
+
+        # 翻頁期間新寫入的 Log 不會讓下一頁錯位
+        first = self.client.get('/api/logs/', {'limit': 3}).json()
+        Log.objects.create(level='INFO', category='scrape-Stock', message='new')
+        second = self.client.get(first['next']).json()
+        self.assertEqual([log['message'] for log in second['results']], ['3', '4', '5'])
+        previous = self.client.get(second['previous']).json()
+        self.assertEqual([log['message'] for log in previous['results']], ['0', '1', '2'])
+
+    def test_filters(self):
+        self.assertEqual(self.fetch_all(level='INFO', limit=2), [['0', '2'], ['5', '6']])
+        self.assertEqual(self.fetch_all(category='scrape-Stock'), [['0', '1', '3', '5', '6']])
+        self.assertEqual(self.fetch_all(level='ERROR', category='scrape-Stock'), [['1']])
+
+        # since 含、until 不含
+        since = self.logs[4].created_at.isoformat()
+        until = self.logs[1].created_at.isoformat()
+        self.assertEqual(self.fetch_all(since=since, until=until), [['2', '3', '4']])
+
+        self.assertEqual(self.client.get('/api/logs/', {'since': 'yesterday'}).status_code, 400)
+
+    def test_requires_admin(self):
+        self.client.logout()
+        self.assertEqual(self.client.get('/api/logs/').status_code, 403)
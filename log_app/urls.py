@@ -0,0 +1,10 @@
+from django.urls import path
+from . import views
+
+urlpatterns = [
+    # 請求效能分析紀錄 (僅限管理員)
+    path('profiles/', views.RequestProfileListView.as_view(), name='request-profile-list'),
+    path('profiles/<int:pk>/', views.RequestProfileDetailView.as_view(), name='request-profile-detail'),
+    # 系統 Log 查詢 (僅限管理員)
+    path('logs/', views.LogListView.as_view(), name='log-list'),
+]
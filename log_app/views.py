@@ -1,3 +1,96 @@
-from django.shortcuts import render
+from rest_framework import status
+from rest_framework.pagination import LimitOffsetPagination
+from rest_framework.permissions import IsAdminUser
+from rest_framework.response import Response
+from adrf.views import APIView
+from drf_spectacular.utils import extend_schema, OpenApiParameter
 
-# Create your views here.
+from .models import Log, RequestProfile
+from .pagination import LogCursorPagination
+from .serializers import (
+    RequestProfileSerializer, RequestProfileSummarySerializer, RequestProfileListRequestSerializer,
+    LogSerializer, LogListRequestSerializer,
+)
+
+
+# --- 請求效能分析紀錄 (僅限管理員) ---
+class RequestProfileListView(APIView):
+    permission_classes = [IsAdminUser]
+
+    @extend_schema(
+        description="列出 API 請求的效能分析紀錄 (最新的在前)：SQL 查詢數與耗時、序列化耗時、外部 API 耗時與各階段耗時。僅限管理員。",
+        parameters=[
+            OpenApiParameter("path", str, OpenApiParameter.QUERY, description="路徑開頭，例如 /api/search/"),
+            OpenApiParameter("min_duration_ms", float, OpenApiParameter.QUERY, description="只列出耗時超過此值的請求"),
+            OpenApiParameter("limit", int, OpenApiParameter.QUERY, description="每頁返回的筆數 (預設 50)"),
+            OpenApiParameter("offset", int, OpenApiParameter.QUERY, description="從第幾筆開始 (預設 0)"),
+        ],
+        responses={200: RequestProfileSummarySerializer(many=True)},
+    )
+    def get(self, request):
+        request_serializer = RequestProfileListRequestSerializer(data=request.query_params)
+        if not request_serializer.is_valid():
+            return Response(request_serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+        profiles = RequestProfile.objects.defer('profile').order_by('-created_at')
+        if path := request_serializer.validated_data.get('path'):
+            profiles = profiles.filter(path__startswith=path)
+        if min_duration_ms := request_serializer.validated_data.get('min_duration_ms'):
+            profiles = profiles.filter(duration_ms__gte=min_duration_ms)
+
+        paginator = LimitOffsetPagination()
+        page = paginator.paginate_queryset(profiles, request)
+        return paginator.get_paginated_response(RequestProfileSummarySerializer(page, many=True).data)
+
+
+class RequestProfileDetailView(APIView):
+    permission_classes = [IsAdminUser]
+
+    @extend_schema(
+        description="取得單筆效能分析紀錄，包含 cProfile / pyinstrument 輸出。僅限管理員。",
+        responses={200: RequestProfileSerializer, 404: None},
+    )
+    def get(self, request, pk):
+        try:
+            profile = RequestProfile.objects.get(pk=pk)
+        except RequestProfile.DoesNotExist:
+            return Response({"error": "Profile not found"}, status=status.HTTP_404_NOT_FOUND)
+        return Response(RequestProfileSerializer(profile).data)
+
+
+# --- Log 查詢 (僅限管理員) ---
+class LogListView(APIView):
+    permission_classes = [IsAdminUser]
+
+    @extend_schema(
+        description="查詢系統 Log (最新的在前)，可依等級、分類與時間範圍篩選。"
+                    "使用游標分頁：依回應的 next / previous 網址翻頁。僅限管理員。",
+        parameters=[
+            OpenApiParameter("level", str, OpenApiParameter.QUERY, description="等級，例如 ERROR"),
+            OpenApiParameter("category", str, OpenApiParameter.QUERY, description="分類，例如 scrape-Stock"),
+            OpenApiParameter("since", str, OpenApiParameter.QUERY, description="起始時間 (含)，ISO 8601"),
+            OpenApiParameter("until", str, OpenApiParameter.QUERY, description="結束時間 (不含)，ISO 8601"),
+            OpenApiParameter("limit", int, OpenApiParameter.QUERY, description="每頁返回的筆數 (預設 50，最多 500)"),
+            OpenApiParameter("cursor", str, OpenApiParameter.QUERY, description="翻頁游標 (由 next / previous 提供)"),
+        ],
+        responses={200: LogSerializer(many=True)},
+    )
+    def get(self, request):
+        request_serializer = LogListRequestSerializer(data=request.query_params)
+        if not request_serializer.is_valid():
+            return Response(request_serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+        # 篩選條件對應 (level, created_at) / (category, created_at) 索引
+        logs = Log.objects.all()
+        if level := request_serializer.validated_data.get('level'):
+            logs = logs.filter(level=level)
+        if category := request_serializer.validated_data.get('category'):
+            logs = logs.filter(category=category)
+        if since := request_serializer.validated_data.get('since'):
+            logs = logs.filter(created_at__gte=since)
+        if until := request_serializer.validated_data.get('until'):
+            logs = logs.filter(created_at__lt=until)
+
+        paginator = LogCursorPagination()
+        page = paginator.paginate_queryset(logs, request, view=self)
+        return paginator.get_paginated_response(LogSerializer(page, many=True).data)